@@ -1,27 +1,33 @@
 import re
-from openai import OpenAI
+import hashlib
 import os
 import streamlit as st
-from dotenv import load_dotenv
 import json
 from pydantic import BaseModel, Field, ValidationError, field_validator
 from typing import List, Optional
-import fitz
 import streamlit as st
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from urllib.parse import urlparse, urlunparse
+from io import BytesIO
+from cv_pipeline import dated_cv_text, report_usage, static_prompt
+from durations import apply_durations
+from pdf_ingest import ingest_pdf
+from profile_cache import make_cache_key
+from prompt_budget import fit_to_budget
+from token_estimates import estimate_text_tokens
+import resources
 
-load_dotenv()
+resources.environment()
+client = resources.openai_client()
 
-openai_api_key = os.getenv('OPENAI_API_KEY')
-if openai_api_key is None:
-    raise ValueError("OPENAI_API_KEY environment variable not found.")
-OpenAI.api_key = openai_api_key
-client = OpenAI()
+MODEL = "gpt-4o"
+profile_cache = resources.profile_cache()
 
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
+
+if 'profiles' not in st.session_state:
+    st.session_state['profiles'] = {}
     
     
 
@@ -36,23 +42,6 @@ def fix_url(url):
     
     
 
-class TotalExperience(BaseModel):
-    totalWorkExperience: Optional[str] = Field(None, alias='totalWorkExperience')
-    totalEducationDuration: Optional[str] = Field(None, alias='totalEducationDuration')
-
-    @field_validator('totalWorkExperience')
-    def validate_totalWorkExperience(cls, v):
-        if not v:
-            return ''
-        return v
-
-    @field_validator('totalEducationDuration')
-    def validate_totalEducationDuration(cls, v):
-        if not v:
-            return ''
-        return v
-
-
 class WorkExperience(BaseModel):
     jobTitle: Optional[str] = Field(None, alias='jobTitle')
     company: Optional[str] = Field(None, alias='company')
@@ -201,30 +190,25 @@ def parse_user_profile(input_string: str) -> Optional[UserProfile]:
 
 
 def extract_raw_text_from_pdf(pdf_file):
-    document = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    raw_text = ""
-    for page_num in range(document.page_count):
-        page = document.load_page(page_num)
-        raw_text += page.get_text("text")
-        links = page.get_links()
-        for link in links:
-            if link["kind"] == fitz.LINK_URI:  # Check if the link is a URL
-                url = link['uri']
-                raw_text += '\n' + url
-    return raw_text
- 
+    # Compressed to the same prompt budget as the pipeline's requests
+    instruction_tokens = estimate_text_tokens(system_prompt(prompt) + dated_cv_text('', date_format="%Y-%m-%d"))
+    return fit_to_budget(ingest_pdf(pdf_file, render_images=False), instruction_tokens).raw_text
+
+def system_prompt(prompt):
+    # Instructions first and byte-stable, so they can be served from the prompt cache
+    return "Extract the relevant information from the CV\n\n" + static_prompt(prompt)
+
 def extract_info_with_gpt(raw_text, prompt):
-    cv_prompt = prompt.replace("{DATETIME}", datetime.now().strftime("%Y-%m-%d")) + "\n\n" + raw_text
-    # print(cv_prompt)
+    cv_text = dated_cv_text(raw_text, date_format="%Y-%m-%d")
     completion = client.chat.completions.create(
-                  model='gpt-4o',
+                  model=MODEL,
                   temperature=0,
                   response_format={ "type": "json_object" },
                   messages=[
-                    {"role": "system", "content": "Extract the relevant information from the CV"},
-                    {"role": "user", "content": cv_prompt },
+                    {"role": "system", "content": system_prompt(prompt)},
+                    {"role": "user", "content": cv_text },
                 ])
-    
+    report_usage(completion.usage)
     response = completion.choices[0].message.content 
     # print(response) 
     return response.strip()
@@ -234,13 +218,10 @@ Please extract the following details from the CV:
 
 Biography
 Work Experience and Education
-Total work experience duration
-Total education duration
 For each position or educational experience:
 Job Title or Degree
 Company or Institution
 Dates (Start and End)
-Total Length (years and months) # This is the total years and months of work experience for that position or educational degree. Please evaluate the total length based on the provided periods.
 Description of responsibilities, achievements, or skills gained
 Skills
 Languages
@@ -255,16 +236,13 @@ The output must be in the following JSON format:
     "links": [],
     "location": "",
     "biography": "",
-    "totalWorkExperience": "",
-    "totalEducationDuration": "",
     "workExperience": [
         {
             "jobTitle": "",
             "company": "",
             "period": "",
-            "periodStart": "",
-            "periodEnd": "",
-            "totalLength": "",   //total years and months of work experience for that position. Please, calculate it correctly. If the end date is not provided, assume it is the current date {DATETIME}. If the month is not provided, assume it is January for start dates and December for end dates. If it is from Jan 22 to Jan 23, then it is 13 months. Include the last month if it is not full.
+            "periodStart": "",   //DD-MM-YYYY. If the month is not provided, assume it is January.
+            "periodEnd": "",     //DD-MM-YYYY. If the month is not provided, assume it is December. Leave empty if the position is ongoing.
             "description": ""
         }
     ],
@@ -273,9 +251,8 @@ The output must be in the following JSON format:
             "degree": "",
             "educationalInstitution": "",
             "period": "",
-            "periodStart": "",
-            "periodEnd": "",
-            "totalLength": "",    //total years and months of studies for that educational degree. Please, calculate it correctly. If the end date is not provided, assume it is the current date {DATETIME}. If the month is not provided, assume it is January for start dates and December for end dates. If it is from Jan 22 to Jan 23, then it is 13 months. Include the last month if it is not full.
+            "periodStart": "",   //DD-MM-YYYY. If the month is not provided, assume it is January.
+            "periodEnd": "",     //DD-MM-YYYY. If the month is not provided, assume it is December. Leave empty if the studies are ongoing.
             "description": ""
         }
     ],
@@ -319,10 +296,8 @@ Instructions:
 - links: List of links to user's profiles (e.g. LinkedIn, GitHub, Xing, Kaggle, etc.). If there are multiple links, from other sections, like Projects, Publications, please DO NOT include them here!
 - location: City and State of the candidate, please provide it only from biography or data where it is clearly stated, DO NOT EXTRACT IT FROM POSITION OR EDUCATION
 - biography: A brief description of the candidate
-- totalWorkExperience: Total years and months of work experience
-- totalEducationDuration: Total years of education
-- workExperience: List of work experiences with job title, company, period, totalLength (total years and months of work experience for that position) and description
-- education: List of educational experiences with degree, educational institution, period, totalLength (total years and months of studies for that educational degree) and description
+- workExperience: List of work experiences with job title, company, period, periodStart, periodEnd and description
+- education: List of educational experiences with degree, educational institution, period, periodStart, periodEnd and description
 - skills: List of skills (please provide only the skill names, e.g. Python, TensorFlow, etc., without any additional information e.g. CSS – basic knowledge should only be CSS)
 - languages: List of languages with name and degree of proficiency (options: Beginner, Good, Fluent, Proficient, Native/Bilingual), example degree B2 is wrong, it should be Good.
 - publications: List of publications (books, scientific papers, etc.) with date, description, name, periodEnd, periodStart, publisher, tags, and url
@@ -336,8 +311,6 @@ Example:
     "links": ['https://www.linkedin.com/in/marko-markovic'],
     "location": "San Francisco, CA",
     "biography": "Marko is a data scientist with more than 5 years of experience in machine learning and natural language processing. He has a Ph.D. in computer science from Stanford University. He is proficient in Python, TensorFlow, and PyTorch. Marko is a native English speaker.",
-    "totalWorkExperience": "5 years 3 months",
-    "totalEducationDuration": "8 years",
     "workExperience": [
         {
             "jobTitle": "Data Scientist",
@@ -345,7 +318,6 @@ Example:
             "period": "Jan 2023 - ",
             "periodStart": "01-01-2023",
             "periodEnd": "",
-            "totalLength": "1 year, 7 months",
             "description": "Working as data scientist on NLP projects."
         },
         {
@@ -354,7 +326,6 @@ Example:
             "period": "May 2019 - Jan 2023",
             "periodStart": "01-05-2019",
             "periodEnd": "31-01-2023",
-            "totalLength": "3 years, 9 months",
             "description": "Working as data analyst for financial reports."
         },
     ],
@@ -365,7 +336,6 @@ Example:
             "period": "2013-2017",
             "periodStart": "01-01-2013",
             "periodEnd": "31-12-2017",
-            "totalLength": "4 years",
             "description": ""
         },
         {
@@ -374,7 +344,6 @@ Example:
             "period": "2012-2013",
             "periodStart": "01-01-2012",
             "periodEnd": "31-12-2013",
-            "totalLength": "2 years",
             "description": ""
         },
     ],
@@ -419,96 +388,14 @@ Example:
 }
 
 Please, make sure to provide all the requested information and that each Work Experience, Education, publication, and project are EXTRACTED from uploaded resume.
-For calculating dates, keep in mind that today it is: {DATETIME}
-Please, provide correct length of work experience and education duration for each position based on the provided periods and provided current date.
+For reference, today it is: {DATETIME}
 
 Please, make sure that you know difference between EDUCATION and WORK EXPERIENCE. It is very important to split them correctly!
 
-
 IMPORTANT:
-WHEN CALCULATING TOTALLENGTH FOR SPECIFIC POSITION OR EDUCATION, PLEASE, INCLUDE THE LAST MONTH IF IT IS NOT FULL. 
-EXAMPLE: FEB 2022 - FEB 2023 IS 13 MONTHS, NOT 12 (1 YEAR), SO SOLUTION IS 1 YEAR 1 MONTH, NOT 1 YEAR!
-EXAMPLE 2: 2018 - 2019 IS 2 YEARS, NOT 1 YEAR!
-EXAMPLE 3: JAN 2022 - FEB 2023 IS 14 MONTHS (1 YEAR 2 MONTHS), NOT 1 YEAR 1 MONTH!
-
-If something is in the future, calculate it only until today's date {DATETIME}.
-
-Check the examples above and make sure to calculate it correctly! Do not make mistakes!
-"""
-
-system_prompt_duration_length = """
-Please calculate the total work experience duration and total education duration based on the user's provided periods. Follow these instructions carefully:
-
-1. **Work Experience Calculation**:
-   - Calculate the total years and months of work experience based on the provided periods.
-   - If there is a gap between two periods, do not count that time.
-   - If there is an overlap between two periods, count the overlapping time only once.
-   - If the end date is not provided, assume it is the current date.
-   - If the month is not provided, assume it is January for start dates and December for end dates.
-   - After calculating, store the total work experience duration.
-   - If something is in the future, calculate it only until today's date {DATETIME}.
-
-2. **Education Duration Calculation**:
-   - Separately, calculate the total years and months of education based on the provided periods.
-   - Apply the same rules as above: do not count gaps, and count overlapping time only once.
-   - If the end date is not provided, assume it is the current date.
-   - If the month is not provided, assume it is January for start dates and December for end dates.
-   - After calculating, store the total education duration.
-   - If something is in the future, calculate it only until today's date {DATETIME}.
-
-3. **Output**:
-   - The output must be in the following JSON format:
-     ```json
-     {
-         "totalWorkExperience": "X years Y months",
-         "totalEducationDuration": "X years Y months"
-     }
-     ```
-   - Ensure that the work experience and education durations are calculated and stored separately before outputting the final JSON.
-
-The current date is {DATETIME}.
-The user's work experience is {WORK_EXPERIENCE}.
-The user's education experience is {EDUCATION}.
-
-Example:
-The current date is 2024-08-26.
-The user's work experience is ['Jan 2024 - NOW', 'July 2022 - Jan 2024', 'Jan 2021 - July 2022', 'Jan 2020 - Jan 2021', 'Jan 2019 - July 2021']
-The user's education experience is ['2019 - ', '2017 - 2018', '2014 - 2017']
-
-The output MUST be:
-{
-    "totalWorkExperience": "5 years 8 months",
-    "totalEducationDuration": "9 years 8 months"
-}
+DO NOT CALCULATE ANY DURATIONS (NO totalLength, totalWorkExperience OR totalEducationDuration). THEY ARE COMPUTED FROM periodStart AND periodEnd, SO ONLY THE DATES NEED TO BE CORRECT.
 """
 
-
-def calculate_years_months(date1, date2):
-
-    d1 = datetime.strptime(date1, "%d-%m-%Y")
-    
-    if date2 == "":
-        d2 = datetime.now()
-    else:
-        d2 = datetime.strptime(date2, "%d-%m-%Y")
-    
-    years = d2.year - d1.year
-    months = d2.month - d1.month
-    
-    if d2.day >= d1.day:
-        months += 1
-    
-    if months >= 12:
-        years += 1
-        months -= 12
-        
-    if months < 0:
-        years -= 1
-        months += 12
-    
-    return years, months
-
-
 def check_credentials(username, password):
     correct_password = os.getenv('USER_PASSWORD')
     return username == "talentwunder" and password == correct_password
@@ -529,194 +416,114 @@ def display_login_form():
                 st.error("Incorrect username or password.")
                 
 
-def calculate_duration(date_ranges):
-    """
-    Calculate total duration from a list of date ranges, considering overlaps and gaps.
-    
-    Args:
-        date_ranges: List of tuples containing date strings in format (start_date, end_date)
-                    where dates are in "DD-MM-YYYY" format
-    
-    Returns:
-        tuple: (years, months) representing the total duration
-    """
-    # Convert date strings to datetime objects and sort by start date
-    ranges = [(datetime.strptime(start, "%d-%m-%Y"), 
-            datetime.now() if not end else datetime.strptime(end, "%d-%m-%Y")) 
-            for start, end in date_ranges]
-    ranges.sort()
-
-    # Merge overlapping ranges
-    merged_ranges = []
-    if ranges:
-        current_start, current_end = ranges[0]
-        
-        for start, end in ranges[1:]:
-            if start <= current_end:  # Overlapping or contiguous range
-                current_end = max(current_end, end)
-            else:  # Non-overlapping range
-                merged_ranges.append((current_start, current_end))
-                current_start, current_end = start, end
-        
-        merged_ranges.append((current_start, current_end))
-
-    # Calculate total duration
-    total_months = 0
-    for start, end in merged_ranges:
-        # Calculate the difference including partial months
-        diff = relativedelta(end, start)
-        months = diff.years * 12 + diff.months
-        
-        # If there are any days, round up to next month
-        if diff.days > 0:
-            months += 1
-            
-        total_months += months
-
-    # Convert total months to years and months
-    years = total_months // 12
-    remaining_months = total_months % 12
-
-    return years, remaining_months
+def convert_cv(pdf_bytes):
+    cache_key = make_cache_key(pdf_bytes, prompt, MODEL, datetime.now().strftime("%Y-%m-%d"))
+    cached_profile = profile_cache.get(cache_key)
+    if cached_profile:
+        return UserProfile.model_validate_json(cached_profile)
+
+    raw_text = extract_raw_text_from_pdf(BytesIO(pdf_bytes))
+    extracted_info = extract_info_with_gpt(raw_text, prompt)
+    parsed_profile = parse_user_profile(extracted_info)
+    if parsed_profile:
+        apply_durations(parsed_profile)
+        profile_cache.set(cache_key, parsed_profile.model_dump_json())
+    return parsed_profile
+
+
+def upload_key(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def display_profile(parsed_profile):
+    working_experience, education_experience = [], []
+    if parsed_profile.name:
+        st.header(parsed_profile.name)
+
+    if parsed_profile.location:
+        st.subheader(f"Location: {parsed_profile.location}")
+
+    if parsed_profile.emails:
+        st.markdown(f"**Emails:** {', '.join(parsed_profile.emails)}")
+
+    if parsed_profile.phones:
+        st.markdown(f"**Phones:** {', '.join(parsed_profile.phones)}")
+
+    if parsed_profile.links:
+        st.markdown(f"**Links:** {', '.join(parsed_profile.links)}")
+
+    if parsed_profile.biography:
+        st.markdown(f"**Biography:** {parsed_profile.biography}")
+
+    st.markdown("### Work Experience")
+    for work in parsed_profile.workExperience:
+        working_experience.append(work.period)
+        with st.expander(f"{work.jobTitle} at {work.company} ({work.period} : {work.totalLength})"):
+            st.markdown(work.description)
+
+    st.markdown("### Education")
+    for edu in parsed_profile.education:
+        education_experience.append(edu.period)
+        with st.expander(f"{edu.degree} at {edu.educationalInstitution} ({edu.period} : {edu.totalLength})"):
+            st.markdown(edu.description)
+
+    # Totals are computed from the extracted dates by durations.apply_durations
+    if working_experience:
+        st.markdown(f"**Total Work Experience:** {parsed_profile.totalWorkExperience}")
+
+    if education_experience:
+        st.markdown(f"**Total Education Duration:** {parsed_profile.totalEducationDuration}")
+
+    st.markdown("### Skills")
+    st.write(", ".join(parsed_profile.skills))
+
+    st.markdown("### Languages")
+    for lang in parsed_profile.languages:
+        st.markdown(f"- **{lang.name}:** {lang.degree}")  
+
+    st.markdown("### Publications")
+    for pub in parsed_profile.publications:
+        with st.expander(f"{pub.name} ({pub.periodStart} - {pub.periodEnd})"):
+            st.markdown(f"**Date:** {pub.date}")
+            st.markdown(f"**Publisher:** {pub.publisher}")
+            st.markdown(f"**Description:** {pub.description}")
+            st.markdown(f"**Tags:** {', '.join(pub.tags)}")
+            st.markdown(f"**URL:** {pub.url}")
+
+    st.markdown("### Projects")
+    for proj in parsed_profile.projects:
+        with st.expander(f"{proj.name} ({proj.periodStart} - {proj.periodEnd})"):
+            st.markdown(f"**Date:** {proj.date}")
+            st.markdown(f"**Description:** {proj.description}")
+            st.markdown(f"**Skills:** {', '.join(proj.skills)}")
+            st.markdown(f"**URL:** {proj.url}")
 
 
 def display_main_app():
     st.title('CV2Profile Convertor')
     uploaded_file = st.file_uploader('Choose CV to upload', type="pdf")
- 
-    if st.button('Convert CV'):
-        if uploaded_file:
-            with st.spinner('Converting... Please wait'):
-                raw_text = extract_raw_text_from_pdf(uploaded_file)
-                extracted_info = extract_info_with_gpt(raw_text, prompt)
-                parsed_profile = parse_user_profile(extracted_info)
-    
-                if parsed_profile:
-                    # st.write(parsed_profile.model_dump_json(indent=2))
-                    working_experience, education_experience = [], []
-                    if parsed_profile.name:
-                        st.header(parsed_profile.name)
-
-                    if parsed_profile.location:
-                        st.subheader(f"Location: {parsed_profile.location}")
-                        
-                    if parsed_profile.emails:
-                        st.markdown(f"**Emails:** {', '.join(parsed_profile.emails)}")
-                        
-                    if parsed_profile.phones:
-                        st.markdown(f"**Phones:** {', '.join(parsed_profile.phones)}")
-                        
-                    if parsed_profile.links:
-                        st.markdown(f"**Links:** {', '.join(parsed_profile.links)}")
-
-                    if parsed_profile.biography:
-                        st.markdown(f"**Biography:** {parsed_profile.biography}")
-
-                    st.markdown("### Work Experience")
-                    total_work_experience = []
-                    for work in parsed_profile.workExperience:
-                        working_experience.append(work.period)
-                        years, months = calculate_years_months(work.periodStart, work.periodEnd)
-                        total_work_experience.append((work.periodStart, work.periodEnd))
-                        duration_str = ""
-                        if years > 0:
-                            duration_str += f"{years} year{'s' if years != 1 else ''}"
-                        if months > 0:
-                            if duration_str:
-                                duration_str += " "
-                            duration_str += f"{months} month{'s' if months != 1 else ''}"
-                        with st.expander(f"{work.jobTitle} at {work.company} ({work.period} : {duration_str})"):
-                            st.markdown(work.description)
-                
-                        
-                    st.markdown("### Education")
-                    total_education_experience = []
-                    for edu in parsed_profile.education:
-                        education_experience.append(edu.period)
-                        years, months = calculate_years_months(edu.periodStart, edu.periodEnd)
-                        total_education_experience.append((edu.periodStart, edu.periodEnd))
-                        duration_str = ""
-                        if years > 0:
-                            duration_str += f"{years} year{'s' if years != 1 else ''}"
-                        if months > 0:
-                            if duration_str:
-                                duration_str += " "
-                            duration_str += f"{months} month{'s' if months != 1 else ''}"
-                        with st.expander(f"{edu.degree} at {edu.educationalInstitution} ({edu.period} : {duration_str})"):
-                            st.markdown(edu.description)
-                            
-                        
-                    # total_experience = extract_total_length_with_gpt(str(working_experience), str(education_experience), system_prompt_duration_length)
-                    
-                    # if working_experience:
-                    #     st.markdown(f"**Total Work Experience:** {total_experience.totalWorkExperience}")
-                    
-                    # if education_experience:
-                    #     st.markdown(f"**Total Education Duration:** {total_experience.totalEducationDuration}")
-                                        
-                    total_work_exp_y, total_work_exp_m  = calculate_duration(total_work_experience)
-                    total_edu_exp_y, total_edu_exp_m = calculate_duration(total_education_experience)
-                    
-                    if working_experience:
-                        st.markdown(f"**Total Work Experience:** {total_work_exp_y} years, {total_work_exp_m} months")
-                    
-                    if education_experience:
-                        st.markdown(f"**Total Education Duration:** {total_edu_exp_y} years, {total_edu_exp_m} months")
-
-                    st.markdown("### Skills")
-                    st.write(", ".join(parsed_profile.skills))
-
-                    st.markdown("### Languages")
-                    for lang in parsed_profile.languages:
-                        st.markdown(f"- **{lang.name}:** {lang.degree}")  
-                        
-                    st.markdown("### Publications")
-                    for pub in parsed_profile.publications:
-                        with st.expander(f"{pub.name} ({pub.periodStart} - {pub.periodEnd})"):
-                            st.markdown(f"**Date:** {pub.date}")
-                            st.markdown(f"**Publisher:** {pub.publisher}")
-                            st.markdown(f"**Description:** {pub.description}")
-                            st.markdown(f"**Tags:** {', '.join(pub.tags)}")
-                            st.markdown(f"**URL:** {pub.url}")
-                            
-                    st.markdown("### Projects")
-                    for proj in parsed_profile.projects:
-                        with st.expander(f"{proj.name} ({proj.periodStart} - {proj.periodEnd})"):
-                            st.markdown(f"**Date:** {proj.date}")
-                            st.markdown(f"**Description:** {proj.description}")
-                            st.markdown(f"**Skills:** {', '.join(proj.skills)}")
-                            st.markdown(f"**URL:** {proj.url}")
-                else:
-                    st.write("Failed to parse the user profile.")
-                    
-                    
-def extract_total_length_with_gpt(working_experience, education, prompt):
-    prompt = prompt.replace("{DATETIME}", datetime.now().strftime("%Y-%m-%d")).replace("{WORK_EXPERIENCE}", working_experience).replace("{EDUCATION}", education)
-    completion = client.chat.completions.create(
-                  model='gpt-4o',
-                  temperature=0,
-                  response_format={ "type": "json_object" },
-                  messages=[
-                    {"role": "system", "content": "Extract the relevant information from the provided periods"},
-                    {"role": "user", "content": prompt},
-                ])
-    
-    response = completion.choices[0].message.content 
-    # print(response)
-    data = extract_json_from_string(response)
-    if not data:
-        return None
-    try:
-        cleaned_data = {
-            "totalWorkExperience": data.get("totalWorkExperience", ""),
-            "totalEducationDuration": data.get("totalEducationDuration", "")
-        }
-        total_length = TotalExperience(**cleaned_data)
-        return total_length
-    except ValidationError as e:
-        return None
-                
- 
+    # Converted profiles stay in the session, keyed by the upload's content, so reruns
+    # and repeated clicks render them again without another model call
+    profiles = st.session_state['profiles']
+    pdf_bytes = uploaded_file.getvalue() if uploaded_file else None
+    key = upload_key(pdf_bytes) if uploaded_file else None
+
+    if st.button('Convert CV') and uploaded_file and key not in profiles:
+        with st.spinner('Converting... Please wait'):
+            parsed_profile = convert_cv(pdf_bytes)
+        if parsed_profile:
+            profiles[key] = parsed_profile
+        else:
+            st.write("Failed to parse the user profile.")
+
+    if key in profiles:
+        st.download_button(
+            'Download JSON', profiles[key].model_dump_json(indent=2),
+            file_name=f"{os.path.splitext(uploaded_file.name)[0]}.json", mime="application/json",
+        )
+        display_profile(profiles[key])
+
+
 if not st.session_state['logged_in']:
     display_login_form()
 else:
@@ -1,4 +1,7 @@
-from pyresparser import ResumeParser
+import resources
+
+# pyresparser loads its spaCy models on every ResumeParser(); this shares them per process
+ResumeParser = resources.resume_parser_class()
 
 # Path to the resume file
 resume_path = "C:/Users/Talentwunder/Downloads/Mirko_Kalezic_CV_1.pdf"
@@ -0,0 +1,277 @@
+"""
+Convert CV PDFs through the OpenAI Batch API, for archive re-processing
+where cost and throughput matter more than latency.
+
+    python batch_api.py submit resumes/ -o profiles.jsonl
+    python batch_api.py collect profiles.jsonl.batches.json -o profiles.jsonl
+
+submit renders every PDF into the same request (prompt and message layout)
+as extract_info_with_gpt, writes them to JSONL request files, uploads them
+and starts one batch per file. The batch ids and the custom_id -> file
+mapping are kept in a manifest next to the output, rewritten after every
+batch is started; submit refuses to overwrite an existing one. collect waits for the
+batches to finish and appends {"file", "sha256", "profile" | "error"} lines
+to the output, the same format as batch_convert.py, so its checkpoint
+logic skips those files on the next run.
+
+Set OPENAI_BASE_URL to run against a local OpenAI-compatible server.
+"""
+import argparse
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from openai import OpenAI
+
+from batch_convert import collect_pdf_paths, load_checkpoint, read_file
+from cv_pipeline import (DATETIME_FORMAT, IMAGE_MODE, MODEL, RENDER_IMAGES, STRUCTURED, TEXT_MODE, VISION, RenderOptions,
+                         build_messages, instruction_tokens, parse_profile, prompt, repair_user_profile,
+                         response_format)
+from durations import apply_durations
+from pdf_ingest import ingest_pdf
+from prompt_budget import fit_to_budget
+from resources import environment
+
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Batch API input limits are 50,000 requests and 200 MB per file
+MAX_REQUESTS_PER_FILE = 50000
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024
+POLL_SECONDS = 60
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_batch_request(custom_id, pdf_bytes, vision=VISION, model=MODEL, image_mode=IMAGE_MODE,
+                        render_options=None, structured=STRUCTURED):
+    ingested = fit_to_budget(ingest_pdf(pdf_bytes, RENDER_IMAGES[vision], render_options, TEXT_MODE),
+                             instruction_tokens(structured))
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": build_messages(ingested.raw_text, prompt, ingested.images, image_mode),
+            "temperature": 0,
+            "top_p": 1,
+            **response_format(structured),
+        },
+    }
+
+
+def write_request_files(paths, prefix, vision=VISION, model=MODEL, image_mode=IMAGE_MODE, render_options=None,
+                        structured=STRUCTURED):
+    """
+    Write one batch request per PDF, starting a new file whenever the
+    request count or size limit of a batch input file would be exceeded.
+
+    Returns:
+        tuple: (list of request file paths, {custom_id: {"file", "sha256"}})
+    """
+    request_files, requests = [], {}
+    out, count, size = None, 0, 0
+    try:
+        for index, path in enumerate(paths):
+            pdf_bytes = read_file(path)
+            custom_id = f"cv-{index}"
+            try:
+                line = json.dumps(
+                    build_batch_request(custom_id, pdf_bytes, vision, model, image_mode, render_options, structured),
+                    ensure_ascii=False,
+                ) + '\n'
+            except Exception as e:
+                print(f"[error] {path}: {type(e).__name__}: {e}")
+                continue
+            line_bytes = len(line.encode('utf-8'))
+            if out is None or count >= MAX_REQUESTS_PER_FILE or size + line_bytes > MAX_BYTES_PER_FILE:
+                if out is not None:
+                    out.close()
+                request_files.append(f"{prefix}.requests-{len(request_files)}.jsonl")
+                out = open(request_files[-1], 'w', encoding='utf-8')
+                count, size = 0, 0
+            out.write(line)
+            count += 1
+            size += line_bytes
+            requests[custom_id] = {"file": path, "sha256": hashlib.sha256(pdf_bytes).hexdigest()}
+    finally:
+        if out is not None:
+            out.close()
+    return request_files, requests
+
+
+def write_manifest(manifest_path, manifest, create=False):
+    # create: fail if it exists, so the batch ids of an earlier submit are never lost
+    with open(manifest_path, 'x' if create else 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def submit_batches(client, request_files, manifest, manifest_path):
+    """
+    Upload each request file and start a batch for it. The manifest is
+    rewritten after every batch, so an interrupted submit still records the
+    batches it started.
+
+    Returns:
+        list: the batch ids in the manifest
+    """
+    for request_file in request_files:
+        with open(request_file, 'rb') as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id, endpoint=ENDPOINT, completion_window=COMPLETION_WINDOW,
+        )
+        print(f"Submitted {request_file} as batch {batch.id}")
+        manifest["batch_ids"].append(batch.id)
+        write_manifest(manifest_path, manifest)
+    return manifest["batch_ids"]
+
+
+def wait_for_batch(client, batch_id, poll_seconds=POLL_SECONDS):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in FINAL_STATUSES:
+            return batch
+        counts = batch.request_counts
+        if counts:
+            print(f"Batch {batch_id} {batch.status}: {counts.completed}/{counts.total} done")
+        time.sleep(poll_seconds)
+
+
+def read_jsonl_file(client, file_id):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def result_to_record(result, request, today=None, structured=STRUCTURED):
+    """
+    Map one line of a batch output or error file to a batch_convert record.
+    """
+    record = dict(request)
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        error = result.get("error") or (response.get("body") or {}).get("error") or {}
+        record["error"] = f"BatchError: {error.get('message', 'request failed')}"
+        return record
+
+    content = response["body"]["choices"][0]["message"]["content"] or ""
+    profile = parse_profile(content.strip(), structured)
+    if profile is None:
+        # Local fixes only; bad fragments are dropped rather than re-asked
+        profile = repair_user_profile(content)
+    if profile is None:
+        record["error"] = "ValueError: Failed to parse the user profile."
+        return record
+    apply_durations(profile, today)
+    record["profile"] = profile.model_dump()
+    return record
+
+
+def collect_batches(client, manifest, output_path, poll_seconds=POLL_SECONDS):
+    """
+    Wait for every batch in the manifest and append its records to output_path.
+
+    Returns:
+        tuple: (converted, failed)
+    """
+    requests = manifest["requests"]
+    # Durations count ongoing entries up to the date the prompt was built with
+    today = datetime.strptime(manifest["date"], DATETIME_FORMAT)
+    seen = set()
+    converted, failed = 0, 0
+    with open(output_path, 'a', encoding='utf-8') as out:
+        for batch_id in manifest["batch_ids"]:
+            batch = wait_for_batch(client, batch_id, poll_seconds)
+            print(f"Batch {batch_id} {batch.status}")
+            results = read_jsonl_file(client, batch.output_file_id) + read_jsonl_file(client, batch.error_file_id)
+            for result in results:
+                request = requests.get(result.get("custom_id"))
+                if request is None:
+                    continue
+                seen.add(result["custom_id"])
+                record = result_to_record(result, request, today, manifest.get("structured", False))
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                if "error" in record:
+                    failed += 1
+                else:
+                    converted += 1
+
+        # Requests of expired or failed batches have no result line at all
+        for custom_id, request in requests.items():
+            if custom_id not in seen:
+                out.write(json.dumps({**request, "error": "BatchError: no result returned"}, ensure_ascii=False) + '\n')
+                failed += 1
+    return converted, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CV PDFs into UserProfile JSONL through the Batch API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help="build the request files and start the batches")
+    submit.add_argument('inputs', nargs='+', help="directories or glob patterns of PDF files")
+    submit.add_argument('-o', '--output', required=True, help="JSONL output file; files already in it are skipped")
+    submit.add_argument('--model', default=MODEL)
+    submit.add_argument('--vision', choices=['auto', 'always', 'never'], default=VISION,
+                        help="send page images always, never, or only when the text layer is poor")
+    submit.add_argument('--image-mode', choices=['pages', 'stitched'], default=IMAGE_MODE,
+                        help="send each page as its own image, or one stitched image")
+    submit.add_argument('--dpi', type=int, help="fixed render DPI (default: fit the model's image tiles)")
+    submit.add_argument('--max-side', type=int, default=RenderOptions().max_side, help="longest rendered page side in pixels")
+    submit.add_argument('--max-pixels', type=int, help="cap on rendered width * height per page")
+    submit.add_argument('--grayscale', action='store_true', help="render pages in grayscale")
+    submit.add_argument('--image-format', choices=['png', 'jpeg', 'webp'], default='png')
+    submit.add_argument('--quality', type=int, default=85, help="jpeg/webp quality")
+    submit.add_argument('--no-schema', action='store_true',
+                        help="ask for free-form JSON text instead of schema-constrained structured outputs")
+
+    collect = commands.add_parser('collect', help="wait for the batches and write the profiles")
+    collect.add_argument('manifest', help="manifest written by submit")
+    collect.add_argument('-o', '--output', required=True, help="JSONL output file")
+    collect.add_argument('--poll-seconds', type=float, default=POLL_SECONDS)
+    args = parser.parse_args()
+
+    environment()
+    client = OpenAI()
+
+    if args.command == 'collect':
+        with open(args.manifest, encoding='utf-8') as f:
+            manifest = json.load(f)
+        converted, failed = collect_batches(client, manifest, args.output, args.poll_seconds)
+        print(f"Converted {converted}, failed {failed}.")
+        return
+
+    paths = collect_pdf_paths(args.inputs)
+    done = load_checkpoint(args.output)
+    pending = [path for path in paths if path not in done]
+    print(f"Found {len(paths)} PDFs, {len(done & set(paths))} already converted, {len(pending)} to go.")
+    if not pending:
+        return
+
+    render_options = RenderOptions(
+        dpi=args.dpi, max_side=args.max_side, max_pixels=args.max_pixels,
+        grayscale=args.grayscale, image_format=args.image_format, quality=args.quality,
+    )
+    manifest = {
+        "date": datetime.now().strftime(DATETIME_FORMAT),
+        "structured": not args.no_schema,
+        "batch_ids": [],
+        "requests": {},
+    }
+    manifest_path = f"{args.output}.batches.json"
+    try:
+        write_manifest(manifest_path, manifest, create=True)
+    except FileExistsError:
+        parser.error(f"{manifest_path} already exists; collect its batches or remove it first")
+    request_files, manifest["requests"] = write_request_files(
+        pending, args.output, args.vision, args.model, args.image_mode, render_options, not args.no_schema
+    )
+    write_manifest(manifest_path, manifest)
+    submit_batches(client, request_files, manifest, manifest_path)
+    print(f"Wrote {manifest_path}; run: python batch_api.py collect {manifest_path} -o {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Convert a directory (or glob) of CV PDFs into UserProfile JSONL.
+
+    python batch_convert.py resumes/ -o profiles.jsonl --concurrency 16
+
+Every output line is {"file", "sha256", "profile"} on success or
+{"file", "sha256", "error"} on failure. The output file doubles as the
+checkpoint: re-running with the same -o skips CVs that already have a profile
+and retries the ones that failed.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+
+from openai import AsyncOpenAI
+
+from cv_pipeline import MODEL, IMAGE_MODE, STRUCTURED, VISION, RenderOptions, aconvert_pdf
+from profile_cache import ProfileCache
+from rate_limit import AsyncScheduledOpenAI
+from resources import environment
+
+
+def collect_pdf_paths(inputs):
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '**', '*'), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.update(os.path.abspath(path) for path in matches
+                     if path.lower().endswith('.pdf') and os.path.isfile(path))
+    return sorted(paths)
+
+
+def load_checkpoint(output_path):
+    """
+    Return the set of files that already have a profile in output_path.
+    A partially written last line (crash mid-write) is ignored.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('profile') is not None:
+                done.add(record['file'])
+    return done
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def convert_file(client, path, cache=None, vision=VISION, model=MODEL, image_mode=IMAGE_MODE,
+                       render_options=None, structured=STRUCTURED):
+    pdf_bytes = await asyncio.to_thread(read_file, path)
+    record = {"file": path, "sha256": hashlib.sha256(pdf_bytes).hexdigest()}
+    try:
+        profile = await aconvert_pdf(
+            client, pdf_bytes, cache, vision, model, image_mode, render_options, structured=structured
+        )
+        if profile is None:
+            raise ValueError("Failed to parse the user profile.")
+        record["profile"] = profile.model_dump()
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+async def convert_batch(paths, output_path, concurrency=8, cache=None, vision=VISION, model=MODEL,
+                        image_mode=IMAGE_MODE, render_options=None, client=None, structured=STRUCTURED):
+    client = client or AsyncScheduledOpenAI(AsyncOpenAI(max_retries=0))
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+
+    converted, failed = 0, 0
+    started = time.monotonic()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        async def worker():
+            nonlocal converted, failed
+            while True:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await convert_file(
+                    client, path, cache, vision, model, image_mode, render_options, structured
+                )
+                # Workers share one event loop thread, so whole lines never interleave
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                if "error" in record:
+                    failed += 1
+                    print(f"[error] {path}: {record['error']}")
+                else:
+                    converted += 1
+                done = converted + failed
+                if done % 10 == 0 or done == len(paths):
+                    print(f"{done}/{len(paths)} done ({failed} failed, {time.monotonic() - started:.1f}s)")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    return converted, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a directory of CV PDFs into UserProfile JSONL.")
+    parser.add_argument('inputs', nargs='+', help="directories or glob patterns of PDF files")
+    parser.add_argument('-o', '--output', required=True, help="JSONL output file, also used as the resume checkpoint")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="number of CVs converted at the same time")
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--vision', choices=['auto', 'always', 'never'], default=VISION,
+                        help="send page images always, never, or only when the text layer is poor")
+    parser.add_argument('--image-mode', choices=['pages', 'stitched'], default=IMAGE_MODE,
+                        help="send each page as its own image, or one stitched image")
+    parser.add_argument('--dpi', type=int, help="fixed render DPI (default: fit the model's image tiles)")
+    parser.add_argument('--max-side', type=int, default=RenderOptions().max_side, help="longest rendered page side in pixels")
+    parser.add_argument('--max-pixels', type=int, help="cap on rendered width * height per page")
+    parser.add_argument('--grayscale', action='store_true', help="render pages in grayscale")
+    parser.add_argument('--image-format', choices=['png', 'jpeg', 'webp'], default='png')
+    parser.add_argument('--quality', type=int, default=85, help="jpeg/webp quality")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the persistent profile cache")
+    parser.add_argument('--no-schema', action='store_true',
+                        help="ask for free-form JSON text instead of schema-constrained structured outputs")
+    args = parser.parse_args()
+
+    environment()
+    paths = collect_pdf_paths(args.inputs)
+    done = load_checkpoint(args.output)
+    pending = [path for path in paths if path not in done]
+    print(f"Found {len(paths)} PDFs, {len(done & set(paths))} already converted, {len(pending)} to go.")
+    if not pending:
+        return
+
+    cache = None if args.no_cache else ProfileCache()
+    render_options = RenderOptions(
+        dpi=args.dpi, max_side=args.max_side, max_pixels=args.max_pixels,
+        grayscale=args.grayscale, image_format=args.image_format, quality=args.quality,
+    )
+    converted, failed = asyncio.run(
+        convert_batch(
+            pending, args.output, args.concurrency, cache, args.vision, args.model, args.image_mode, render_options,
+            structured=not args.no_schema,
+        )
+    )
+    print(f"Converted {converted}, failed {failed}.")
+
+
+if __name__ == '__main__':
+    main()
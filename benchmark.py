@@ -0,0 +1,226 @@
+"""
+End-to-end benchmark of the conversion pipeline: PDF ingest (text and
+images), the chat completion, profile parsing and durations, at several
+concurrency levels.
+
+    python benchmark.py resumes/ --mock --concurrency 1 4 16
+    python benchmark.py resumes/ --base-url http://127.0.0.1:8001/v1 --requests 100
+
+--mock starts mock_openai.py in a thread of this process (its latency,
+token rate and error flags apply; it shares the CPU with the pipeline, so
+use a separate mock server for high concurrency levels); otherwise requests go to --base-url, or to
+OPENAI_BASE_URL / the OpenAI API. Every level converts --requests CVs
+(the PDFs cycled) with the profile cache off and reports throughput, p50
+and p99 latency, failures and the peak resident memory (RSS) of this
+process. The peak RSS is the highest since the start, so it belongs to the
+level where it first appears. The render pool's worker processes are
+counted once they exit, after the last level. --trace-memory also reports
+the peak Python allocation per level (tracemalloc slows Python code down).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from openai import AsyncOpenAI
+
+from batch_convert import collect_pdf_paths, read_file
+from cv_pipeline import MODEL, STRUCTURED, VISION, aconvert_pdf
+from mock_openai import add_config_arguments, config_from_arguments, create_app, load_responses
+from pdf_ingest import reset_render_pool
+from rate_limit import AsyncScheduledOpenAI, RateLimiter
+from resources import environment
+
+
+# The mock has no limits; the real budgets are set with --rpm / --tpm
+UNLIMITED = 10 ** 9
+
+
+def percentile(values, share):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def peak_rss_mib(children=False):
+    """
+    Returns:
+        float: peak resident memory of this process, or of its exited child
+        processes (the largest one), in MiB; None where getrusage is missing
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    peak = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return round(peak / 2 ** 20, 1)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def mock_server(config, responses):
+    """
+    Run mock_openai in a background thread for the duration of the block.
+
+    Yields:
+        str: its base URL
+    """
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(config, responses), host='127.0.0.1', port=port,
+                                           log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+async def run_level(client, pdfs, concurrency, total, model=MODEL, vision=VISION, stream=False,
+                    structured=STRUCTURED):
+    """
+    Convert total CVs, at most concurrency at a time.
+
+    Returns:
+        dict: wall seconds, per-CV latencies and the failure count
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def convert(pdf_bytes):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                profile = await aconvert_pdf(client, pdf_bytes, None, vision, model, structured=structured,
+                                             on_event=(lambda event: None) if stream else None)
+            except Exception:
+                profile = None
+            latencies.append(time.perf_counter() - started)
+            if profile is None:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(convert(pdfs[index % len(pdfs)]) for index in range(total)))
+    return {"wall": time.perf_counter() - started, "latencies": latencies, "failures": failures}
+
+
+async def benchmark(client, pdfs, levels, total, warmup=1, trace_memory=False, **options):
+    """
+    Returns:
+        dict: "levels", one result dict per concurrency level, and the peak
+        RSS of the render workers
+    """
+    # Starts the render pool and warms the connection pool outside the measurement
+    if warmup:
+        await run_level(client, pdfs, 1, warmup, **options)
+    results = []
+    for concurrency in levels:
+        if trace_memory:
+            tracemalloc.start()
+        level = await run_level(client, pdfs, concurrency, total, **options)
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        results.append({
+            "concurrency": concurrency,
+            "requests": total,
+            "failures": level["failures"],
+            "wall_seconds": round(level["wall"], 3),
+            "cvs_per_second": round(total / level["wall"], 3),
+            "p50_seconds": round(percentile(level["latencies"], 0.5), 3),
+            "p99_seconds": round(percentile(level["latencies"], 0.99), 3),
+            "peak_rss_mib": peak_rss_mib(),
+            "peak_traced_mib": round(peak / 2 ** 20, 1) if peak is not None else None,
+        })
+    # Child processes only count toward RUSAGE_CHILDREN once they have exited
+    reset_render_pool(wait=True)
+    return {"levels": results, "render_workers_peak_rss_mib": peak_rss_mib(children=True)}
+
+
+def print_report(results):
+    header = (f"{'concurrency':>11} {'requests':>8} {'failed':>6} {'wall s':>8} {'CV/s':>7} {'p50 s':>7} "
+              f"{'p99 s':>7} {'RSS MiB':>8} {'traced MiB':>10}")
+    print(header)
+    for row in results["levels"]:
+        rss = row['peak_rss_mib'] if row['peak_rss_mib'] is not None else '-'
+        traced = row['peak_traced_mib'] if row['peak_traced_mib'] is not None else '-'
+        print(f"{row['concurrency']:>11} {row['requests']:>8} {row['failures']:>6} {row['wall_seconds']:>8} "
+              f"{row['cvs_per_second']:>7} {row['p50_seconds']:>7} {row['p99_seconds']:>7} {rss:>8} {traced:>10}")
+    if results["render_workers_peak_rss_mib"]:
+        print(f"Render workers peak RSS: {results['render_workers_peak_rss_mib']} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF -> UserProfile conversion at several concurrency levels.")
+    parser.add_argument('inputs', nargs='+', help="directories or glob patterns of PDF files")
+    parser.add_argument('-c', '--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('-n', '--requests', type=int, help="conversions per level (default: one per PDF)")
+    parser.add_argument('--warmup', type=int, default=1, help="conversions run before measuring")
+    parser.add_argument('--mock', action='store_true', help="run against an in-process mock_openai server")
+    parser.add_argument('--base-url', help="OpenAI-compatible API base URL")
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--vision', choices=['auto', 'always', 'never'], default=VISION)
+    parser.add_argument('--stream', action='store_true', help="use the streaming request path")
+    parser.add_argument('--no-schema', action='store_true', help="free-form JSON instead of structured outputs")
+    parser.add_argument('--rpm', type=int, default=UNLIMITED, help="requests-per-minute budget of the client")
+    parser.add_argument('--tpm', type=int, default=UNLIMITED, help="tokens-per-minute budget of the client")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report the peak Python allocation (tracemalloc slows Python code down)")
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's own output")
+    parser.add_argument('-o', '--output', help="also write the results as JSON to this file")
+    add_config_arguments(parser.add_argument_group('mock server (with --mock)'))
+    args = parser.parse_args()
+    environment()
+
+    pdfs = [read_file(path) for path in collect_pdf_paths(args.inputs)]
+    if not pdfs:
+        parser.error("no PDF files found")
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if args.mock:
+            base_url = stack.enter_context(mock_server(config_from_arguments(args), load_responses(args.responses)))
+        client = AsyncScheduledOpenAI(
+            AsyncOpenAI(base_url=base_url, api_key="mock" if args.mock else None, max_retries=0),
+            RateLimiter(args.rpm, args.tpm),
+        )
+        print(f"Benchmarking {len(pdfs)} PDFs against {base_url or 'the OpenAI API'}")
+        # Pipeline prints (token usage, retries) would drown the report
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            # One event loop for all levels: the client's connections are bound to it
+            results = asyncio.run(benchmark(
+                client, pdfs, args.concurrency, args.requests or len(pdfs), args.warmup, args.trace_memory,
+                model=args.model, vision=args.vision, stream=args.stream, structured=not args.no_schema,
+            ))
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
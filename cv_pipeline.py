@@ -0,0 +1,957 @@
+import re
+import asyncio
+import contextvars
+import json
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from cv_sections import find_sections, section_fields
+from durations import CURRENT_DATE_MARKER, apply_durations
+from pdf_ingest import RenderOptions, fix_url, ingest_pdf
+from profile_cache import make_cache_key
+from prompt_budget import fit_to_budget
+from profile_repair import arepair_profile, repair_profile
+from profile_stream import ProfileStreamParser
+from token_estimates import estimate_response_format_tokens, estimate_text_tokens
+import telemetry
+
+
+MODEL = "gpt-4o-2024-08-06"
+DATETIME_FORMAT = "%d-%m-%Y"
+# "pages" sends every rendered page as its own image part, "stitched" pastes
+# all pages into one tall PNG first.
+IMAGE_MODE = "pages"
+# "auto" sends page images only when the text layer looks unreliable
+# (scanned, broken encoding, sections not found); "always"/"never" force one path.
+VISION = "auto"
+RENDER_IMAGES = {"auto": "auto", "always": True, "never": False}
+# "layout" sends the text in reading order with headings and bullets marked
+# (pdf_ingest.layout_text); "plain" is PyMuPDF's raw text output
+TEXT_MODE = "layout"
+# Structured outputs: the model is constrained to the UserProfile JSON schema
+# (response_format json_schema) and its answer is validated straight into the
+# models. False falls back to free-form JSON text and parse_user_profile.
+STRUCTURED = True
+LANGUAGE_DEGREES = ["Beginner", "Good", "Fluent", "Proficient", "Native/Bilingual", ""]
+# Long text-only CVs are split at their section headings and each section is
+# extracted by its own, smaller request, all running in parallel
+SPLIT_SECTIONS = True
+SPLIT_MIN_CHARS = 8000
+# Levels the model sometimes copies verbatim instead of normalizing
+LANGUAGE_DEGREE_ALIASES = {
+    "a1": "Beginner", "a2": "Beginner", "basic": "Beginner", "elementary": "Beginner",
+    "b1": "Good", "intermediate": "Good",
+    "b2": "Good", "upper intermediate": "Good", "upper-intermediate": "Good",
+    "c1": "Proficient", "c2": "Proficient", "advanced": "Proficient",
+    "native": "Native/Bilingual", "bilingual": "Native/Bilingual", "mother tongue": "Native/Bilingual",
+    "muttersprache": "Native/Bilingual",
+}
+# Computed locally from the dates (see durations.apply_durations), so the
+# schema does not ask the model for them
+COMPUTED_FIELDS = {
+    "UserProfile": ["totalWorkExperience", "totalEducationDuration"],
+    "WorkExperience": ["totalLength"],
+    "Education": ["totalLength"],
+}
+
+
+def cache_variant(vision=VISION, image_mode=IMAGE_MODE, render_options=None, structured=False,
+                  split_sections=False):
+    # Everything besides the PDF, prompt and model that changes what the model sees
+    if vision == "never":
+        variant = f"never:{TEXT_MODE}"
+    else:
+        variant = f"{vision}:{image_mode}:{TEXT_MODE}:{(render_options or RenderOptions()).fingerprint()}"
+    if structured:
+        variant += ":schema"
+    # Section-by-section extraction sends different requests for the same PDF
+    return variant + ":sections" if split_sections else variant
+
+
+def encode_image(image_bytes_io):
+    # Move to the beginning of the BytesIO buffer
+    image_bytes_io.seek(0)
+    # Encode the image data to base64
+    return base64.b64encode(image_bytes_io.read()).decode('utf-8')
+
+
+def convert_pdf_to_images(uploaded_file):
+    try:
+        return ingest_pdf(uploaded_file).images
+    except Exception as e:
+        print(f"Error converting PDF to images: {e}")
+        return None
+
+
+prompt = """
+Please extract the following details from the CV:
+
+1. Biography
+2. Work Experience and Education
+3. For each position or educational experience:
+   - Job Title or Degree
+   - Company or Institution
+   - Dates (Start and End)
+   - Description of responsibilities, achievements, or skills gained
+4. Skills
+5. Languages
+6. Publications
+7. Projects
+
+### Output JSON Format
+{
+    "name": "",
+    "emails": [],
+    "phones": [],
+    "links": [],
+    "location": "",
+    "biography": "",
+    "workExperience": [
+        {
+            "jobTitle": "",
+            "company": "",
+            "period": "",
+            "periodStart": "",  # Format: DD-MM-YYYY
+            "periodEnd": "",    # Format: DD-MM-YYYY
+            "description": ""
+        }
+    ],
+    "education": [
+        {
+            "degree": "",
+            "educationalInstitution": "",
+            "period": "",
+            "periodStart": "",  # Format: DD-MM-YYYY
+            "periodEnd": "",    # Format: DD-MM-YYYY
+            "description": ""
+        }
+    ],
+    "skills": [],
+    "languages": [
+        {
+            "name": "",
+            "degree": ""  # Options: Beginner, Good, Fluent, Proficient, Native/Bilingual
+        }
+    ],
+    "publications": [
+        {
+            "date": "",
+            "description": "",
+            "name": "",
+            "periodEnd": "",
+            "periodStart": "",
+            "publisher": "",
+            "tags": [],
+            "url": ""
+        }
+    ],
+    "projects": [
+        {
+            "date": "",
+            "description": "",
+            "name": "",
+            "periodEnd": "",
+            "periodStart": "",
+            "skills": [],
+            "url": ""
+        }
+    ]
+}
+
+### Instructions
+1. Use raw text from the uploaded CV to extract the data exactly as it appears. No summaries, no omissions.
+2. Use the provided image of the CV to:
+   - Verify the classification of sections (e.g., Work Experience vs. Education).
+   - Resolve ambiguities in dates, roles, or descriptions.
+3. Leave fields empty if information is missing.
+4. In the CV text, lines starting with "## " are headings and lines starting with "- " are list items; columns are already in reading order.
+5. Do NOT calculate any durations (no totalLength, totalWorkExperience or totalEducationDuration). Durations are computed from periodStart and periodEnd after extraction, so only the dates need to be correct.
+
+### Special Rules
+1. **Name, Emails, Phones, Links, and Location**:
+   - Extract from biography or contact information sections. Do not infer.
+2. **Work Experience**:
+   - Extract all positions with full details:
+     - Normalize missing months to January.
+     - If only one date is provided, verify using the CV image to determine if it's the start or end date. If uncertain, ignore. If there is only end date, do not assume start date, so only extract end date. Check CV image to verify if it is a work experience or education and if it start or end date. If there is a dilemma which date it is, do not make assumptions, leave both dates empty.
+     - Assume ongoing roles end today: {DATETIME}.
+   - Include verbatim descriptions of responsibilities and achievements.
+3. **Education**:
+   - Follow the same rules for periods and descriptions as Work Experience.
+   - For degrees with incomplete dates, check if other education entries also lack dates. If all dates are incomplete, leave periods empty. If there is only end date, do not assume start date, so only extract end date.
+4. **Skills**:
+   - List only the skill names (e.g., "Python", "SQL"). Exclude qualifiers.
+5. **Languages**:
+   - Normalize proficiency levels to: Beginner, Good, Fluent, Proficient, Native/Bilingual or empty. A B2 level is Good.
+6. **Publications and Projects**:
+   - Extract all details, including dates, description, and relevant URLs.
+   - For Projects, include skills used.
+
+### Examples
+1. Correct Work Experience Format:
+{
+    "jobTitle": "Data Scientist",
+    "company": "CompanyA",
+    "period": "Jan 2023 - ",
+    "periodStart": "01-01-2023",
+    "periodEnd": "",
+    "description": "Working on machine learning and AI projects."
+}
+
+2. Correct Education Format:
+{
+    "degree": "Ph.D. in Computer Science",
+    "educationalInstitution": "Stanford University",
+    "period": "2019 - ",
+    "periodStart": "01-01-2019",
+    "periodEnd": "",
+    "description": ""
+}
+
+3. Correct Skills:
+["Python", "Machine Learning", "Data Analysis"]
+
+4. Correct Languages:
+[
+    {"name": "English", "degree": "Native/Bilingual"},
+    {"name": "Spanish", "degree": "Proficient"}
+]
+
+### Notes
+- **Current Date**: {DATETIME}
+- Ensure periods are normalized to `DD-MM-YYYY` format.
+- Check the CV image for context and proper classification of sections.
+
+IMPORTANT NOTE FOR DATES:
+1. **General Rules for Dates**:
+   - If only one **year** is mentioned (e.g., "2021 VegalIT Full Stack Developer"), leave `periodStart` and `periodEnd` fields **empty**.
+   - If both a **month** and **year** are provided, use them for `periodStart` or `periodEnd`.
+   - If the date is open-ended (e.g., "2021 - ", "to present", "ongoing", or similar), use the **current date** ({DATETIME}) for `periodEnd`.
+   - If dates are written in a format like "Sep 2014 - 2018", **DO NOT normalize or assume a missing end month.** Keep the raw period.
+   - Normalize dates to the format DD-MM-YYYY. THIS MUST BE DONE IN THAT FORMAT AND NOT IN ANY OTHER FORMAT NO MATTER WHICH DATE IS USED IN THE PERIOD.
+
+2. **Specific Cases**:
+   - If **only years** are mentioned (e.g., "2014 - 2018"), assume the dates are:
+     - `periodStart`: "01-01-2014" #MUST BE IN THE FORMAT DD-MM-YYYY
+     - `periodEnd`: "01-01-2018" #MUST BE IN THE FORMAT DD-MM-YYYY
+   - If the period is written as "2019 - ", assume:
+     - `periodStart`: "01-01-2019"  #MUST BE IN THE FORMAT DD-MM-YYYY
+     - `periodEnd`: Current Date ({DATETIME}). #MUST BE IN THE FORMAT DD-MM-YYYY
+   - For periods with **incomplete dates** (e.g., "2021"), leave both `periodStart` and `periodEnd` **empty**.
+
+3. **Date Examples**:
+   - "2017-2020" translates to:
+     - `periodStart`: "01-01-2017"
+     - `periodEnd`: "01-01-2020"
+   - If only "2017" is mentioned:
+     - `periodStart`: ""
+     - `periodEnd`: ""
+
+4. **Handling Edge Cases**:
+   - If multiple entries in Work Experience or Education have only years (e.g., "2018 - ", "2020 - Present"), ensure consistency by normalizing as described above.
+   - Use the CV image to resolve ambiguities when deciding whether an entry should be treated as ongoing or closed.
+
+5. **Examples**:
+   - Correct Extraction:
+     {
+         "jobTitle": "IT Support",
+         "company": "NCR Voyix",
+         "period": "19.06.2023 - ",
+         "periodStart": "19-06-2023",
+         "periodEnd": "{DATETIME}",
+         "description": "..."
+     }
+   - Correct Handling of Only Years:
+     {
+         "jobTitle": "Private Tutor",
+         "company": "Adobe Programs",
+         "period": "2017 - 2020",
+         "periodStart": "01-01-2017",
+         "periodEnd": "01-01-2020",
+         "description": "..."
+     }
+
+This applies to all experiences where only the year is provided. DO NOT assume a start or end month unless explicitly mentioned in the CV.
+"""
+
+    
+    
+
+class WorkExperience(BaseModel):
+    jobTitle: Optional[str] = Field(None, alias='jobTitle')
+    company: Optional[str] = Field(None, alias='company')
+    period: Optional[str] = Field(None, alias='period')
+    periodStart: Optional[str] = Field(None, alias='periodStart')
+    periodEnd: Optional[str] = Field(None, alias='periodEnd')
+    totalLength: Optional[str] = Field(None, alias='totalLength')
+    description: Optional[str] = Field(None, alias='description')
+
+class Education(BaseModel):
+    degree: Optional[str] = Field(None, alias='degree')
+    educationalInstitution: Optional[str] = Field(None, alias='educationalInstitution')
+    period: Optional[str] = Field(None, alias='period')
+    periodStart: Optional[str] = Field(None, alias='periodStart')
+    periodEnd: Optional[str] = Field(None, alias='periodEnd')
+    totalLength: Optional[str] = Field(None, alias='totalLength')
+    description: Optional[str] = Field(None, alias='description')
+
+class Language(BaseModel):
+    name: Optional[str] = Field(None, alias='name')
+    degree: Optional[str] = Field(None, alias='degree')
+
+    @field_validator('degree')
+    def validate_degree(cls, v):
+        if v in LANGUAGE_DEGREES:
+            return v
+        if isinstance(v, str):
+            normalized = v.strip().lower()
+            for degree in LANGUAGE_DEGREES:
+                if degree and normalized == degree.lower():
+                    return degree
+            # "B2", "C1 (business)", "Native speaker"
+            for alias, degree in LANGUAGE_DEGREE_ALIASES.items():
+                if re.match(rf'{re.escape(alias)}\b', normalized):
+                    return degree
+        return ''
+
+    
+class Publication(BaseModel):
+    date: Optional[str] = Field(None, alias='date')
+    description: Optional[str] = Field(None, alias='description')
+    name: Optional[str] = Field(None, alias='name')
+    periodEnd: Optional[str] = Field(None, alias='periodEnd')
+    periodStart: Optional[str] = Field(None, alias='periodStart')
+    publisher: Optional[str] = Field(None, alias='publisher')
+    tags: Optional[List[str]] = Field(None, alias='tags')
+    url: Optional[str] = Field(None, alias='url')
+    
+class Project(BaseModel):
+    date: Optional[str] = Field(None, alias='date')
+    description: Optional[str] = Field(None, alias='description')
+    name: Optional[str] = Field(None, alias='name')
+    periodEnd: Optional[str] = Field(None, alias='periodEnd')
+    periodStart: Optional[str] = Field(None, alias='periodStart')
+    skills: Optional[List[str]] = Field(None, alias='skills')
+    url: Optional[str] = Field(None, alias='url')
+
+class UserProfile(BaseModel):
+    name: Optional[str] = Field(None, alias='name')
+    emails: Optional[List[str]] = Field(None, alias='emails')
+    phones: Optional[List[str]] = Field(None, alias='phones')
+    links: Optional[List[str]] = Field(None, alias='links')
+    location: Optional[str] = Field(None, alias='location')
+    biography: Optional[str] = Field(None, alias='biography')
+    totalWorkExperience: Optional[str] = Field(None, alias='totalWorkExperience')
+    totalEducationDuration: Optional[str] = Field(None, alias='totalEducationDuration')
+    workExperience: List[WorkExperience] = Field(default_factory=list, alias='workExperience')
+    education: List[Education] = Field(default_factory=list, alias='education')
+    skills: List[str] = Field(default_factory=list, alias='skills')
+    languages: List[Language] = Field(default_factory=list, alias='languages')
+    publications: List[Publication] = Field(default_factory=list, alias='publications')
+    projects: List[Project] = Field(default_factory=list, alias='projects')
+
+def extract_json_from_string(input_string: str) -> dict:
+    try:
+        json_str = re.search(r'{.*}', input_string, re.DOTALL).group()
+        return json.loads(json_str)
+    except (AttributeError, json.JSONDecodeError):
+        print("No valid JSON found in the input string.")
+        return {}
+
+def parse_user_profile(input_string: str) -> Optional[UserProfile]:
+    data = extract_json_from_string(input_string)
+    if not data:
+        return None
+    try:
+        cleaned_data = {
+            "name": data.get("name", ""),
+            "emails": data.get("emails", []),
+            "phones": data.get("phones", []),
+            "links": [fix_url(link) for link in data.get("links", [])],
+            "location": data.get("location", ""),
+            "biography": data.get("biography", ""),
+            "totalWorkExperience": data.get("totalWorkExperience", ""),
+            "totalEducationDuration": data.get("totalEducationDuration", ""),
+            "workExperience": [
+                {
+                    "jobTitle": we.get("jobTitle", ""),
+                    "company": we.get("company", ""),
+                    "period": we.get("period", ""),
+                    "periodStart": we.get("periodStart", ""),
+                    "periodEnd": we.get("periodEnd", ""),
+                    "totalLength": we.get("totalLength", ""),
+                    "description": we.get("description", "")
+                } for we in data.get("workExperience", [])
+            ],
+            "education": [
+                {
+                    "degree": ed.get("degree", ""),
+                    "educationalInstitution": ed.get("educationalInstitution", ""),
+                    "period": ed.get("period", ""),
+                    "periodStart": ed.get("periodStart", ""),
+                    "periodEnd": ed.get("periodEnd", ""),
+                    "totalLength": ed.get("totalLength", ""),
+                    "description": ed.get("description", "")
+                } for ed in data.get("education", [])
+            ],
+            "skills": data.get("skills", []),
+            "languages": [
+                {
+                    "name": lang.get("name", ""),
+                    "degree": lang.get("degree", "")
+                } for lang in data.get("languages", [])
+            ],
+            "publications": [
+                {
+                    "date": pub.get("date", ""),
+                    "description": pub.get("description", ""),
+                    "name": pub.get("name", ""),
+                    "periodEnd": pub.get("periodEnd", ""),
+                    "periodStart": pub.get("periodStart", ""),
+                    "publisher": pub.get("publisher", ""),
+                    "tags": pub.get("tags", []),
+                    "url": pub.get("url", "")
+                } for pub in data.get("publications", [])
+            ],
+            "projects": [
+                {
+                    "date": proj.get("date", ""),
+                    "description": proj.get("description", ""),
+                    "name": proj.get("name", ""),
+                    "periodEnd": proj.get("periodEnd", ""),
+                    "periodStart": proj.get("periodStart", ""),
+                    "skills": proj.get("skills", []),
+                    "url": proj.get("url", "")
+                } for proj in data.get("projects", [])
+            ]
+        }
+
+        user_profile = UserProfile(**cleaned_data)
+        return user_profile
+    except ValidationError as e:
+        print(f"Validation error: {e}")
+        return None
+    except (TypeError, AttributeError) as e:
+        # A section of the wrong shape, e.g. null or a list of strings instead of objects
+        print(f"Unexpected profile structure: {type(e).__name__}: {e}")
+        return None
+
+
+def strict_schema(node):
+    """
+    Turn a pydantic JSON schema into one accepted by strict structured
+    outputs: every object closed and all of its properties required, optional
+    values collapsed to their non-null type, no titles or defaults.
+    """
+    if isinstance(node, list):
+        return [strict_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "anyOf" in node:
+        branches = [branch for branch in node["anyOf"] if branch.get("type") != "null"]
+        if len(branches) == 1:
+            return strict_schema(branches[0])
+    node = {
+        # Property and definition names are field names, not schema keywords
+        key: {name: strict_schema(child) for name, child in value.items()} if key in ("properties", "$defs")
+        else strict_schema(value)
+        for key, value in node.items() if key not in ("title", "default")
+    }
+    if node.get("type") == "object" and "properties" in node:
+        node["required"] = list(node["properties"])
+        node["additionalProperties"] = False
+    return node
+
+
+def profile_json_schema():
+    schema = UserProfile.model_json_schema(by_alias=True)
+    definitions = schema["$defs"]
+    for name, fields in COMPUTED_FIELDS.items():
+        properties = schema["properties"] if name == "UserProfile" else definitions[name]["properties"]
+        for field in fields:
+            properties.pop(field)
+    definitions["Language"]["properties"]["degree"] = {"type": "string", "enum": LANGUAGE_DEGREES}
+    return strict_schema(schema)
+
+
+def response_format(structured):
+    if not structured:
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "user_profile", "strict": True, "schema": profile_json_schema()},
+        }
+    }
+
+
+def parse_structured_profile(content) -> Optional[UserProfile]:
+    """
+    Validate a structured-outputs answer directly into a UserProfile.
+    Returns None for a refusal (no content) or an answer cut off mid-JSON.
+    """
+    if not content:
+        print("No profile returned by the model.")
+        return None
+    try:
+        user_profile = UserProfile.model_validate_json(content)
+    except ValidationError as e:
+        print(f"Validation error: {e}")
+        return None
+    user_profile.links = [fix_url(link) for link in user_profile.links or []]
+    return user_profile
+
+
+def parse_profile(content, structured=False) -> Optional[UserProfile]:
+    with telemetry.span("parse", bytes_in=len(content or ''), structured=structured) as stage:
+        profile = parse_structured_profile(content) if structured else parse_user_profile(content)
+        stage.set(parsed=profile is not None)
+    return profile
+
+
+def repair_user_profile(content, client=None, model=MODEL) -> Optional[UserProfile]:
+    """
+    Fallback for an answer parse_profile rejected: keep every section that
+    validates and fix the rest locally or with a small follow-up request
+    (see profile_repair).
+    """
+    with telemetry.span("repair", bytes_in=len(content or '')):
+        user_profile = repair_profile(content, UserProfile, client, model)
+    if user_profile:
+        user_profile.links = [fix_url(link) for link in user_profile.links or []]
+    return user_profile
+
+
+async def arepair_user_profile(content, client=None, model=MODEL) -> Optional[UserProfile]:
+    with telemetry.span("repair", bytes_in=len(content or '')):
+        user_profile = await arepair_profile(content, UserProfile, client, model)
+    if user_profile:
+        user_profile.links = [fix_url(link) for link in user_profile.links or []]
+    return user_profile
+
+
+def extract_raw_text_from_pdf(pdf_file):
+    return ingest_pdf(pdf_file, render_images=False).raw_text
+ 
+def image_mime(img_bytes_io):
+    header = img_bytes_io.getvalue()[:12]
+    if header.startswith(b'\xff\xd8'):
+        return "image/jpeg"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "image/webp"
+    return "image/png"
+
+
+def image_parts_per_page(images):
+    # The rendered page bytes are already encoded, so they go out as-is
+    return [
+        {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{image_mime(img_bytes)};base64,{encode_image(img_bytes)}"
+            },
+        }
+        for img_bytes in images
+    ]
+
+
+def image_parts_stitched(images):
+    pil_images = []
+    total_height = 0
+    max_width = 0
+
+    for img_bytes in images:
+        img = Image.open(img_bytes)
+        pil_images.append(img)
+        total_height += img.height
+        max_width = max(max_width, img.width)
+
+    # Create new image with combined height
+    combined_image = Image.new('RGB', (max_width, total_height))
+
+    # Paste images
+    y_offset = 0
+    for img in pil_images:
+        combined_image.paste(img, (0, y_offset))
+        y_offset += img.height
+
+    # Convert to bytes
+    combined_bytes = BytesIO()
+    combined_image.save(combined_bytes, format='PNG')
+    encoded_image = encode_image(combined_bytes)
+
+    return [
+        {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/png;base64,{encoded_image}"
+            },
+        }
+    ]
+
+
+def static_prompt(prompt):
+    # The date changes daily; leaving a fixed marker in its place keeps the
+    # instruction block byte-identical across days and CVs
+    return prompt.replace("{DATETIME}", CURRENT_DATE_MARKER)
+
+
+def dated_cv_text(raw_text, today=None, date_format=DATETIME_FORMAT):
+    date = (today or datetime.now()).strftime(date_format)
+    return f"{CURRENT_DATE_MARKER} is {date}. Use it wherever the instructions say {CURRENT_DATE_MARKER}.\n\n{raw_text}"
+
+
+def build_messages(raw_text, prompt, images=None, image_mode=IMAGE_MODE):
+    """
+    Static instructions first, as the system message, and everything that
+    varies (date, CV text, page images) after them in the user message, so the
+    provider can serve the instruction prefix from its prompt cache.
+    """
+    with telemetry.span("build_messages", images=len(images or []), image_mode=image_mode) as stage:
+        messages = messages_with_images(raw_text, prompt, images, image_mode)
+        stage.add(bytes_in=sum(len(image.getvalue()) for image in images or []),
+                  bytes_out=sum(len(part.get("text") or part["image_url"]["url"]) for part in messages[1]["content"]))
+    return messages
+
+
+def messages_with_images(raw_text, prompt, images=None, image_mode=IMAGE_MODE):
+    messages_content = [
+        {
+            "type": "text",
+            "text": dated_cv_text(raw_text),
+        }
+    ]
+
+    if images:
+        if image_mode == "stitched":
+            messages_content.extend(image_parts_stitched(images))
+        elif image_mode == "pages":
+            messages_content.extend(image_parts_per_page(images))
+        else:
+            raise ValueError(f"Unknown image mode: {image_mode}")
+
+    return [
+        {
+            "role": "system",
+            "content": static_prompt(prompt),
+        },
+        {
+            "role": "user",
+            "content": messages_content,
+        }
+    ]
+
+
+def instruction_tokens(structured=STRUCTURED):
+    # Everything in a request besides the CV itself, the structured-outputs schema included
+    return (estimate_text_tokens(static_prompt(prompt) + dated_cv_text(''))
+            + estimate_response_format_tokens(response_format(structured).get("response_format")))
+
+
+def cached_prompt_tokens(usage):
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        return details.get('cached_tokens') or 0
+    return getattr(details, 'cached_tokens', None) or 0
+
+
+def report_usage(usage):
+    if usage is None:
+        return
+    telemetry.add(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                  cached_tokens=cached_prompt_tokens(usage))
+    print(f"Prompt tokens: {usage.prompt_tokens} ({cached_prompt_tokens(usage)} cached), "
+          f"completion tokens: {usage.completion_tokens}")
+
+
+def extract_info_with_gpt(client, raw_text, prompt, images=None, model=MODEL, image_mode=IMAGE_MODE,
+                          structured=False):
+    messages = build_messages(raw_text, prompt, images, image_mode)
+    with telemetry.span("llm", model=model, stream=False) as stage:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            top_p=1,
+            **response_format(structured)
+        )
+
+        report_usage(completion.usage)
+        response = completion.choices[0].message.content or ""
+        stage.add(bytes_out=len(response))
+    return response.strip()
+
+
+async def aextract_info_with_gpt(client, raw_text, prompt, images=None, model=MODEL, image_mode=IMAGE_MODE,
+                                 structured=False):
+    """
+    Same as extract_info_with_gpt, for an AsyncOpenAI client. Image stitching
+    runs in a worker thread so it does not block the event loop.
+    """
+    messages = await asyncio.to_thread(build_messages, raw_text, prompt, images, image_mode)
+    with telemetry.span("llm", model=model, stream=False) as stage:
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            top_p=1,
+            **response_format(structured)
+        )
+
+        report_usage(completion.usage)
+        response = completion.choices[0].message.content or ""
+        stage.add(bytes_out=len(response))
+    return response.strip()
+
+
+def stream_info_with_gpt(client, raw_text, prompt, images=None, model=MODEL, image_mode=IMAGE_MODE,
+                         on_event=None, structured=False):
+    """
+    Streaming variant of extract_info_with_gpt. on_event is called with each
+    ("field" | "item", key, value) event as soon as that part of the profile
+    JSON has been generated.
+
+    Returns:
+        str: the full model response
+    """
+    parser = ProfileStreamParser()
+    messages = build_messages(raw_text, prompt, images, image_mode)
+    with telemetry.span("llm", model=model, stream=True) as stage:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            top_p=1,
+            stream=True,
+            stream_options={"include_usage": True},
+            **response_format(structured)
+        )
+        for chunk in stream:
+            if chunk.usage:
+                report_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                stage.add(bytes_out=len(delta))
+                for event in parser.feed(delta):
+                    if on_event:
+                        on_event(event)
+    return parser.text().strip()
+
+
+async def astream_info_with_gpt(client, raw_text, prompt, images=None, model=MODEL, image_mode=IMAGE_MODE,
+                                on_event=None, structured=False):
+    """
+    Same as stream_info_with_gpt, for an AsyncOpenAI client.
+    """
+    parser = ProfileStreamParser()
+    messages = await asyncio.to_thread(build_messages, raw_text, prompt, images, image_mode)
+    with telemetry.span("llm", model=model, stream=True) as stage:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            top_p=1,
+            stream=True,
+            stream_options={"include_usage": True},
+            **response_format(structured)
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                report_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                stage.add(bytes_out=len(delta))
+                for event in parser.feed(delta):
+                    if on_event:
+                        on_event(event)
+    return parser.text().strip()
+
+
+def plan_sections(ingested):
+    """
+    Returns:
+        dict: section name -> (section text, profile fields to extract), or
+        None when the CV should go out as a single request: short CVs, CVs
+        that need page images, or CVs without recognizable sections
+    """
+    if ingested.has_images or len(ingested.raw_text) < SPLIT_MIN_CHARS:
+        return None
+    sections = find_sections(ingested.pages)
+    if len(sections) < 2:
+        return None
+    fields = section_fields(sections)
+    return {section: (text, fields[section]) for section, text in sections.items()}
+
+
+def section_cv_text(section, text, fields):
+    return (f"This is the {section} part of a longer CV. Extract only {', '.join(fields)} from it "
+            f"and leave every other field empty.\n\n{text}")
+
+
+def merge_section_profile(merged, section_profile, fields, on_event=None):
+    # Each section only contributes the fields it was asked for
+    values = section_profile.model_dump()
+    for field in fields:
+        if isinstance(getattr(merged, field), list):
+            getattr(merged, field).extend(getattr(section_profile, field) or [])
+        else:
+            setattr(merged, field, getattr(section_profile, field))
+        if on_event:
+            on_event(("field", field, values[field]))
+
+
+def extract_profile_by_section(client, sections, model=MODEL, structured=False, on_event=None):
+    """
+    One extraction request per section (see plan_sections), run in parallel
+    threads and merged into one UserProfile. on_event gets a "field" event
+    for every field of a section as soon as that section is done.
+    """
+    def extract_section(section):
+        text, fields = sections[section]
+        with telemetry.span("section", section=section):
+            content = extract_info_with_gpt(
+                client, section_cv_text(section, text, fields), prompt, model=model, structured=structured
+            )
+            return parse_profile(content, structured) or repair_user_profile(content, client, model)
+
+    merged = UserProfile()
+    with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+        # Each thread gets a copy of the caller's context, so its spans nest under the conversion
+        futures = {
+            executor.submit(contextvars.copy_context().run, extract_section, section): section
+            for section in sections
+        }
+        for future in as_completed(futures):
+            section_profile = future.result()
+            if section_profile:
+                merge_section_profile(merged, section_profile, sections[futures[future]][1], on_event)
+    return merged
+
+
+async def aextract_profile_by_section(client, sections, model=MODEL, structured=False, on_event=None):
+    """
+    Same as extract_profile_by_section, for an AsyncOpenAI client.
+    """
+    async def extract_section(section):
+        text, fields = sections[section]
+        with telemetry.span("section", section=section):
+            content = await aextract_info_with_gpt(
+                client, section_cv_text(section, text, fields), prompt, model=model, structured=structured
+            )
+            section_profile = parse_profile(content, structured) or await arepair_user_profile(content, client, model)
+        return section, section_profile
+
+    merged = UserProfile()
+    for next_done in asyncio.as_completed([extract_section(section) for section in sections]):
+        section, section_profile = await next_done
+        if section_profile:
+            merge_section_profile(merged, section_profile, sections[section][1], on_event)
+    return merged
+
+
+def convert_pdf(client, pdf_bytes, cache=None, vision=VISION, model=MODEL, image_mode=IMAGE_MODE,
+                render_options=None, on_event=None, structured=STRUCTURED,
+                split_sections=SPLIT_SECTIONS) -> Optional[UserProfile]:
+    """
+    Full PDF -> UserProfile conversion, answered from cache when possible.
+    With on_event, the model output is streamed and partial sections are
+    reported as they complete (see stream_info_with_gpt). With structured,
+    the answer is constrained to the profile JSON schema. With
+    split_sections, long text-only CVs are extracted section by section
+    (see plan_sections).
+
+    Returns:
+        UserProfile, or None if the model output could not be parsed
+    """
+    with telemetry.span("convert_pdf", bytes_in=len(pdf_bytes), model=model, vision=vision) as conversion:
+        cache_key = make_cache_key(
+            pdf_bytes, prompt, model, datetime.now().strftime(DATETIME_FORMAT),
+            cache_variant(vision, image_mode, render_options, structured, split_sections),
+        )
+        with telemetry.span("cache_get", enabled=bool(cache)):
+            cached_profile = cache.get(cache_key) if cache else None
+        if cached_profile:
+            conversion.set(cached=True)
+            return UserProfile.model_validate_json(cached_profile)
+
+        # Open the PDF once; pages are rendered only if the text layer needs backing up
+        ingested = ingest_pdf(pdf_bytes, RENDER_IMAGES[vision], render_options, TEXT_MODE)
+        ingested = fit_to_budget(ingested, instruction_tokens(structured))
+        sections = plan_sections(ingested) if split_sections else None
+        if sections:
+            parsed_profile = extract_profile_by_section(client, sections, model, structured, on_event)
+        else:
+            if on_event:
+                extracted_info = stream_info_with_gpt(
+                    client, ingested.raw_text, prompt, ingested.images, model, image_mode, on_event, structured
+                )
+            else:
+                extracted_info = extract_info_with_gpt(
+                    client, ingested.raw_text, prompt, ingested.images, model=model, image_mode=image_mode,
+                    structured=structured
+                )
+            parsed_profile = parse_profile(extracted_info, structured)
+            if parsed_profile is None:
+                parsed_profile = repair_user_profile(extracted_info, client, model)
+        if parsed_profile:
+            with telemetry.span("durations"):
+                apply_durations(parsed_profile)
+        if parsed_profile and cache:
+            with telemetry.span("cache_set"):
+                cache.set(cache_key, parsed_profile.model_dump_json())
+        return parsed_profile
+
+
+async def aconvert_pdf(client, pdf_bytes, cache=None, vision=VISION, model=MODEL, image_mode=IMAGE_MODE,
+                       render_options=None, on_event=None, structured=STRUCTURED,
+                       split_sections=SPLIT_SECTIONS) -> Optional[UserProfile]:
+    """
+    Same as convert_pdf, for an AsyncOpenAI client. PDF work and cache
+    access run in worker threads.
+    """
+    with telemetry.span("convert_pdf", bytes_in=len(pdf_bytes), model=model, vision=vision) as conversion:
+        cache_key = make_cache_key(
+            pdf_bytes, prompt, model, datetime.now().strftime(DATETIME_FORMAT),
+            cache_variant(vision, image_mode, render_options, structured, split_sections),
+        )
+        with telemetry.span("cache_get", enabled=bool(cache)):
+            cached_profile = await asyncio.to_thread(cache.get, cache_key) if cache else None
+        if cached_profile:
+            conversion.set(cached=True)
+            return UserProfile.model_validate_json(cached_profile)
+
+        ingested = await asyncio.to_thread(ingest_pdf, pdf_bytes, RENDER_IMAGES[vision], render_options, TEXT_MODE)
+        ingested = await asyncio.to_thread(fit_to_budget, ingested, instruction_tokens(structured))
+        sections = plan_sections(ingested) if split_sections else None
+        if sections:
+            parsed_profile = await aextract_profile_by_section(client, sections, model, structured, on_event)
+        else:
+            if on_event:
+                extracted_info = await astream_info_with_gpt(
+                    client, ingested.raw_text, prompt, ingested.images, model, image_mode, on_event, structured
+                )
+            else:
+                extracted_info = await aextract_info_with_gpt(
+                    client, ingested.raw_text, prompt, ingested.images, model=model, image_mode=image_mode,
+                    structured=structured
+                )
+            parsed_profile = parse_profile(extracted_info, structured)
+            if parsed_profile is None:
+                parsed_profile = await arepair_user_profile(extracted_info, client, model)
+        if parsed_profile:
+            with telemetry.span("durations"):
+                apply_durations(parsed_profile)
+        if parsed_profile and cache:
+            with telemetry.span("cache_set"):
+                await asyncio.to_thread(cache.set, cache_key, parsed_profile.model_dump_json())
+        return parsed_profile
@@ -0,0 +1,76 @@
+import re
+from typing import Dict, List
+
+
+# Checked in order, so "Language skills" is languages and "Research projects" is projects
+SECTION_PATTERNS = [
+    ("publications", re.compile(r'publications|papers|veröffentlichungen|publikationen', re.IGNORECASE)),
+    ("projects", re.compile(r'projects|projekte', re.IGNORECASE)),
+    ("languages", re.compile(r'languages|sprachen', re.IGNORECASE)),
+    ("experience", re.compile(r'experience|employment|work history|career|erfahrung|beruf', re.IGNORECASE)),
+    ("education", re.compile(r'education|academic|studies|qualifications|ausbildung|bildung|studium', re.IGNORECASE)),
+    ("skills", re.compile(r'skills|competenc|expertise|technologies|kenntnisse|fähigkeiten|kompetenzen',
+                          re.IGNORECASE)),
+    ("general", re.compile(r'summary|profile|about me|contact|personal|kontakt|profil|über mich|persönlich',
+                           re.IGNORECASE)),
+]
+
+# Profile fields each section is responsible for. "general" (contact block
+# and summary) also takes every field whose section was not found, so nothing
+# is lost when a heading is missed.
+SECTION_FIELDS = {
+    "general": ["name", "emails", "phones", "links", "location", "biography"],
+    "experience": ["workExperience"],
+    "education": ["education"],
+    "skills": ["skills"],
+    "languages": ["languages"],
+    "publications": ["publications"],
+    "projects": ["projects"],
+}
+
+
+def classify_heading(heading):
+    # None for headings of no known section, such as job titles set as headings
+    for section, pattern in SECTION_PATTERNS:
+        if pattern.search(heading):
+            return section
+    return None
+
+
+def find_sections(pages) -> Dict[str, str]:
+    """
+    Split the text of an ingested PDF at the heading lines that name a known
+    section; other headings stay in the section they appear in.
+
+    Args:
+        pages: list of PageContent with text, links and headings
+
+    Returns:
+        dict: section name -> text, in order of first appearance. Sections
+        with the same name are joined; URI links go to "general".
+    """
+    sections = {"general": []}
+    current = "general"
+    for page in pages:
+        headings = list(page.headings)
+        for line in page.text.split('\n'):
+            if headings and line.strip() == headings[0]:
+                headings.pop(0)
+                current = classify_heading(line) or current
+                sections.setdefault(current, [])
+            sections[current].append(line)
+        sections["general"].extend(page.links)
+    return {section: '\n'.join(lines).strip() for section, lines in sections.items() if ''.join(lines).strip()}
+
+
+def section_fields(sections) -> Dict[str, List[str]]:
+    """
+    Returns:
+        dict: section name -> the profile fields its extraction call fills
+    """
+    fields = {section: list(SECTION_FIELDS[section]) for section in sections}
+    if "general" in fields:
+        for section, owned in SECTION_FIELDS.items():
+            if section not in sections:
+                fields["general"].extend(owned)
+    return fields
@@ -0,0 +1,373 @@
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from pydantic import BaseModel, Field
+
+
+DATE_FORMAT = "%d-%m-%Y"
+# Stands in for the request date in the instructions (see cv_pipeline.static_prompt)
+CURRENT_DATE_MARKER = "CURRENT_DATE"
+
+
+def calculate_duration(date_ranges, today=None):
+    """
+    Calculate total duration from a list of date ranges, considering overlaps and gaps.
+
+    Args:
+        date_ranges: List of tuples containing date strings in format (start_date, end_date)
+                    where dates are in "DD-MM-YYYY" format
+        today: end date for open-ended ranges, defaults to now
+
+    Returns:
+        tuple: (years, months) representing the total duration
+    """
+    merged_ranges = merge_date_ranges(to_datetime_ranges(date_ranges, today))
+    total_months = sum(range_months(start, end) for start, end in merged_ranges)
+
+    # Convert total months to years and months
+    years = total_months // 12
+    remaining_months = total_months % 12
+
+    return years, remaining_months
+
+
+def calculate_years_months(date1, date2, today=None):
+
+    if date1 == "":
+        return 0, 0
+
+    d1 = datetime.strptime(date1, DATE_FORMAT)
+
+    if date2 == "":
+        d2 = today or datetime.now()
+    else:
+        d2 = datetime.strptime(date2, DATE_FORMAT)
+        d2 = d2 - timedelta(days=1)
+
+    years = d2.year - d1.year
+    months = d2.month - d1.month
+
+    if d2.day >= d1.day:
+        months += 1
+
+    if months >= 12:
+        years += 1
+        months -= 12
+
+    if months < 0:
+        years -= 1
+        months += 12
+
+    return years, months
+
+
+def to_datetime_ranges(date_ranges, today=None):
+    # Convert date strings to datetime objects and sort by start date
+    today = today or datetime.now()
+    ranges = [(datetime.strptime(start, DATE_FORMAT),
+               today if not end else datetime.strptime(end, DATE_FORMAT))
+              for start, end in date_ranges if start]
+    ranges.sort()
+    return ranges
+
+
+def merge_date_ranges(ranges):
+    # Merge overlapping ranges; expects ranges sorted by start date
+    merged_ranges = []
+    if ranges:
+        current_start, current_end = ranges[0]
+
+        for start, end in ranges[1:]:
+            if start <= current_end:  # Overlapping or contiguous range
+                current_end = max(current_end, end)
+            else:  # Non-overlapping range
+                merged_ranges.append((current_start, current_end))
+                current_start, current_end = start, end
+
+        merged_ranges.append((current_start, current_end))
+    return merged_ranges
+
+
+def range_months(start, end):
+    # Calculate the difference including partial months
+    diff = relativedelta(end, start)
+    months = diff.years * 12 + diff.months
+
+    # If there are any days, round up to next month
+    if diff.days > 0:
+        months += 1
+
+    return months
+
+
+def format_duration(years, months):
+    duration_str = ""
+    if years > 0:
+        duration_str += f"{years} year{'s' if years != 1 else ''}"
+    if months > 0:
+        if duration_str:
+            duration_str += " "
+        duration_str += f"{months} month{'s' if months != 1 else ''}"
+    return duration_str
+
+
+def is_valid_date(value):
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def valid_period(start, end):
+    """
+    Return (start, end) if both dates are usable, None otherwise. Entries
+    without a start date, or with dates the model did not normalize to
+    DD-MM-YYYY, are left out of every calculation.
+    """
+    start, end = start or "", end or ""
+    if not is_valid_date(start):
+        return None
+    if end and not is_valid_date(end):
+        return None
+    return start, end
+
+
+class DurationSummary(BaseModel):
+    entry_lengths: List[str] = Field(default_factory=list)  # one per entry, "" if not computable
+    total_months: int = 0  # overlap-merged
+    total: str = ""
+    gap_count: int = 0
+    gap_months: int = 0
+    longest_gap_months: int = 0
+
+
+class ProfileDurations(BaseModel):
+    work: DurationSummary = Field(default_factory=DurationSummary)
+    education: DurationSummary = Field(default_factory=DurationSummary)
+    projects: DurationSummary = Field(default_factory=DurationSummary)
+
+
+def summarize_periods(periods, today=None) -> DurationSummary:
+    """
+    Args:
+        periods: list of (periodStart, periodEnd) string pairs, one per entry
+        today: end date for ongoing entries, defaults to now
+
+    Returns:
+        DurationSummary: per-entry lengths, the overlap-merged total and the
+        gaps between merged ranges
+    """
+    today = today or datetime.now()
+    valid = [valid_period(start, end) for start, end in periods]
+
+    entry_lengths = []
+    for period in valid:
+        if period is None:
+            entry_lengths.append("")
+            continue
+        years, months = calculate_years_months(*period, today=today)
+        entry_lengths.append(format_duration(years, months) if years >= 0 else "")
+
+    merged_ranges = merge_date_ranges(to_datetime_ranges([p for p in valid if p], today))
+    total_months = sum(range_months(start, end) for start, end in merged_ranges)
+    gaps = [range_months(previous_end, start)
+            for (_, previous_end), (start, _) in zip(merged_ranges, merged_ranges[1:])]
+
+    return DurationSummary(
+        entry_lengths=entry_lengths,
+        total_months=total_months,
+        total=format_duration(total_months // 12, total_months % 12),
+        gap_count=len(gaps),
+        gap_months=sum(gaps),
+        longest_gap_months=max(gaps, default=0),
+    )
+
+
+def compute_profile_durations(profile, today=None) -> ProfileDurations:
+    return ProfileDurations(
+        work=summarize_periods([(we.periodStart, we.periodEnd) for we in profile.workExperience], today),
+        education=summarize_periods([(ed.periodStart, ed.periodEnd) for ed in profile.education], today),
+        projects=summarize_periods([(proj.periodStart, proj.periodEnd) for proj in profile.projects], today),
+    )
+
+
+def resolve_current_date(profile, today=None):
+    """
+    Replace dates the model copied as the literal CURRENT_DATE marker with
+    the request date, so ongoing entries keep their duration.
+    """
+    date = (today or datetime.now()).strftime(DATE_FORMAT)
+    for entries in (profile.workExperience, profile.education, profile.projects, profile.publications):
+        for entry in entries or []:
+            for field in ('periodStart', 'periodEnd'):
+                value = getattr(entry, field)
+                if isinstance(value, str) and value.strip().upper() == CURRENT_DATE_MARKER:
+                    setattr(entry, field, date)
+
+
+def apply_durations(profile, today=None):
+    """
+    Fill totalLength of every work/education entry and the profile totals
+    from the extracted dates, replacing anything the model wrote there.
+
+    Returns:
+        ProfileDurations: the full summary, including gap statistics
+    """
+    resolve_current_date(profile, today)
+    durations = compute_profile_durations(profile, today)
+    for we, length in zip(profile.workExperience, durations.work.entry_lengths):
+        we.totalLength = length
+    for ed, length in zip(profile.education, durations.education.entry_lengths):
+        ed.totalLength = length
+    profile.totalWorkExperience = durations.work.total
+    profile.totalEducationDuration = durations.education.total
+    return durations
+
+
+def parse_date_column(values):
+    """
+    Parse a column of "DD-MM-YYYY" strings into a datetime64[D] array, NaT
+    where a value is not a valid date. Zero-padded dates are converted in one
+    vectorized pass; only the rows that fail it go through strptime, which
+    also accepts unpadded days and months.
+    """
+    values = np.asarray(values, dtype=str)
+    parsed = np.full(values.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+    padded = np.flatnonzero(np.char.str_len(values) == 10)
+    # Code points minus ord('0'): digits become 0-9 without parsing strings
+    chars = values[padded].astype('U10').view(np.uint32).reshape(-1, 10).astype(np.int64) - ord('0')
+    digits = chars[:, [0, 1, 3, 4, 6, 7, 8, 9]]
+    dash = ord('-') - ord('0')
+    well_formed = ((digits >= 0) & (digits <= 9)).all(axis=1) & (chars[:, 2] == dash) & (chars[:, 5] == dash)
+    padded, digits = padded[well_formed], digits[well_formed]
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+    # Checked before building the date, since datetime64 would roll 31-02 over into March
+    month_start = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid = (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+    parsed[padded[valid]] = month_start[valid].astype('datetime64[D]') + (day[valid] - 1)
+
+    failed = np.ones(values.shape, dtype=bool)
+    failed[padded[valid]] = False
+    for i in np.flatnonzero(failed):
+        try:
+            parsed[i] = np.datetime64(datetime.strptime(values[i], DATE_FORMAT).date(), 'D')
+        except ValueError:
+            pass
+    return parsed
+
+
+def batch_total_months(candidate_ids, starts, ends, today=None, n_candidates=None):
+    """
+    Vectorized calculate_duration over many candidates at once.
+
+    Args:
+        candidate_ids: int array, candidate index of each period (0..n_candidates-1)
+        starts: periodStart strings ("DD-MM-YYYY"); periods without one, or with
+            a date that does not parse, are skipped as in valid_period
+        ends: periodEnd strings; empty means ongoing until today
+        today: date used for ongoing periods, defaults to today
+        n_candidates: length of the result, defaults to max(candidate_ids) + 1
+
+    Returns:
+        np.ndarray: overlap-merged total months per candidate, equal to
+        years * 12 + months from calculate_duration for the same periods
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+    starts = np.asarray(starts, dtype=str)
+    ends = np.asarray(ends, dtype=str)
+    if n_candidates is None:
+        n_candidates = int(candidate_ids.max()) + 1 if candidate_ids.size else 0
+
+    keep = starts != ''
+    candidate_ids, starts, ends = candidate_ids[keep], starts[keep], ends[keep]
+
+    today = today or datetime.now()
+    today_day = np.datetime64(today.strftime('%Y-%m-%d'), 'D')
+    start_days = parse_date_column(starts)
+    end_days = np.full(ends.shape, today_day)
+    dated = ends != ''
+    end_days[dated] = parse_date_column(ends[dated])
+
+    keep = ~np.isnat(start_days) & ~np.isnat(end_days)
+    candidate_ids, start_days, end_days, dated = candidate_ids[keep], start_days[keep], end_days[keep], dated[keep]
+    if not candidate_ids.size:
+        return np.zeros(n_candidates, dtype=np.int64)
+
+    # Sort by candidate, then start date (the scalar code sorts by (start, end))
+    order = np.lexsort((end_days, start_days, candidate_ids))
+    candidate_ids, start_days, end_days, dated = candidate_ids[order], start_days[order], end_days[order], dated[order]
+
+    # Overlap merge: a row opens a new range when it starts after the running
+    # maximum end so far. Offsetting every candidate far apart keeps one global
+    # cumulative max from leaking across candidates.
+    offset = candidate_ids * 10_000_000
+    start_key = start_days.astype(np.int64) + offset
+    end_key = end_days.astype(np.int64) + offset
+    running_end = np.maximum.accumulate(end_key)
+    new_range = np.ones(start_key.shape, dtype=bool)
+    new_range[1:] = start_key[1:] > running_end[:-1]
+    range_starts = np.flatnonzero(new_range)
+
+    merged_candidate = candidate_ids[range_starts]
+    merged_start = start_days[range_starts]
+    merged_end = np.maximum.reduceat(end_days, range_starts)
+    # Ongoing periods end at today including its time of day, which the scalar
+    # code keeps; it only changes the result of inverted ranges
+    merged_ongoing = np.maximum.reduceat(~dated, range_starts) & (merged_end == today_day)
+
+    months = months_between(merged_start, merged_end, merged_ongoing, today)
+    return np.bincount(merged_candidate, weights=months, minlength=n_candidates).astype(np.int64)
+
+
+def months_between(start, end, ongoing=None, today=None):
+    """
+    Vectorized range_months: whole months from start to end per relativedelta,
+    rounded up when days are left over. Where ongoing is set, the end is the
+    today datetime rather than its date.
+    """
+    start_month = start.astype('datetime64[M]')
+    end_month = end.astype('datetime64[M]')
+    start_day = (start - start_month.astype('datetime64[D]')).astype(np.int64) + 1
+    end_day = (end - end_month.astype('datetime64[D]')).astype(np.int64) + 1
+    days_in_end_month = ((end_month + 1).astype('datetime64[D]') - end_month.astype('datetime64[D]')).astype(np.int64)
+
+    months = (end_month - start_month).astype(np.int64)
+    # relativedelta clamps start + months to the end of a shorter month; any
+    # day beyond that anchor rounds up to a full month
+    months += np.minimum(start_day, days_in_end_month) < end_day
+
+    # Inverted ranges (end before start) follow relativedelta's negative
+    # arithmetic; they are rare enough to do one at a time
+    for i in np.flatnonzero(end < start):
+        start_date = datetime.combine(start[i].astype(datetime), datetime.min.time())
+        end_date = today if ongoing is not None and ongoing[i] else end[i].astype(datetime)
+        months[i] = range_months(start_date, end_date)
+    return months
+
+
+def batch_calculate_duration(date_ranges_per_candidate, today=None):
+    """
+    calculate_duration for a list of candidates.
+
+    Args:
+        date_ranges_per_candidate: list of date_ranges lists, as accepted by calculate_duration
+
+    Returns:
+        tuple: (years, months) int arrays, one entry per candidate
+    """
+    candidate_ids, starts, ends = [], [], []
+    for candidate, date_ranges in enumerate(date_ranges_per_candidate):
+        for start, end in date_ranges:
+            candidate_ids.append(candidate)
+            starts.append(start or '')
+            ends.append(end or '')
+    total_months = batch_total_months(
+        candidate_ids, starts, ends, today, n_candidates=len(date_ranges_per_candidate)
+    )
+    return total_months // 12, total_months % 12
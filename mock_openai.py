@@ -0,0 +1,317 @@
+"""
+Local stand-in for the OpenAI chat completions and Batch APIs, for running
+and benchmarking the pipeline without an API key or network access.
+
+    python mock_openai.py --port 8001 --responses profiles.jsonl --token-rate 80
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock streamlit run app-image.py
+
+POST /v1/chat/completions answers with a recorded UserProfile (round-robin
+over the --responses files, or a built-in sample), as a normal completion
+or as a server-sent event stream, including the usage chunk when
+stream_options.include_usage is set. Text and image_url parts are both
+accepted and counted into the prompt tokens.
+
+POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches and
+GET /v1/batches/{id} keep uploads and batches in memory. A batch answers all
+its requests the same way when it is created and is completed at once.
+
+Timing follows a simple model: the first token comes after --latency
+seconds plus the prompt tokens at --prefill-rate, the rest at --token-rate
+tokens per second (0 answers at once). --error-rate fails that share of
+requests with --error-status, so retries and backoff can be exercised.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from cv_pipeline import COMPUTED_FIELDS
+from token_estimates import CHARS_PER_TOKEN, estimate_prompt_tokens
+
+
+ERROR_TYPES = {
+    429: ("rate_limit_exceeded", "Rate limit reached for requests (mock)."),
+    500: ("server_error", "The server had an error while processing your request (mock)."),
+    503: ("server_error", "The engine is currently overloaded (mock)."),
+}
+# Streamed deltas carry this many tokens each
+STREAM_CHUNK_TOKENS = 4
+
+SAMPLE_PROFILE = {
+    "name": "Jane Doe",
+    "emails": ["jane.doe@example.com"],
+    "phones": ["+49 30 1234567"],
+    "links": ["https://www.linkedin.com/in/janedoe"],
+    "location": "Berlin, Germany",
+    "biography": "Backend engineer with eight years of experience building data-heavy web services.",
+    "workExperience": [
+        # An empty periodEnd is ongoing; apply_durations counts it up to today
+        {"jobTitle": "Senior Backend Engineer", "company": "Example GmbH", "period": "03/2019 - present",
+         "periodStart": "01-03-2019", "periodEnd": "",
+         "description": "Design and operation of the document processing platform."},
+        {"jobTitle": "Software Engineer", "company": "Sample AG", "period": "09/2015 - 02/2019",
+         "periodStart": "01-09-2015", "periodEnd": "28-02-2019", "description": "REST APIs and ETL jobs in Python."},
+    ],
+    "education": [
+        {"degree": "M.Sc. Computer Science", "educationalInstitution": "TU Berlin", "period": "10/2013 - 09/2015",
+         "periodStart": "01-10-2013", "periodEnd": "30-09-2015", "description": "Thesis on distributed query planning."},
+    ],
+    "skills": ["Python", "PostgreSQL", "Kubernetes", "AWS"],
+    "languages": [{"name": "German", "degree": "Native/Bilingual"}, {"name": "English", "degree": "Proficient"}],
+    "publications": [],
+    "projects": [],
+}
+
+
+class MockConfig(BaseModel):
+    latency: float = 0.5  # seconds before the first token
+    prefill_rate: float = 20000  # prompt tokens per second added to the first-token latency; 0 = none
+    token_rate: float = 80  # completion tokens per second; 0 = answer at once
+    error_rate: float = 0.0  # share of requests that fail
+    error_status: int = 429
+    retry_after: float = 1.0  # Retry-After header sent with a 429
+    seed: Optional[int] = None
+
+
+def model_answer(profile):
+    # Recorded profiles went through apply_durations; the model never returns those fields
+    answer = {key: value for key, value in profile.items() if key not in COMPUTED_FIELDS["UserProfile"]}
+    for field, model in (("workExperience", "WorkExperience"), ("education", "Education")):
+        answer[field] = [
+            {key: value for key, value in item.items() if key not in COMPUTED_FIELDS[model]}
+            for item in answer.get(field) or []
+        ]
+    return answer
+
+
+def load_responses(paths):
+    """
+    Args:
+        paths: batch_convert/batch_api JSONL outputs (lines with a "profile")
+            or JSON files holding one profile each
+
+    Returns:
+        list: the profile dicts, as the model would have answered them
+    """
+    profiles = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                records = [json.loads(line) for line in f if line.strip()]
+                profiles.extend(record["profile"] for record in records if record.get("profile"))
+            else:
+                profiles.append(json.load(f))
+    return [model_answer(profile) for profile in profiles] or [SAMPLE_PROFILE]
+
+
+def completion_tokens(content):
+    return max(1, len(content) // CHARS_PER_TOKEN)
+
+
+def usage(prompt_tokens, content):
+    tokens = completion_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": tokens,
+        "total_tokens": prompt_tokens + tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def error_body(status_code, message=None):
+    error_type, default_message = ERROR_TYPES.get(status_code, ("server_error", "Mock error."))
+    return {"error": {"message": message or default_message, "type": error_type, "param": None, "code": error_type}}
+
+
+def error_response(status_code, retry_after=None, message=None):
+    headers = {"retry-after": str(retry_after)} if status_code == 429 and retry_after is not None else None
+    return JSONResponse(error_body(status_code, message), status_code=status_code, headers=headers)
+
+
+def chat_completion(model, prompt_tokens, content):
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(prompt_tokens, content),
+    }
+
+
+def create_app(config=None, responses=None):
+    """
+    Args:
+        config: MockConfig
+        responses: profile dicts to replay; defaults to the built-in sample
+
+    Returns:
+        Starlette app serving /v1/chat/completions and the Batch API
+    """
+    config = config or MockConfig()
+    answers = itertools.cycle([json.dumps(profile, ensure_ascii=False) for profile in responses or [SAMPLE_PROFILE]])
+    rng = random.Random(config.seed)
+    files, batches = {}, {}
+
+    async def chat_completions(request):
+        body = await request.json()
+        if rng.random() < config.error_rate:
+            return error_response(config.error_status, config.retry_after)
+
+        prompt_tokens = estimate_prompt_tokens(body.get("messages", []), body.get("response_format"))
+        content = next(answers)
+        first_token = config.latency + (prompt_tokens / config.prefill_rate if config.prefill_rate else 0)
+        model = body.get("model", "mock")
+
+        if not body.get("stream"):
+            generation = completion_tokens(content) / config.token_rate if config.token_rate else 0
+            await asyncio.sleep(first_token + generation)
+            return JSONResponse(chat_completion(model, prompt_tokens, content))
+
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def chunk(choices, chunk_usage=None):
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": choices, "usage": chunk_usage}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def event_stream():
+            await asyncio.sleep(first_token)
+            yield chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            step = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+            for start in range(0, len(content), step):
+                if config.token_rate:
+                    await asyncio.sleep(STREAM_CHUNK_TOKENS / config.token_rate)
+                delta = content[start:start + step]
+                yield chunk([{"index": 0, "delta": {"content": delta}, "finish_reason": None}])
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk([], usage(prompt_tokens, content))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type='text/event-stream')
+
+    async def models(request):
+        return JSONResponse({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+    def store_file(content, filename, purpose):
+        file_id = f"file-mock-{uuid.uuid4().hex[:12]}"
+        files[file_id] = {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed", "content": content,
+        }
+        return {key: value for key, value in files[file_id].items() if key != "content"}
+
+    async def upload_file(request):
+        form = await request.form()
+        upload = form["file"]
+        return JSONResponse(store_file(await upload.read(), upload.filename, form.get("purpose", "batch")))
+
+    async def file_content(request):
+        stored = files.get(request.path_params["file_id"])
+        if stored is None:
+            return error_response(404, message="No such file (mock).")
+        return Response(stored["content"], media_type='application/octet-stream')
+
+    def batch_result(line):
+        # One line of a batch output file, in the format of the real Batch API
+        result = {"id": f"batch_req_mock-{uuid.uuid4().hex[:12]}", "custom_id": line.get("custom_id"), "error": None}
+        if rng.random() < config.error_rate:
+            status_code, body = config.error_status, error_body(config.error_status)
+        else:
+            request = line.get("body") or {}
+            prompt_tokens = estimate_prompt_tokens(request.get("messages", []), request.get("response_format"))
+            status_code, body = 200, chat_completion(request.get("model", "mock"), prompt_tokens, next(answers))
+        result["response"] = {"status_code": status_code, "request_id": uuid.uuid4().hex, "body": body}
+        return result
+
+    async def create_batch(request):
+        body = await request.json()
+        stored = files.get(body.get("input_file_id"))
+        if stored is None:
+            return error_response(404, message="No such input file (mock).")
+        lines = [json.loads(line) for line in stored["content"].decode('utf-8').splitlines() if line.strip()]
+        results = [batch_result(line) for line in lines]
+        output = ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results).encode('utf-8')
+        output_file = store_file(output, "batch_output.jsonl", "batch_output")
+        failed = sum(1 for result in results if result["response"]["status_code"] != 200)
+        now = int(time.time())
+        batch_id = f"batch_mock-{uuid.uuid4().hex[:12]}"
+        batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": stored["id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "completed", "output_file_id": output_file["id"], "error_file_id": None,
+            "created_at": now, "completed_at": now,
+            "request_counts": {"total": len(results), "completed": len(results) - failed, "failed": failed},
+        }
+        return JSONResponse(batches[batch_id])
+
+    async def retrieve_batch(request):
+        batch = batches.get(request.path_params["batch_id"])
+        if batch is None:
+            return error_response(404, message="No such batch (mock).")
+        return JSONResponse(batch)
+
+    return Starlette(routes=[
+        Route('/v1/chat/completions', chat_completions, methods=['POST']),
+        Route('/v1/models', models, methods=['GET']),
+        Route('/v1/files', upload_file, methods=['POST']),
+        Route('/v1/files/{file_id}/content', file_content, methods=['GET']),
+        Route('/v1/batches', create_batch, methods=['POST']),
+        Route('/v1/batches/{batch_id}', retrieve_batch, methods=['GET']),
+    ])
+
+
+def add_config_arguments(parser):
+    defaults = MockConfig()
+    parser.add_argument('--responses', nargs='*', default=[],
+                        help="JSONL outputs of batch_convert.py or profile JSON files to replay")
+    parser.add_argument('--latency', type=float, default=defaults.latency, help="seconds before the first token")
+    parser.add_argument('--prefill-rate', type=float, default=defaults.prefill_rate,
+                        help="prompt tokens per second added to the first-token latency (0: none)")
+    parser.add_argument('--token-rate', type=float, default=defaults.token_rate,
+                        help="completion tokens per second (0: answer at once)")
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help="share of requests that fail")
+    parser.add_argument('--error-status', type=int, choices=sorted(ERROR_TYPES), default=defaults.error_status)
+    parser.add_argument('--retry-after', type=float, default=defaults.retry_after,
+                        help="Retry-After seconds sent with a 429")
+    parser.add_argument('--seed', type=int, help="seed for the error injection")
+
+
+def config_from_arguments(args):
+    return MockConfig(
+        latency=args.latency, prefill_rate=args.prefill_rate, token_rate=args.token_rate,
+        error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI chat completions API that replays profiles.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('MOCK_OPENAI_PORT', 8001)))
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(config_from_arguments(args), load_responses(args.responses))
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,562 @@
+import math
+import multiprocessing
+import os
+import re
+import threading
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+from pydantic import BaseModel, Field
+from PIL import Image
+
+import telemetry
+from resources import setting
+from token_estimates import estimate_image_tokens, estimate_text_tokens
+
+
+# GPT-4o cuts high-detail images into 512px tiles. A portrait page whose long
+# side is 1024px fits in 2x2 tiles, the same cost as the old 72 DPI render but
+# sharper; anything larger only buys more tiles.
+DEFAULT_MAX_SIDE = 1024
+
+# Text-layer quality thresholds below which the page images are sent as well
+MIN_CHARS_PER_PAGE = 200
+MAX_GARBAGE_RATIO = 0.05
+MIN_SECTION_HEADERS = 2
+
+SECTION_HEADER_PATTERN = re.compile(
+    r'\b(experience|employment|education|skills|languages|projects|publications|certifications|'
+    r'berufserfahrung|erfahrung|ausbildung|bildung|kenntnisse|f\u00e4higkeiten|sprachen|projekte)\b',
+    re.IGNORECASE,
+)
+# A heading is a short line set larger than the body text or in capitals. Bold
+# alone is not enough, since job titles are often bold; a bold section name is
+HEADING_MAX_WORDS = 5
+HEADING_MAX_CHARS = 40
+HEADING_SIZE_RATIO = 1.15
+BOLD_FLAG = 16
+# Left edges within this many points of each other count as one column edge
+COLUMN_TOLERANCE = 5
+MIN_COLUMN_LINES = 3
+COLUMN_EDGE_SHARE = 0.6
+# The gutter between two columns is the widest vertical band inside the text
+# that at most this share of the lines (full-width headers and the like) cross
+GUTTER_MIN_WIDTH = 8
+GUTTER_MAX_CROSSING_SHARE = 0.1
+# Lines whose baselines are this close are on one row. Right-hand lines that
+# mostly sit on a row of a left-hand line are row entries (a date next to a
+# job title), not a column
+BASELINE_TOLERANCE = 2
+ROW_PAIRED_SHARE = 0.5
+BULLET_CHARS = '\u2022\u25aa\u25cf\u25e6\u25a0\u25a1\u2023\u2043\u2013\u00b7*-\uf0b7\uf0a7'
+WHITESPACE_PATTERN = re.compile(r'[ \t\u00a0]+')
+
+# Replacement characters, private-use glyphs and unmapped "(cid:NN)" codes
+GARBAGE_PATTERN = re.compile(r'[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0c\x0e-\x1f]|\(cid:\d+\)')
+
+# Page rendering is spread over a process pool of CV_RENDER_WORKERS workers
+# for documents with at least PARALLEL_MIN_PAGES pages; fewer workers than 2
+# renders in the calling thread
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_MIN_PAGES = 4
+
+IMAGE_MIME_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+
+def fix_url(url):
+    parsed_url = urlparse(url)
+    
+    if not parsed_url.scheme:
+        url = 'https://' + url
+        parsed_url = urlparse(url)
+    
+    return urlunparse(parsed_url)
+
+
+class PDFError(ValueError):
+    """The bytes could not be opened as a PDF."""
+
+
+class RenderOptions(BaseModel):
+    dpi: Optional[int] = None  # fixed render resolution; overrides max_side
+    max_side: Optional[int] = DEFAULT_MAX_SIDE  # longest page side in pixels
+    max_pixels: Optional[int] = None  # optional cap on width * height
+    grayscale: bool = False
+    image_format: str = 'png'  # png, jpeg or webp
+    quality: int = 85  # jpeg/webp quality
+
+    def fingerprint(self) -> str:
+        return self.model_dump_json()
+
+
+class TextQuality(BaseModel):
+    char_count: int = 0
+    chars_per_page: float = 0
+    garbage_ratio: float = 0
+    section_headers: int = 0
+
+    @property
+    def good(self) -> bool:
+        return (self.chars_per_page >= MIN_CHARS_PER_PAGE
+                and self.garbage_ratio <= MAX_GARBAGE_RATIO
+                and self.section_headers >= MIN_SECTION_HEADERS)
+
+
+class PageContent(BaseModel):
+    number: int
+    text: str = ''
+    links: List[str] = Field(default_factory=list)
+    headings: List[str] = Field(default_factory=list)  # heading lines, in page order
+    image: Optional[bytes] = None  # encoded bytes of the rendered page, if rendered
+    image_mime: Optional[str] = None
+    width: int = 0
+    height: int = 0
+
+
+class IngestedPDF(BaseModel):
+    pages: List[PageContent] = Field(default_factory=list)
+    text_quality: Optional[TextQuality] = None
+
+    @property
+    def has_images(self) -> bool:
+        return any(page.image is not None for page in self.pages)
+
+    def text_fragments(self) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page number, fragment) pairs: each page's text followed by the
+        URI links it adds. Links are normalized with fix_url and only the
+        first occurrence is kept, so a footer link on every page appears once.
+        """
+        seen = set()
+        after_link = False
+        for page in self.pages:
+            # A link has no line break of its own; keep the next page off its line
+            yield page.number, '\n' + page.text if after_link else page.text
+            after_link = False
+            for url in page.links:
+                url = fix_url(url)
+                if url.rstrip('/') in seen:
+                    continue
+                seen.add(url.rstrip('/'))
+                after_link = True
+                yield page.number, '\n' + url
+
+    @property
+    def raw_text(self) -> str:
+        return ''.join(fragment for _, fragment in self.text_fragments())
+
+    def page_token_estimates(self) -> List[int]:
+        """
+        Returns:
+            list: estimated prompt tokens per page, its text and links plus its
+            rendered image if there is one
+        """
+        tokens = {page.number: 0 for page in self.pages}
+        for number, fragment in self.text_fragments():
+            tokens[number] += estimate_text_tokens(fragment)
+        for page in self.pages:
+            if page.image is not None:
+                tokens[page.number] += estimate_image_tokens(page.width, page.height)
+        return [tokens[page.number] for page in self.pages]
+
+    @property
+    def images(self) -> List[BytesIO]:
+        return [BytesIO(page.image) for page in self.pages if page.image is not None]
+
+
+def read_pdf_bytes(pdf_file) -> bytes:
+    """
+    Return the raw bytes of an uploaded file, a file object or a bytes buffer
+    without touching the filesystem.
+    """
+    if isinstance(pdf_file, (bytes, bytearray, memoryview)):
+        return bytes(pdf_file)
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def assess_text_quality(texts) -> TextQuality:
+    """
+    Score the text layer of a PDF: scanned or image-only CVs have little text,
+    broken font encodings produce garbage glyphs, and layout-heavy CVs often
+    lose their section headers.
+
+    Args:
+        texts: list of per-page text strings
+
+    Returns:
+        TextQuality
+    """
+    text = '\n'.join(texts)
+    visible = len(text) - sum(text.count(ch) for ch in ' \t\r\n')
+    garbage = sum(len(match) for match in GARBAGE_PATTERN.findall(text))
+    headers = {match.lower() for match in SECTION_HEADER_PATTERN.findall(text)}
+    return TextQuality(
+        char_count=visible,
+        chars_per_page=visible / max(len(texts), 1),
+        garbage_ratio=garbage / visible if visible else 1.0,
+        section_headers=len(headers),
+    )
+
+
+def text_lines(page_dict):
+    """
+    Returns:
+        tuple: (body font size, list of (bbox, text, spans) for every
+        non-empty line of the page)
+    """
+    lines = []
+    size_chars = {}
+    for block in page_dict["blocks"]:
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            lines.append((line["bbox"], ''.join(span["text"] for span in spans).strip(), spans))
+            for span in spans:
+                size = round(span["size"], 1)
+                size_chars[size] = size_chars.get(size, 0) + len(span["text"])
+    body_size = max(size_chars, key=size_chars.get) if size_chars else 0
+    return body_size, lines
+
+
+def is_heading(text, spans, body_size):
+    if len(text) > HEADING_MAX_CHARS or len(text.split()) > HEADING_MAX_WORDS:
+        return False
+    larger = max(span["size"] for span in spans) >= body_size * HEADING_SIZE_RATIO
+    bold = all(span["flags"] & BOLD_FLAG or "bold" in span["font"].lower() for span in spans)
+    capitals = text.isupper() and len(text) > 3
+    return larger or capitals or (bold and SECTION_HEADER_PATTERN.search(text) is not None)
+
+
+def find_headings(page) -> List[str]:
+    """
+    Return the lines of a page that look like section headings, judged by
+    their font against the dominant (body) font size of the page.
+    """
+    body_size, lines = text_lines(page.get_text("dict"))
+    return [text for _, text, spans in lines if is_heading(text, spans, body_size)]
+
+
+def baseline(line):
+    return line[2][0]["origin"][1]
+
+
+def by_rows(lines):
+    """
+    Order lines top to bottom and, within a row of lines sharing a baseline,
+    left to right.
+    """
+    rows, row = [], []
+    for line in sorted(lines, key=baseline):
+        if row and baseline(line) - baseline(row[-1]) > BASELINE_TOLERANCE:
+            rows.append(row)
+            row = []
+        row.append(line)
+    if row:
+        rows.append(row)
+    return [line for row in rows for line in sorted(row, key=lambda line: line[0][0])]
+
+
+def is_column(lines, beside):
+    """
+    Whether lines form a text column of their own next to the lines beside
+    them: several multi-word lines with a shared left edge, not set row by
+    row against the other side like dates next to job titles.
+    """
+    if sum(len(text.split()) > 1 for _, text, _ in lines) < MIN_COLUMN_LINES:
+        return False
+    edges = {}
+    for bbox, _, _ in lines:
+        edge = round(bbox[0] / COLUMN_TOLERANCE)
+        edges[edge] = edges.get(edge, 0) + 1
+    if max(edges.values()) < len(lines) * COLUMN_EDGE_SHARE:
+        return False
+    beside_baselines = [baseline(line) for line in beside]
+    paired = sum(
+        any(abs(baseline(line) - other) <= BASELINE_TOLERANCE for other in beside_baselines) for line in lines
+    )
+    return paired < len(lines) * ROW_PAIRED_SHARE
+
+
+def find_gutter(lines):
+    """
+    Find the gap between two text columns, wherever it is: the widest
+    vertical band inside the text that (almost) no line crosses.
+
+    Returns:
+        float: x of the middle of the gutter, or None if there is none
+    """
+    if len(lines) < 2 * MIN_COLUMN_LINES:
+        return None
+    left = math.floor(min(bbox[0] for bbox, _, _ in lines))
+    right = math.ceil(max(bbox[2] for bbox, _, _ in lines))
+    # Lines covering each x, from the line starts and ends
+    changes = [0] * (right - left + 1)
+    for bbox, _, _ in lines:
+        changes[math.floor(bbox[0]) - left] += 1
+        changes[math.ceil(bbox[2]) - left] -= 1
+    limit = len(lines) * GUTTER_MAX_CROSSING_SHARE
+    best, start, covering = None, None, 0
+    for x in range(right - left):
+        covering += changes[x]
+        if covering <= limit:
+            if start is None:
+                start = x
+        elif start is not None:
+            # Bands touching the left edge of the text are margin, not gutter
+            if start > 0 and (best is None or x - start > best[1] - best[0]):
+                best = (start, x)
+            start = None
+    if best is None or best[1] - best[0] < GUTTER_MIN_WIDTH:
+        return None
+    return left + (best[0] + best[1]) / 2
+
+
+def reading_order(lines):
+    """
+    Order text lines for reading: top to bottom, except that between two
+    lines crossing the gutter, a left column is read before the right one,
+    so two-column and sidebar CVs are no longer read across the gutter.
+    """
+    gutter = find_gutter(lines)
+    if gutter is None:
+        return by_rows(lines)
+
+    def flush(group):
+        right = [line for line in group if line[0][0] >= gutter]
+        left = [line for line in group if line[0][0] < gutter]
+        if left and is_column(right, left):
+            return by_rows(left) + by_rows(right)
+        return by_rows(group)
+
+    ordered, group = [], []
+    for line in by_rows(lines):
+        x0, _, x1, _ = line[0]
+        if x0 < gutter < x1:
+            ordered.extend(flush(group))
+            group = []
+            ordered.append(line)
+        else:
+            group.append(line)
+    ordered.extend(flush(group))
+    return ordered
+
+
+def layout_text(page):
+    """
+    Page text in reading order with light markup: "## " before headings,
+    "- " before bullet items, spacing collapsed.
+
+    Returns:
+        tuple: (text, heading lines as they appear in the text)
+    """
+    body_size, lines = text_lines(page.get_text("dict"))
+    out, headings = [], []
+    pending_bullet = False
+    for _, text, spans in reading_order(lines):
+        text = WHITESPACE_PATTERN.sub(' ', text)
+        if len(text) == 1 and text in BULLET_CHARS:
+            # Bullet glyph set as its own line; it belongs to the next one
+            pending_bullet = True
+            continue
+        if text[0] in BULLET_CHARS:
+            text, pending_bullet = text[1:].lstrip(), True
+        if pending_bullet:
+            out.append(f"- {text}")
+            pending_bullet = False
+        elif is_heading(text, spans, body_size):
+            heading = f"## {text}"
+            if out:
+                out.append('')
+            out.append(heading)
+            headings.append(heading)
+        else:
+            out.append(text)
+    return '\n'.join(out) + '\n', headings
+
+
+def render_zoom(page, options: RenderOptions) -> float:
+    if options.dpi:
+        zoom = options.dpi / 72
+    elif options.max_side:
+        zoom = options.max_side / max(page.rect.width, page.rect.height)
+    else:
+        zoom = 1.0
+    if options.max_pixels:
+        pixels = page.rect.width * page.rect.height * zoom * zoom
+        if pixels > options.max_pixels:
+            zoom *= (options.max_pixels / pixels) ** 0.5
+    return zoom
+
+
+def render_page(page, options: RenderOptions):
+    """
+    Render one page to encoded image bytes.
+
+    Returns:
+        tuple: (image bytes, mime type, width, height)
+    """
+    if options.image_format not in IMAGE_MIME_TYPES:
+        raise ValueError(f"Unsupported image format: {options.image_format}")
+
+    zoom = render_zoom(page, options)
+    colorspace = fitz.csGRAY if options.grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+
+    if options.image_format == 'png':
+        data = pix.tobytes("png")
+    elif options.image_format == 'jpeg':
+        data = pix.tobytes("jpeg", jpg_quality=options.quality)
+    else:
+        # PyMuPDF has no WebP writer, so this one goes through PIL
+        mode = "L" if options.grayscale else "RGB"
+        img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=options.quality)
+        data = buffer.getvalue()
+    return data, IMAGE_MIME_TYPES[options.image_format], pix.width, pix.height
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def render_workers():
+    return setting('CV_RENDER_WORKERS', RENDER_WORKERS, int)
+
+
+def render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn, not fork: callers run in Streamlit and asyncio worker threads
+            _render_pool = ProcessPoolExecutor(
+                max_workers=render_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_pool
+
+
+def reset_render_pool(wait=False):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=wait, cancel_futures=True)
+        _render_pool = None
+
+
+def render_pages(pdf_bytes, page_numbers, options: RenderOptions):
+    """
+    Worker side of the render pool: open the document from its bytes and
+    render the given pages.
+
+    Returns:
+        list: (page number, image bytes, mime type, width, height) per page
+    """
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        return [(number, *render_page(document.load_page(number), options)) for number in page_numbers]
+
+
+def submit_render(pdf_bytes, page_count, options: RenderOptions):
+    """
+    Start rendering every page in the pool, pages dealt round-robin to the
+    workers so long and short pages even out.
+
+    Returns:
+        list of futures, or None when the pages should be rendered inline
+    """
+    workers = min(render_workers(), page_count)
+    if page_count < PARALLEL_MIN_PAGES or workers < 2:
+        return None
+    pool = render_pool()
+    return [pool.submit(render_pages, pdf_bytes, list(range(worker, page_count, workers)), options)
+            for worker in range(workers)]
+
+
+def collect_render(futures, pages):
+    try:
+        for future in futures:
+            for number, *rendered in future.result():
+                content = pages[number]
+                content.image, content.image_mime, content.width, content.height = rendered
+        return True
+    except BrokenProcessPool as e:
+        print(f"Render pool failed, rendering inline: {e}")
+        reset_render_pool()
+        return False
+
+
+def ingest_pdf(pdf_file, render_images=True, render_options: Optional[RenderOptions] = None,
+               text_mode="plain") -> IngestedPDF:
+    """
+    Open a PDF once from memory and collect everything the pipeline needs from it.
+    Pages of longer documents are rendered in a process pool (see submit_render).
+
+    Args:
+        pdf_file: bytes, a BytesIO or a Streamlit UploadedFile
+        render_images: True to render every page, False for text only, or
+            "auto" to render only when the text layer is not good enough
+        render_options: resolution, colorspace and codec for the rendered pages
+        text_mode: "plain" for PyMuPDF's text output, "layout" for
+            reading-ordered text with marked headings and bullets (see layout_text)
+
+    Returns:
+        IngestedPDF: per-page text, URI links, heading lines, text quality and
+        (optionally) rendered page images; PDFError if the bytes are not a
+        readable PDF
+    """
+    render_options = render_options or RenderOptions()
+    pdf_bytes = read_pdf_bytes(pdf_file)
+    pages = []
+    with telemetry.span("ingest", bytes_in=len(pdf_bytes), text_mode=text_mode):
+        with telemetry.span("open"):
+            try:
+                document = fitz.open(stream=pdf_bytes, filetype="pdf")
+            except fitz.FileDataError as e:
+                raise PDFError(f"Could not open the PDF: {e}") from e
+        with document:
+            # When images are wanted anyway, the pool renders while this thread extracts text
+            futures = submit_render(pdf_bytes, document.page_count, render_options) if render_images is True else None
+            with telemetry.span("extract_text", pages=document.page_count) as stage:
+                for page_num in range(document.page_count):
+                    page = document.load_page(page_num)
+                    if text_mode == "layout":
+                        text, headings = layout_text(page)
+                    elif text_mode == "plain":
+                        text, headings = page.get_text("text"), find_headings(page)
+                    else:
+                        raise ValueError(f"Unknown text mode: {text_mode}")
+                    pages.append(PageContent(
+                        number=page_num,
+                        text=text,
+                        links=[link['uri'] for link in page.get_links() if link["kind"] == fitz.LINK_URI],
+                        headings=headings,
+                    ))
+                    stage.add(chars_out=len(text))
+
+            text_quality = assess_text_quality([content.text for content in pages])
+            if render_images == "auto":
+                render_images = not text_quality.good
+                if render_images:
+                    futures = submit_render(pdf_bytes, document.page_count, render_options)
+
+            if render_images:
+                # With the pool, this span is the wait for the workers rather than their CPU time
+                with telemetry.span("render", pages=len(pages), pool=bool(futures)) as stage:
+                    if not (futures and collect_render(futures, pages)):
+                        for content in pages:
+                            page = document.load_page(content.number)
+                            content.image, content.image_mime, content.width, content.height = render_page(
+                                page, render_options
+                            )
+                    stage.add(bytes_out=sum(len(content.image) for content in pages))
+    return IngestedPDF(pages=pages, text_quality=text_quality)
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from resources import setting
+
+
+# Overridden by CV_CACHE_PATH, CV_CACHE_TTL_SECONDS and CV_CACHE_MAX_ENTRIES
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'profiles.sqlite3')
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+
+
+def make_cache_key(pdf_bytes, prompt, model, date_bucket, variant=''):
+    """
+    Build a content-addressed key for one extraction.
+
+    Args:
+        pdf_bytes: raw bytes of the uploaded PDF
+        prompt: prompt template text (before {DATETIME} substitution)
+        model: model name sent to the chat completions API
+        date_bucket: the date string substituted into {DATETIME}
+        variant: anything else that changes the model input (image mode, render options)
+
+    Returns:
+        str: hex digest identifying the extraction
+    """
+    pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{pdf_hash}:{prompt_hash}:{model}:{date_bucket}:{variant}".encode('utf-8')).hexdigest()
+
+
+class ProfileCache:
+    """
+    Persistent SQLite cache of validated profile JSON, with TTL and
+    least-recently-used eviction once max_entries is exceeded.
+    """
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        # A ttl_seconds or max_entries of 0 turns that eviction off
+        if ttl_seconds is None:
+            ttl_seconds = setting('CV_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS, int)
+        if max_entries is None:
+            max_entries = setting('CV_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES, int)
+        self.path = path or setting('CV_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_accessed_at ON profiles (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the cache safe to share
+        # between Streamlit script threads and worker threads.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM profiles WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM profiles WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE profiles SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM profiles WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM profiles WHERE key IN ("
+                " SELECT key FROM profiles ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM profiles")
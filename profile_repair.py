@@ -0,0 +1,249 @@
+"""
+Salvage a model answer that did not parse or validate as a whole.
+
+Local fixes come first: code fences and text around the JSON are dropped,
+trailing commas removed, and a truncated answer is cut back to the last
+complete value and closed. The result is then validated field by field, and list
+fields item by item, so one bad entry no longer throws the whole profile
+away. Only the values that still fail are sent back to the model, in one
+small request, and the fixed values are merged into place.
+"""
+import json
+import re
+import typing
+
+from pydantic import TypeAdapter, ValidationError
+
+
+REPAIR_INSTRUCTIONS = """
+Each fragment below is a JSON value extracted from a CV that does not match its JSON schema.
+Fix the structure and types so it matches the schema. Keep the content: do not add, drop, summarize or translate information.
+Answer with a JSON object: {"fragments": [{"id": <id>, "value": <fixed value>}]}
+"""
+
+PARTIAL_LITERAL = re.compile(r'[\w.+-]+$')
+COMPLETE_LITERAL = re.compile(r'(true|false|null|-?\d+(\.\d+)?([eE][+-]?\d+)?)$')
+
+
+def close_json(text):
+    """
+    Remove trailing commas and, if the text ends mid-document, cut it back to
+    the last complete value and close every open array and object. A cut-off
+    string is dropped rather than closed, and so is an object member left
+    without its value.
+    """
+    out = []
+    stack = []
+    in_string = escape = dangling_key = False
+    expect_key = False
+    # Where the string being read, and the key of the object member being read, start in out
+    string_start = member_start = None
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if stack and stack[-1] == '{' and expect_key:
+                    dangling_key = True
+            continue
+        if ch == '"':
+            in_string = True
+            string_start = len(out)
+            if stack and stack[-1] == '{' and expect_key:
+                member_start = len(out)
+        elif ch in '{[':
+            stack.append(ch)
+            expect_key = ch == '{'
+        elif ch in '}]':
+            if not stack:
+                break
+            while out and out[-1] in ' \t\r\n,':
+                out.pop()
+            stack.pop()
+            expect_key = dangling_key = False
+            out.append(ch)
+            if not stack:
+                return ''.join(out)
+            continue
+        elif ch == ':':
+            expect_key = dangling_key = False
+        elif ch == ',':
+            expect_key = bool(stack) and stack[-1] == '{'
+        out.append(ch)
+
+    # Truncated: drop the unfinished token, then close what is still open
+    if in_string:
+        tail = ''.join(out[:string_start]).rstrip()
+    else:
+        tail = ''.join(out).rstrip()
+        if not COMPLETE_LITERAL.search(tail) and not tail.endswith('"'):
+            tail = PARTIAL_LITERAL.sub('', tail).rstrip()
+    if member_start is not None and (tail.endswith(':') or (dangling_key and not in_string)):
+        tail = ''.join(out[:member_start]).rstrip()
+    # A list item emptied by the cut is dropped as well
+    while len(stack) > 1 and stack[-2] == '[' and tail.endswith(stack[-1]):
+        tail = tail[:-1].rstrip().rstrip(', \t\r\n')
+        stack.pop()
+    tail = tail.rstrip(', \t\r\n')
+    closers = {'{': '}', '[': ']'}
+    return tail + ''.join(closers[opener] for opener in reversed(stack))
+
+
+def load_json_leniently(text):
+    """
+    Returns:
+        dict: the first JSON object in text, repaired if needed, or None
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    text = text[start:]
+    decoder = json.JSONDecoder()
+    for candidate in (text, close_json(text)):
+        try:
+            data, _ = decoder.raw_decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def list_item_type(annotation):
+    # List[X] or Optional[List[X]] -> X, anything else -> None
+    for candidate in (annotation, *typing.get_args(annotation)):
+        if typing.get_origin(candidate) is list:
+            return typing.get_args(candidate)[0]
+    return None
+
+
+class RepairPlan:
+    """
+    The fields of one answer, split into the values that validate and the
+    fragments that do not. A fragment is (field key, list index or None,
+    value, expected type).
+    """
+
+    def __init__(self, data, profile_model):
+        self.profile_model = profile_model
+        self.sections = {}
+        self.fragments = []
+        for name, field in profile_model.model_fields.items():
+            key = field.alias or name
+            if key not in data:
+                continue
+            value = data[key]
+            try:
+                TypeAdapter(field.annotation).validate_python(value)
+                self.sections[key] = value
+                continue
+            except ValidationError:
+                pass
+            item_type = list_item_type(field.annotation)
+            if item_type is None or not isinstance(value, list):
+                self.fragments.append((key, None, value, field.annotation))
+                continue
+            self.sections[key] = list(value)
+            for index, item in enumerate(value):
+                try:
+                    TypeAdapter(item_type).validate_python(item)
+                except ValidationError:
+                    self.fragments.append((key, index, item, item_type))
+
+    def request_messages(self):
+        fragments = [
+            {"id": number, "schema": TypeAdapter(expected).json_schema(), "value": value}
+            for number, (_, _, value, expected) in enumerate(self.fragments)
+        ]
+        return [
+            {"role": "system", "content": REPAIR_INSTRUCTIONS},
+            {"role": "user", "content": json.dumps({"fragments": fragments}, ensure_ascii=False)},
+        ]
+
+    def apply_fixes(self, content):
+        answer = load_json_leniently(content or '') or {}
+        fixed = {item.get("id"): item.get("value") for item in answer.get("fragments", []) if isinstance(item, dict)}
+        remaining = []
+        for number, (key, index, value, expected) in enumerate(self.fragments):
+            try:
+                TypeAdapter(expected).validate_python(fixed.get(number))
+            except ValidationError:
+                remaining.append((key, index, value, expected))
+                continue
+            if index is None:
+                self.sections[key] = fixed[number]
+            else:
+                self.sections[key][index] = fixed[number]
+        self.fragments = remaining
+
+    def build(self):
+        # Whatever could not be fixed is left out: bad list items dropped, bad fields unset
+        dropped = {(key, index) for key, index, _, _ in self.fragments}
+        sections = {
+            key: [item for index, item in enumerate(value) if (key, index) not in dropped]
+            if isinstance(value, list) else value
+            for key, value in self.sections.items()
+        }
+        if self.fragments:
+            print(f"Dropped {len(self.fragments)} unrepairable value(s): "
+                  f"{', '.join(sorted({key for key, _, _, _ in self.fragments}))}")
+        try:
+            return self.profile_model.model_validate(sections)
+        except ValidationError as e:
+            print(f"Validation error: {e}")
+            return None
+
+
+def plan_repair(content, profile_model):
+    data = load_json_leniently(content or '')
+    if data is None:
+        print("No JSON object found to repair.")
+        return None
+    return RepairPlan(data, profile_model)
+
+
+def repair_request(plan, model):
+    return dict(
+        model=model,
+        messages=plan.request_messages(),
+        temperature=0,
+        response_format={"type": "json_object"},
+    )
+
+
+def repair_profile(content, profile_model, client=None, model=None):
+    """
+    Args:
+        content: the model answer that failed to parse
+        profile_model: pydantic model the answer should validate as
+        client: OpenAI client used to fix the values that fail locally;
+            without one they are dropped
+        model: model for that request
+
+    Returns:
+        profile_model instance, or None if no JSON object could be recovered
+    """
+    plan = plan_repair(content, profile_model)
+    if plan is None:
+        return None
+    if plan.fragments and client is not None:
+        completion = client.chat.completions.create(**repair_request(plan, model))
+        plan.apply_fixes(completion.choices[0].message.content)
+    return plan.build()
+
+
+async def arepair_profile(content, profile_model, client=None, model=None):
+    """
+    Same as repair_profile, for an AsyncOpenAI client.
+    """
+    plan = plan_repair(content, profile_model)
+    if plan is None:
+        return None
+    if plan.fragments and client is not None:
+        completion = await client.chat.completions.create(**repair_request(plan, model))
+        plan.apply_fixes(completion.choices[0].message.content)
+    return plan.build()
@@ -0,0 +1,91 @@
+import json
+
+
+class ProfileStreamParser:
+    """
+    Incremental scanner over a streamed profile JSON object.
+
+    feed() takes the next chunk of model output and returns the events that
+    became complete with it:
+        ("item", key, dict)   an object inside a top-level array closed,
+                              e.g. one workExperience entry
+        ("field", key, value) a top-level field closed, e.g. name or skills
+
+    Anything before the first "{" (such as a ```json fence) is skipped.
+    Values that are not valid JSON on their own are dropped here; the final
+    parse_user_profile pass over the full text still sees them.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.done = False
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        self.item_start = None
+
+    def text(self):
+        return ''.join(self.buffer)
+
+    def _load(self, start, end):
+        try:
+            return True, json.loads(''.join(self.buffer[start:end]))
+        except json.JSONDecodeError:
+            return False, None
+
+    def _close_field(self, events):
+        if self.key is not None and self.value_start is not None:
+            ok, value = self._load(self.value_start, self.pos)
+            if ok:
+                events.append(("field", self.key, value))
+        self.key = None
+        self.value_start = None
+
+    def feed(self, chunk):
+        events = []
+        self.buffer.extend(chunk)
+        while self.pos < len(self.buffer) and not self.done:
+            ch = self.buffer[self.pos]
+            if self.depth == 0:
+                if ch == '{':
+                    self.depth = 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.key_start is not None:
+                        ok, key = self._load(self.key_start, self.pos + 1)
+                        self.key = key if ok else None
+                        self.key_start = None
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1 and self.value_start is None:
+                    self.key_start = self.pos
+            elif ch in '{[':
+                if self.depth == 2 and ch == '{':
+                    self.item_start = self.pos
+                self.depth += 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 2 and ch == '}' and self.item_start is not None:
+                    ok, item = self._load(self.item_start, self.pos + 1)
+                    if ok and self.key is not None:
+                        events.append(("item", self.key, item))
+                    self.item_start = None
+                elif self.depth == 0:
+                    self._close_field(events)
+                    self.done = True
+            elif self.depth == 1:
+                if ch == ':' and self.key is not None:
+                    self.value_start = self.pos + 1
+                elif ch == ',':
+                    self._close_field(events)
+            self.pos += 1
+        return events
@@ -0,0 +1,177 @@
+"""
+Pre-flight token budget for one extraction request.
+
+fit_to_budget() estimates the prompt tokens of the instructions (with the
+structured-outputs schema), the CV text and the page images. If the total is over the budget, compression
+passes run in order until it fits, cheapest and least lossy first:
+
+    whitespace   collapse runs of spaces and blank lines
+    page headers drop lines repeated at the top or bottom of most pages,
+                 and page numbers
+    boilerplate  drop data-protection consent and "references on request" lines
+    images       drop page images, last page first
+    truncate     cut the CV text from the end
+
+Each pass that ran is logged with the tokens it saved.
+"""
+import re
+from collections import Counter
+
+import telemetry
+from pdf_ingest import IngestedPDF
+from resources import setting
+from token_estimates import CHARS_PER_TOKEN
+
+
+# Prompt token budget of one request, unless CV_MAX_PROMPT_TOKENS is set
+MAX_PROMPT_TOKENS = 20000
+
+# Lines looked at for running headers and footers, and on how many pages
+# (share, at least two) a line must repeat to count as one
+EDGE_LINES = 3
+REPEATED_PAGE_SHARE = 0.5
+
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n(\s*\n)+')
+SPACES_PATTERN = re.compile(r'[ \t\u00a0]+')
+# "Page 2", "Seite 2 von 3" and "2 / 3" are page numbers wherever they are; a
+# bare number (which may as well be a year) only if most pages have one
+PAGE_LABEL_PATTERN = re.compile(
+    r'^\s*[-–]?\s*((page|seite)\s*\d+(\s*(/|of|von)\s*\d+)?|\d{1,3}\s*(/|of|von)\s*\d{1,3})\s*[-–]?\s*$',
+    re.IGNORECASE,
+)
+BARE_PAGE_NUMBER_PATTERN = re.compile(r'^\s*[-–]?\s*\d{1,3}\s*[-–]?\s*$')
+BOILERPLATE_PATTERN = re.compile(
+    r'(consent to the processing of (my )?personal data|processing of my personal data|'
+    r'einwillig.{0,80}(verarbeitung|daten)|verarbeitung meiner (persönlichen|personenbezogenen) daten|'
+    r'references (are )?available (up)?on request|referenzen auf anfrage)',
+    re.IGNORECASE,
+)
+
+
+def estimate_cv_tokens(pages):
+    return sum(IngestedPDF(pages=pages).page_token_estimates())
+
+
+def with_text(page, text):
+    # Headings are matched against text lines later on, so they must follow the text
+    lines = set(text.split('\n'))
+    return page.model_copy(update={
+        "text": text,
+        "headings": [heading for heading in page.headings if heading in lines],
+    })
+
+
+def collapse_whitespace(pages, budget):
+    def collapse(text):
+        text = '\n'.join(SPACES_PATTERN.sub(' ', line).strip() for line in text.split('\n'))
+        return BLANK_LINES_PATTERN.sub('\n\n', text)
+
+    return [
+        page.model_copy(update={
+            "text": collapse(page.text),
+            "headings": [collapse(heading) for heading in page.headings],
+        })
+        for page in pages
+    ]
+
+
+def remove_page_headers(pages, budget):
+    edges = Counter()
+    numbered_pages = 0
+    for page in pages:
+        lines = [line.strip() for line in page.text.split('\n') if line.strip()]
+        edge_lines = set(lines[:EDGE_LINES] + lines[-EDGE_LINES:])
+        edges.update(edge_lines)
+        numbered_pages += any(BARE_PAGE_NUMBER_PATTERN.match(line) for line in edge_lines)
+    min_pages = max(2, len(pages) * REPEATED_PAGE_SHARE)
+    repeated = {line for line, count in edges.items() if count >= min_pages}
+    bare_numbers = numbered_pages >= min_pages
+
+    def is_page_number(line):
+        return PAGE_LABEL_PATTERN.match(line) or (bare_numbers and BARE_PAGE_NUMBER_PATTERN.match(line))
+
+    compressed = []
+    for index, page in enumerate(pages):
+        lines = page.text.split('\n')
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        edge = set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+        kept = [
+            line for i, line in enumerate(lines)
+            # The first page keeps its header, which is often the name and contact line
+            if not (i in edge and (is_page_number(line) or (index > 0 and line.strip() in repeated)))
+        ]
+        compressed.append(with_text(page, '\n'.join(kept)))
+    return compressed
+
+
+def remove_boilerplate(pages, budget):
+    return [
+        with_text(page, '\n'.join(line for line in page.text.split('\n') if not BOILERPLATE_PATTERN.search(line)))
+        for page in pages
+    ]
+
+
+def drop_images(pages, budget):
+    pages = list(pages)
+    for index in reversed(range(len(pages))):
+        if estimate_cv_tokens(pages) <= budget:
+            break
+        if pages[index].image is not None:
+            pages[index] = pages[index].model_copy(update={"image": None, "image_mime": None})
+    return pages
+
+
+def truncate_text(pages, budget):
+    pages = list(pages)
+    for index in reversed(range(len(pages))):
+        excess = estimate_cv_tokens(pages) - budget
+        if excess <= 0:
+            break
+        text = pages[index].text
+        keep = max(0, len(text) - excess * CHARS_PER_TOKEN)
+        pages[index] = with_text(pages[index], text[:keep])
+    return pages
+
+
+COMPRESSION_PASSES = [
+    ("whitespace", collapse_whitespace),
+    ("page headers", remove_page_headers),
+    ("boilerplate", remove_boilerplate),
+    ("images", drop_images),
+    ("truncate", truncate_text),
+]
+
+
+def fit_to_budget(ingested, instruction_tokens, max_tokens=None):
+    """
+    Args:
+        ingested: IngestedPDF about to be sent
+        instruction_tokens: estimated tokens of everything else in the request
+        max_tokens: prompt token budget for the whole request, CV_MAX_PROMPT_TOKENS by default
+
+    Returns:
+        IngestedPDF: the same object if it fits, otherwise a compressed copy;
+        ValueError if the instructions alone use up the budget
+    """
+    max_tokens = max_tokens or setting('CV_MAX_PROMPT_TOKENS', MAX_PROMPT_TOKENS, int)
+    budget = max_tokens - instruction_tokens
+    if budget <= 0:
+        raise ValueError(f"The instructions ({instruction_tokens} tokens) leave no room for the CV in the "
+                         f"{max_tokens} token prompt budget; raise CV_MAX_PROMPT_TOKENS")
+    with telemetry.span("fit_to_budget", budget=budget) as stage:
+        tokens = estimate_cv_tokens(ingested.pages)
+        stage.set(tokens_in=tokens, tokens_out=tokens)
+        if tokens <= budget:
+            return ingested
+
+        print(f"CV prompt estimate {tokens + instruction_tokens} tokens is over the {max_tokens} token budget")
+        pages = ingested.pages
+        for name, compress in COMPRESSION_PASSES:
+            pages = compress(pages, budget)
+            compressed_tokens = estimate_cv_tokens(pages)
+            print(f"  {name}: -{tokens - compressed_tokens} tokens")
+            tokens = compressed_tokens
+            if tokens <= budget:
+                break
+        stage.set(tokens_out=tokens)
+        return ingested.model_copy(update={"pages": pages})
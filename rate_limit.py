@@ -0,0 +1,232 @@
+"""
+Rate-limit-aware scheduling and retries around the OpenAI client.
+
+    client = AsyncScheduledOpenAI(AsyncOpenAI(max_retries=0))
+
+The wrapped client exposes the same chat.completions.create(); every call
+first reserves its share of the requests-per-minute and tokens-per-minute
+budgets (waiting if the budget is spent), and transient failures (429,
+timeouts, connection errors, 5xx) are retried with jittered exponential
+backoff. A 429 pauses every caller sharing the limiter, not just the one that
+hit it. Everything else is passed through to the wrapped client.
+
+Pass the OpenAI client max_retries=0 so its own retries do not bypass the
+budgets.
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from resources import setting
+from token_estimates import estimate_prompt_tokens
+
+
+# Defaults are the tier-3 limits for gpt-4o; set OPENAI_RPM_LIMIT and
+# OPENAI_TPM_LIMIT to the account's limits (tier 1 is 500 RPM / 30000 TPM,
+# about three CVs a minute). OPENAI_MAX_ATTEMPTS overrides the attempts.
+RPM_LIMIT = 5000
+TPM_LIMIT = 800000
+MAX_ATTEMPTS = 6
+MAX_BACKOFF_SECONDS = 60
+
+# Reserved for the answer, a full profile JSON is rarely longer
+EXPECTED_COMPLETION_TOKENS = 2000
+
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def is_transient(error):
+    # An exhausted quota is also a 429, but waiting does not help
+    if isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) == 'insufficient_quota':
+        return False
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def retry_after_seconds(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    A per-minute budget that refills continuously. reserve() takes the amount
+    right away, possibly going into debt, and returns how long the caller has
+    to wait until the debt is paid off, along with the amount taken.
+    Reservations are served first come, first served.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self._refill(now)
+        # A single request larger than the whole budget still has to go through
+        charged = min(amount, self.capacity)
+        self.available -= charged
+        return max(0.0, -self.available / self.rate), charged
+
+    def refund(self, amount, now):
+        self._refill(now)
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by every call
+    made through one scheduled client. Thread-safe, so one limiter can back
+    both sync and async clients.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm or setting('OPENAI_RPM_LIMIT', RPM_LIMIT, int))
+        self.tokens = TokenBucket(tpm or setting('OPENAI_TPM_LIMIT', TPM_LIMIT, int))
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """
+        Returns:
+            Tuple[float, int]: seconds to wait before sending a request of this
+            many tokens, and the tokens taken from the budget for it
+        """
+        with self.lock:
+            now = time.monotonic()
+            request_wait, _ = self.requests.reserve(1, now)
+            token_wait, charged = self.tokens.reserve(tokens, now)
+            return max(request_wait, token_wait, self.paused_until - now), charged
+
+    def settle(self, charged, used):
+        # Give back (or charge) the difference between what was taken and the real usage
+        with self.lock:
+            self.tokens.refund(charged - used, time.monotonic())
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class ScheduledCall:
+    """
+    One chat.completions.create() call: its budget reservation and the retry
+    policy around it.
+    """
+
+    def __init__(self, limiter, kwargs):
+        self.limiter = limiter
+        self.reserved = estimate_prompt_tokens(kwargs.get("messages", []), kwargs.get("response_format"))
+        self.reserved += kwargs.get("max_tokens") or EXPECTED_COMPLETION_TOKENS
+        self.charged = 0
+        self.backoff = wait_random_exponential(multiplier=1, max=MAX_BACKOFF_SECONDS)
+
+    def reserve(self):
+        wait, self.charged = self.limiter.reserve(self.reserved)
+        return wait
+
+    def retry_options(self):
+        return dict(
+            retry=retry_if_exception(is_transient),
+            wait=self.wait,
+            stop=stop_after_attempt(setting('OPENAI_MAX_ATTEMPTS', MAX_ATTEMPTS, int)),
+            before_sleep=self.before_sleep,
+            reraise=True,
+        )
+
+    def wait(self, retry_state):
+        error = retry_state.outcome.exception()
+        return max(self.backoff(retry_state), retry_after_seconds(error) or 0)
+
+    def before_sleep(self, retry_state):
+        error = retry_state.outcome.exception()
+        if isinstance(error, openai.RateLimitError):
+            # The server says the budget is gone; hold back every other caller too
+            self.limiter.pause(retry_state.next_action.sleep)
+        print(f"OpenAI request failed ({type(error).__name__}), retry {retry_state.attempt_number} "
+              f"in {retry_state.next_action.sleep:.1f}s")
+
+    def settle(self, completion):
+        usage = getattr(completion, 'usage', None)
+        if usage is not None:
+            self.limiter.settle(self.charged, usage.total_tokens)
+
+    def release(self):
+        # A failed attempt used no tokens; the retry reserves them again
+        self.limiter.settle(self.charged, 0)
+
+
+class ScheduledOpenAI:
+    """
+    Wraps an OpenAI client; see the module docstring. Streamed responses keep
+    their estimated reservation, since the usage is only known at the end.
+    """
+
+    def __init__(self, client, limiter=None):
+        self.client = client
+        self.limiter = limiter or RateLimiter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create_chat_completion(self, **kwargs):
+        call = ScheduledCall(self.limiter, kwargs)
+        for attempt in Retrying(**call.retry_options()):
+            with attempt:
+                time.sleep(call.reserve())
+                try:
+                    completion = self.client.chat.completions.create(**kwargs)
+                except Exception:
+                    call.release()
+                    raise
+        if not kwargs.get("stream"):
+            call.settle(completion)
+        return completion
+
+
+class AsyncScheduledOpenAI:
+    """
+    Same as ScheduledOpenAI, for an AsyncOpenAI client. Waiting for the
+    budget does not block the event loop.
+    """
+
+    def __init__(self, client, limiter=None):
+        self.client = client
+        self.limiter = limiter or RateLimiter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def create_chat_completion(self, **kwargs):
+        call = ScheduledCall(self.limiter, kwargs)
+        async for attempt in AsyncRetrying(**call.retry_options()):
+            with attempt:
+                await asyncio.sleep(call.reserve())
+                try:
+                    completion = await self.client.chat.completions.create(**kwargs)
+                except Exception:
+                    call.release()
+                    raise
+        if not kwargs.get("stream"):
+            call.settle(completion)
+        return completion
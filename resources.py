@@ -0,0 +1,194 @@
+"""
+Process-wide resources, built once and shared by every session.
+
+Streamlit re-runs the app script on each interaction, but imported modules
+stay loaded, so anything built through this module survives reruns and is
+shared across browser sessions and threads of the same process:
+
+    client = resources.openai_client()
+
+Each factory is called at most once per distinct set of arguments. Call
+invalidate() (or invalidate("openai_client")) to drop a resource and close
+it; the next call builds a fresh one. Calls still running on the dropped
+resource may fail when it is closed.
+
+Compiled regexes and the prompt are module constants of the modules that use
+them and are therefore built once per process already.
+"""
+import functools
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+
+HTTP_MAX_CONNECTIONS = 20
+HTTP_TIMEOUT_SECONDS = 120
+SPACY_MODEL = "en_core_web_sm"
+
+_resources = {}
+_factories = {}
+_lock = threading.RLock()
+
+
+def shared_resource(factory):
+    """
+    Decorator: cache the factory's result per process, keyed by its arguments.
+    """
+    name = factory.__name__
+    _factories[name] = factory
+
+    @functools.wraps(factory)
+    def get(*args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        resource = _resources.get(key)
+        if resource is not None:
+            return resource
+        # Built under the lock so concurrent sessions do not build it twice
+        with _lock:
+            if key not in _resources:
+                _resources[key] = factory(*args, **kwargs)
+            return _resources[key]
+
+    get.invalidate = functools.partial(invalidate, name)
+    return get
+
+
+def close_resource(resource):
+    for method in ('shutdown', 'close'):
+        close = getattr(resource, method, None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"Failed to close {type(resource).__name__}: {e}")
+            return
+
+
+def invalidate(name=None):
+    """
+    Drop (and close) every cached resource, or only those built by the
+    factory called name.
+
+    Returns:
+        int: number of resources dropped
+    """
+    if name is not None and name not in _factories:
+        raise KeyError(f"Unknown resource: {name}")
+    with _lock:
+        keys = [key for key in _resources if name is None or key[0] == name]
+        dropped = [_resources.pop(key) for key in keys]
+    for resource in dropped:
+        close_resource(resource)
+    return len(dropped)
+
+
+@shared_resource
+def environment():
+    load_dotenv()
+    return dict(os.environ)
+
+
+def setting(name, default=None, cast=str):
+    """
+    Read a setting when it is used rather than at import, so the .env file is
+    loaded first whichever module is imported first.
+
+    Args:
+        name: the environment variable
+        default: returned when it is unset or empty
+        cast: converts the value, e.g. int
+
+    Returns:
+        the converted value, or default
+    """
+    environment()
+    value = os.getenv(name)
+    return cast(value) if value else default
+
+
+@shared_resource
+def langfuse_client():
+    from langfuse import Langfuse
+
+    environment()
+    return Langfuse(
+        secret_key=os.getenv('LANGFUSE_SECRET_KEY'),
+        public_key=os.getenv('LANGFUSE_PUBLIC_KEY'),
+        host=os.getenv('LANGFUSE_HOST'),
+    )
+
+
+@shared_resource
+def openai_client(traced=False):
+    """
+    Args:
+        traced: use the Langfuse drop-in client, so calls are traced
+
+    Returns:
+        ScheduledOpenAI over one pooled HTTP client; its rate limiter is
+        shared by every session of the process
+    """
+    if traced:
+        from langfuse.openai import OpenAI
+
+        langfuse_client()
+    else:
+        from openai import OpenAI
+    from rate_limit import ScheduledOpenAI
+
+    if setting('OPENAI_API_KEY') is None:
+        raise ValueError("OPENAI_API_KEY environment variable not found.")
+    max_connections = setting('CV_HTTP_MAX_CONNECTIONS', HTTP_MAX_CONNECTIONS, int)
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(setting('CV_HTTP_TIMEOUT_SECONDS', HTTP_TIMEOUT_SECONDS, float), connect=10),
+    )
+    return ScheduledOpenAI(OpenAI(http_client=http_client, max_retries=0))
+
+
+@shared_resource
+def profile_cache():
+    from profile_cache import ProfileCache
+
+    environment()
+    return ProfileCache()
+
+
+@shared_resource
+def spacy_model(name=SPACY_MODEL):
+    import spacy
+
+    return spacy.load(name)
+
+
+class SharedSpacy:
+    """
+    Stands in for the spacy module inside a library that calls spacy.load()
+    on every use; loads go through spacy_model() instead.
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def load(self, name, **kwargs):
+        if kwargs:
+            return self.module.load(name, **kwargs)
+        return spacy_model(str(name))
+
+
+@shared_resource
+def resume_parser_class():
+    """
+    Returns:
+        pyresparser's ResumeParser, with its per-instance spaCy loads shared
+    """
+    import pyresparser.resume_parser as resume_parser
+
+    if not isinstance(resume_parser.spacy, SharedSpacy):
+        resume_parser.spacy = SharedSpacy(resume_parser.spacy)
+    return resume_parser.ResumeParser
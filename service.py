@@ -0,0 +1,203 @@
+"""
+Async HTTP API for CV -> UserProfile conversion.
+
+    uvicorn service:app --host 0.0.0.0 --port 8000
+
+POST /profiles        one PDF, as a raw application/pdf body or a multipart "file" field
+POST /profiles:batch  several PDFs as multipart "files" fields
+POST /profiles:stream same input as /profiles, answered with server-sent events:
+                      "field" and "item" events as sections are generated,
+                      then a final "profile" or "error" event
+GET  /health
+
+One worker keeps up to CV_SERVICE_MAX_INFLIGHT model calls in flight over a
+shared AsyncOpenAI connection pool, paced by the
+OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT budgets (see rate_limit.py). If CV_SERVICE_API_KEY is set, requests
+must send it as "Authorization: Bearer <key>".
+"""
+import asyncio
+import contextlib
+import json
+import traceback
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from cv_pipeline import aconvert_pdf
+from pdf_ingest import PDFError
+from profile_cache import ProfileCache
+from rate_limit import AsyncScheduledOpenAI
+from resources import setting
+
+# Defaults of CV_SERVICE_MAX_INFLIGHT, CV_SERVICE_MAX_BATCH_FILES and
+# CV_SERVICE_REQUEST_TIMEOUT_SECONDS, read when the app starts
+MAX_INFLIGHT = 64
+MAX_BATCH_FILES = 50
+REQUEST_TIMEOUT_SECONDS = 120
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    max_inflight = setting('CV_SERVICE_MAX_INFLIGHT', MAX_INFLIGHT, int)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight),
+        timeout=httpx.Timeout(setting('CV_SERVICE_REQUEST_TIMEOUT_SECONDS', REQUEST_TIMEOUT_SECONDS, float),
+                              connect=10),
+    )
+    app.state.client = AsyncScheduledOpenAI(AsyncOpenAI(http_client=http_client, max_retries=0))
+    app.state.cache = ProfileCache()
+    app.state.inflight = asyncio.Semaphore(max_inflight)
+    app.state.max_batch_files = setting('CV_SERVICE_MAX_BATCH_FILES', MAX_BATCH_FILES, int)
+    app.state.api_key = setting('CV_SERVICE_API_KEY')
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+
+def is_authorized(request):
+    api_key = request.app.state.api_key
+    return not api_key or request.headers.get('authorization') == f"Bearer {api_key}"
+
+
+def error_response(status_code, message):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def looks_like_pdf(pdf_bytes):
+    return pdf_bytes[:1024].lstrip().startswith(b'%PDF')
+
+
+async def convert(request, pdf_bytes, on_event=None):
+    """
+    Returns:
+        tuple: (status code, response body)
+    """
+    if not looks_like_pdf(pdf_bytes):
+        return 400, {"error": "Uploaded file is not a PDF."}
+    try:
+        async with request.app.state.inflight:
+            profile = await aconvert_pdf(
+                request.app.state.client, pdf_bytes, request.app.state.cache, on_event=on_event
+            )
+    except PDFError as e:
+        return 400, {"error": f"Could not process PDF: {e}"}
+    except openai.OpenAIError as e:
+        return 502, {"error": f"Model request failed: {e}"}
+    except Exception as e:
+        # A bug, not bad input: logged, and reported as a server error
+        traceback.print_exc()
+        return 500, {"error": f"Internal error: {type(e).__name__}"}
+    if profile is None:
+        return 422, {"error": "Failed to parse the user profile."}
+    return 200, profile.model_dump()
+
+
+async def read_pdf_upload(request):
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None:
+            return None
+        return await upload.read()
+    return await request.body()
+
+
+async def create_profile(request):
+    if not is_authorized(request):
+        return error_response(401, "Unauthorized")
+
+    pdf_bytes = await read_pdf_upload(request)
+    if pdf_bytes is None:
+        return error_response(400, 'Missing "file" field.')
+
+    status_code, body = await convert(request, pdf_bytes)
+    return JSONResponse(body, status_code=status_code)
+
+
+async def create_profiles_batch(request):
+    if not is_authorized(request):
+        return error_response(401, "Unauthorized")
+    if not request.headers.get('content-type', '').startswith('multipart/form-data'):
+        return error_response(415, 'Send the PDFs as multipart "files" fields.')
+
+    form = await request.form()
+    uploads = form.getlist('files')
+    if not uploads:
+        return error_response(400, 'Missing "files" fields.')
+    max_batch_files = request.app.state.max_batch_files
+    if len(uploads) > max_batch_files:
+        return error_response(413, f"At most {max_batch_files} files per batch.")
+
+    async def convert_upload(upload):
+        status_code, body = await convert(request, await upload.read())
+        if status_code == 200:
+            return {"file": upload.filename, "profile": body}
+        return {"file": upload.filename, "error": body["error"]}
+
+    results = await asyncio.gather(*(convert_upload(upload) for upload in uploads))
+    return JSONResponse({"results": results})
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_profile(request):
+    if not is_authorized(request):
+        return error_response(401, "Unauthorized")
+
+    pdf_bytes = await read_pdf_upload(request)
+    if pdf_bytes is None:
+        return error_response(400, 'Missing "file" field.')
+
+    events = asyncio.Queue()
+
+    async def run():
+        status_code, body = await convert(request, pdf_bytes, on_event=events.put_nowait)
+        if status_code == 200:
+            events.put_nowait(("profile", None, body))
+        else:
+            events.put_nowait(("error", None, body["error"]))
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                kind, key, value = await events.get()
+                if kind in ("field", "item"):
+                    yield server_sent_event(kind, {"key": key, "value": value})
+                else:
+                    yield server_sent_event(kind, value)
+                    return
+        finally:
+            # The client went away before the profile was finished
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type='text/event-stream')
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+app = Starlette(
+    routes=[
+        Route('/profiles', create_profile, methods=['POST']),
+        Route('/profiles:batch', create_profiles_batch, methods=['POST']),
+        Route('/profiles:stream', stream_profile, methods=['POST']),
+        Route('/health', health, methods=['GET']),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=setting('CV_SERVICE_HOST', '0.0.0.0'), port=setting('CV_SERVICE_PORT', 8000, int))
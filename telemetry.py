@@ -0,0 +1,286 @@
+"""
+Per-stage spans for the conversion pipeline.
+
+    with telemetry.span("render", bytes_in=len(pdf_bytes)) as stage:
+        ...
+        stage.add(bytes_out=len(image))
+
+A span records its wall time, the CPU time of the thread it ran in and
+the counters the stage adds: bytes in and out, pages, tokens. With
+CV_TRACE_MEMORY set it also records the peak Python allocation while it
+was open; that starts tracemalloc and resets its peak at every span, so it
+does not mix with other peak measurements such as benchmark.py's. CPU time
+is only meaningful for spans that do not await, and peak allocation only
+when conversions do not overlap, since both tracemalloc and an event loop
+thread are shared.
+
+Spans nest through contextvars, so work in asyncio tasks and in
+asyncio.to_thread lands under the right parent. When a root span ends, its
+tree is queued and a background thread hands it to the exporters named in
+CV_TELEMETRY_EXPORTERS (comma-separated: langfuse, prometheus, otel, log).
+Exporting never runs on the conversion's own thread. Without exporters
+spans are only timed.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import queue
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from resources import setting
+
+
+MAX_QUEUED_TRACES = 1000
+FLUSH_TIMEOUT_SECONDS = 5
+
+_current = contextvars.ContextVar('telemetry_span', default=None)
+_queue = queue.Queue(maxsize=MAX_QUEUED_TRACES)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def exporters():
+    return [name.strip() for name in setting('CV_TELEMETRY_EXPORTERS', '').split(',') if name.strip()]
+
+
+def trace_memory():
+    # Starts tracemalloc on the first span once CV_TRACE_MEMORY is set
+    enabled = setting('CV_TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return enabled
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.start_time = time.time()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_bytes = None
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._memory_base = self._memory_peak = None
+        if trace_memory() and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this span; the parent keeps what it saw so far
+            if parent is not None and parent._memory_peak is not None:
+                parent._memory_peak = max(parent._memory_peak, peak)
+            tracemalloc.reset_peak()
+            self._memory_base = self._memory_peak = current
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.thread_time() - self._cpu_started
+        if self._memory_base is not None and tracemalloc.is_tracing():
+            self._memory_peak = max(self._memory_peak, tracemalloc.get_traced_memory()[1])
+            self.peak_bytes = self._memory_peak - self._memory_base
+            if self.parent is not None and self.parent._memory_peak is not None:
+                self.parent._memory_peak = max(self.parent._memory_peak, self._memory_peak)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start_time": self.start_time,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "peak_bytes": self.peak_bytes,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+def current_span():
+    return _current.get()
+
+
+def add(**counters):
+    # Counts toward the innermost open span, if any
+    active = _current.get()
+    if active is not None:
+        active.add(**counters)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Time the block as a stage named name, a child of the span open around it.
+
+    Yields:
+        Span: call add() / set() on it to record counters and attributes
+    """
+    parent = _current.get()
+    stage = Span(name, parent, attributes)
+    token = _current.set(stage)
+    try:
+        yield stage
+    except BaseException as e:
+        stage.set(error=type(e).__name__)
+        raise
+    finally:
+        stage.finish()
+        _current.reset(token)
+        if parent is not None:
+            parent.children.append(stage)
+        elif exporters():
+            export(stage)
+
+
+def export(root):
+    try:
+        _queue.put_nowait(root.to_dict())
+    except queue.Full:
+        # Dropping a trace beats slowing down conversions
+        return
+    start_worker()
+
+
+def start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=export_loop, name='telemetry-export', daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+
+def export_loop():
+    started = []
+    for name in exporters():
+        try:
+            started.append(EXPORTER_FACTORIES[name]())
+        except Exception as e:
+            print(f"Telemetry exporter {name} unavailable: {type(e).__name__}: {e}")
+    while True:
+        trace = _queue.get()
+        for exporter in started:
+            try:
+                exporter(trace)
+            except Exception as e:
+                print(f"Telemetry export failed: {type(e).__name__}: {e}")
+        _queue.task_done()
+
+
+def flush(timeout=FLUSH_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def walk(trace, parent=None):
+    # (span dict, parent span dict) pairs, parents first
+    yield trace, parent
+    for child in trace["children"]:
+        yield from walk(child, trace)
+
+
+def span_metadata(node):
+    return {
+        "wall_seconds": node["wall_seconds"],
+        "cpu_seconds": node["cpu_seconds"],
+        "peak_bytes": node["peak_bytes"],
+        **node["attributes"],
+    }
+
+
+def log_exporter():
+    def export_trace(trace):
+        print(json.dumps(trace, ensure_ascii=False))
+
+    return export_trace
+
+
+def langfuse_exporter():
+    import resources
+
+    langfuse = resources.langfuse_client()
+
+    def timestamp(seconds):
+        return datetime.fromtimestamp(seconds, timezone.utc)
+
+    def export_trace(trace):
+        # The Langfuse client batches and sends in its own background thread
+        observations = {}
+        for node, parent in walk(trace):
+            if parent is None:
+                target = langfuse.trace(name=node["name"], metadata=span_metadata(node))
+            else:
+                target = observations[id(parent)]
+            observations[id(node)] = target.span(
+                name=node["name"],
+                start_time=timestamp(node["start_time"]),
+                end_time=timestamp(node["start_time"] + node["wall_seconds"]),
+                metadata=span_metadata(node),
+            )
+
+    return export_trace
+
+
+def prometheus_exporter():
+    from prometheus_client import Counter, Histogram, start_http_server
+
+    wall = Histogram('cv_stage_wall_seconds', "Wall time per pipeline stage", ['stage'])
+    cpu = Counter('cv_stage_cpu_seconds', "CPU time per pipeline stage", ['stage'])
+    peak = Histogram('cv_stage_peak_bytes', "Peak Python allocation per pipeline stage", ['stage'],
+                     buckets=[2 ** power for power in range(16, 32, 2)])
+    counters = Counter('cv_stage_count', "Bytes, pages and tokens per pipeline stage", ['stage', 'counter'])
+    # Port of a /metrics endpoint to serve them on
+    port = setting('CV_PROMETHEUS_PORT', 0, int)
+    if port:
+        start_http_server(port)
+
+    def export_trace(trace):
+        for node, _ in walk(trace):
+            stage = node["name"]
+            wall.labels(stage).observe(node["wall_seconds"])
+            cpu.labels(stage).inc(node["cpu_seconds"])
+            if node["peak_bytes"] is not None:
+                peak.labels(stage).observe(node["peak_bytes"])
+            for key, value in node["attributes"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counters.labels(stage, key).inc(value)
+
+    return export_trace
+
+
+def otel_exporter():
+    # Uses whatever tracer provider the process configured (e.g. via opentelemetry-instrument)
+    from opentelemetry import trace as otel_trace
+
+    tracer = otel_trace.get_tracer('cv2profile')
+
+    def export_trace(trace):
+        contexts = {}
+        for node, parent in walk(trace):
+            start_ns = int(node["start_time"] * 1e9)
+            otel_span = tracer.start_span(node["name"], context=contexts.get(id(parent)), start_time=start_ns)
+            otel_span.set_attributes({
+                key: value for key, value in span_metadata(node).items()
+                if isinstance(value, (str, bool, int, float))
+            })
+            contexts[id(node)] = otel_trace.set_span_in_context(otel_span)
+            otel_span.end(end_time=start_ns + int(node["wall_seconds"] * 1e9))
+
+    return export_trace
+
+
+EXPORTER_FACTORIES = {
+    "log": log_exporter,
+    "langfuse": langfuse_exporter,
+    "prometheus": prometheus_exporter,
+    "otel": otel_exporter,
+}
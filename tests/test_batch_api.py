@@ -0,0 +1,92 @@
+import json
+
+import fitz
+import pytest
+from openai import OpenAI
+from starlette.testclient import TestClient
+
+import batch_api
+from mock_openai import MockConfig, create_app
+
+
+CV_TEXT = [
+    "Jane Doe",
+    "jane.doe@example.com",
+    "EXPERIENCE",
+    "Senior Backend Engineer, Example GmbH, 03/2019 - present",
+    "Software Engineer, Sample AG, 09/2015 - 02/2019",
+    "EDUCATION",
+    "M.Sc. Computer Science, TU Berlin, 2013 - 2015",
+]
+
+
+def write_pdf(path):
+    document = fitz.open()
+    page = document.new_page()
+    for index, line in enumerate(CV_TEXT):
+        page.insert_text((72, 72 + 20 * index), line, fontsize=11)
+    document.save(path)
+    document.close()
+    return str(path)
+
+
+def mock_client(config=None):
+    # TestClient is an httpx.Client that calls the app in-process
+    http_client = TestClient(create_app(config or MockConfig(latency=0, token_rate=0)),
+                             base_url="http://mock")
+    return OpenAI(base_url="http://mock/v1", api_key="mock", http_client=http_client, max_retries=0)
+
+
+def submit(client, tmp_path, count=2):
+    paths = [write_pdf(tmp_path / f"cv-{index}.pdf") for index in range(count)]
+    output = str(tmp_path / "profiles.jsonl")
+    manifest_path = f"{output}.batches.json"
+    manifest = {"date": "01-06-2024", "structured": True, "batch_ids": [], "requests": {}}
+    batch_api.write_manifest(manifest_path, manifest, create=True)
+    request_files, manifest["requests"] = batch_api.write_request_files(paths, output, vision='never')
+    batch_api.submit_batches(client, request_files, manifest, manifest_path)
+    return output, manifest_path
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_submit_and_collect(tmp_path):
+    client = mock_client()
+    output, manifest_path = submit(client, tmp_path)
+
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert len(manifest["batch_ids"]) == 1
+    assert len(manifest["requests"]) == 2
+
+    converted, failed = batch_api.collect_batches(client, manifest, output, poll_seconds=0)
+    assert (converted, failed) == (2, 0)
+    records = read_records(output)
+    assert sorted(record["file"] for record in records) == sorted(
+        request["file"] for request in manifest["requests"].values())
+    assert all(record["profile"]["name"] == "Jane Doe" for record in records)
+    # The sample answer has valid dates, so the durations are filled
+    assert all(record["profile"]["totalWorkExperience"] for record in records)
+
+
+def test_collect_records_failed_requests(tmp_path):
+    client = mock_client(MockConfig(latency=0, token_rate=0, error_rate=1.0, error_status=500))
+    output, manifest_path = submit(client, tmp_path)
+
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    converted, failed = batch_api.collect_batches(client, manifest, output, poll_seconds=0)
+    assert (converted, failed) == (0, 2)
+    assert all(record["error"].startswith("BatchError") for record in read_records(output))
+
+
+def test_manifest_is_not_overwritten(tmp_path):
+    manifest_path = str(tmp_path / "profiles.jsonl.batches.json")
+    batch_api.write_manifest(manifest_path, {"batch_ids": ["batch_old"]}, create=True)
+    with pytest.raises(FileExistsError):
+        batch_api.write_manifest(manifest_path, {"batch_ids": []}, create=True)
+    with open(manifest_path, encoding='utf-8') as f:
+        assert json.load(f)["batch_ids"] == ["batch_old"]
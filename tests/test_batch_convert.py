@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+
+import fitz
+import httpx
+from openai import AsyncOpenAI
+
+import batch_convert
+from mock_openai import MockConfig, create_app
+from rate_limit import AsyncScheduledOpenAI, RateLimiter
+
+
+def write_pdf(path):
+    document = fitz.open()
+    page = document.new_page()
+    for index, line in enumerate(["Jane Doe", "jane.doe@example.com", "EXPERIENCE",
+                                  "Senior Backend Engineer, Example GmbH, 01-03-2019 - today"]):
+        page.insert_text((72, 72 + 20 * index), line, fontsize=11)
+    document.save(path)
+    document.close()
+    return str(path)
+
+
+def mock_client():
+    transport = httpx.ASGITransport(create_app(MockConfig(latency=0, token_rate=0)))
+    return AsyncScheduledOpenAI(
+        AsyncOpenAI(base_url="http://mock/v1", api_key="mock", max_retries=0,
+                    http_client=httpx.AsyncClient(transport=transport, base_url="http://mock")),
+        RateLimiter(10 ** 6, 10 ** 9),
+    )
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_collect_pdf_paths(tmp_path):
+    (tmp_path / "nested").mkdir()
+    first = write_pdf(tmp_path / "b.pdf")
+    second = write_pdf(tmp_path / "nested" / "a.PDF")
+    (tmp_path / "notes.txt").write_text("not a CV")
+    assert batch_convert.collect_pdf_paths([str(tmp_path)]) == sorted([first, second])
+    assert batch_convert.collect_pdf_paths([str(tmp_path / "*.pdf"), first]) == [first]
+
+
+def test_convert_batch_writes_one_record_per_file(tmp_path):
+    paths = [write_pdf(tmp_path / f"cv-{index}.pdf") for index in range(3)]
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 broken")
+    output = str(tmp_path / "profiles.jsonl")
+
+    converted, failed = asyncio.run(batch_convert.convert_batch(
+        paths + [str(broken)], output, concurrency=2, vision='never', client=mock_client(),
+    ))
+
+    assert (converted, failed) == (3, 1)
+    records = {record["file"]: record for record in read_records(output)}
+    assert all(records[path]["profile"]["name"] == "Jane Doe" for path in paths)
+    assert "error" in records[str(broken)]
+    assert batch_convert.load_checkpoint(output) == set(paths)
+
+
+def test_checkpoint_ignores_failures_and_a_partial_last_line(tmp_path):
+    output = tmp_path / "profiles.jsonl"
+    output.write_text(
+        json.dumps({"file": "a.pdf", "profile": {"name": "Jane Doe"}}) + "\n"
+        + json.dumps({"file": "b.pdf", "error": "ValueError: broken"}) + "\n"
+        + '{"file": "c.pdf", "prof',
+        encoding='utf-8',
+    )
+    assert batch_convert.load_checkpoint(str(output)) == {"a.pdf"}
+    assert batch_convert.load_checkpoint(os.path.join(str(tmp_path), "missing.jsonl")) == set()
@@ -0,0 +1,140 @@
+import json
+from datetime import datetime
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from PIL import Image
+from pydantic import BaseModel
+
+from cv_pipeline import (Language, build_messages, cache_variant, cached_prompt_tokens, dated_cv_text,
+                         instruction_tokens, parse_profile, profile_json_schema, prompt, repair_user_profile,
+                         strict_schema)
+from token_estimates import estimate_text_tokens
+
+
+@pytest.mark.parametrize("content", [
+    '{"name": "Jane Doe", "workExperience": null}',
+    '{"name": "Jane Doe", "languages": ["English"]}',
+    '{"name": "Jane Doe", "links": [3]}',
+])
+def test_malformed_sections_fall_back_to_repair(content):
+    # parse_profile rejects them instead of raising, so the repair path runs
+    assert parse_profile(content) is None
+    profile = parse_profile(content) or repair_user_profile(content)
+    assert profile.name == "Jane Doe"
+
+
+def test_repair_keeps_the_valid_items_of_a_list():
+    profile = repair_user_profile('{"name": "Jane Doe", "languages": ["English", {"name": "German", "degree": "C2"}]}')
+    assert [(language.name, language.degree) for language in profile.languages] == [("German", "Proficient")]
+
+
+@pytest.mark.parametrize("degree, expected", [
+    ("Fluent", "Fluent"),
+    ("native/bilingual", "Native/Bilingual"),
+    ("B2", "Good"),
+    ("upper-intermediate", "Good"),
+    ("B1 (intermediate)", "Good"),
+    ("A2", "Beginner"),
+    ("C1 business", "Proficient"),
+    ("Native speaker", "Native/Bilingual"),
+    ("Muttersprache", "Native/Bilingual"),
+    ("conversational", ""),
+])
+def test_language_degree_aliases(degree, expected):
+    assert Language(name="English", degree=degree).degree == expected
+
+
+def schema_nodes(node):
+    # Every schema node, skipping the name -> schema maps themselves
+    if isinstance(node, list):
+        for item in node:
+            yield from schema_nodes(item)
+    elif isinstance(node, dict):
+        yield node
+        for key, value in node.items():
+            if key in ("properties", "$defs"):
+                for child in value.values():
+                    yield from schema_nodes(child)
+            else:
+                yield from schema_nodes(value)
+
+
+def test_profile_schema_follows_the_strict_mode_rules():
+    schema = profile_json_schema()
+    objects = 0
+    for node in schema_nodes(schema):
+        assert "default" not in node and "title" not in node
+        assert not any(branch.get("type") == "null" for branch in node.get("anyOf", []))
+        if node.get("type") == "object":
+            objects += 1
+            assert node["additionalProperties"] is False
+            assert set(node["required"]) == set(node["properties"])
+    assert objects == 1 + len(schema["$defs"])
+    assert "totalLength" not in schema["$defs"]["WorkExperience"]["properties"]
+
+
+class Posting(BaseModel):
+    title: Optional[str] = None
+    default: str = "x"
+
+
+def test_fields_named_like_schema_keywords_are_kept():
+    schema = strict_schema(Posting.model_json_schema())
+    assert schema["properties"] == {"title": {"type": "string"}, "default": {"type": "string"}}
+    assert schema["required"] == ["title", "default"]
+
+
+def test_instruction_tokens_include_the_schema():
+    schema_tokens = instruction_tokens(structured=True) - instruction_tokens(structured=False)
+    assert schema_tokens == estimate_text_tokens(json.dumps(profile_json_schema()))
+
+
+def test_cache_variant_tells_section_extraction_apart():
+    variants = {cache_variant(structured=structured, split_sections=split)
+                for structured in (False, True) for split in (False, True)}
+    assert len(variants) == 4
+
+
+def page_image(image_format, color):
+    buffer = BytesIO()
+    Image.new('RGB', (60, 80), color).save(buffer, format=image_format)
+    return buffer
+
+
+@pytest.mark.parametrize("image_mode, urls", [
+    ("pages", ["data:image/png;base64,", "data:image/jpeg;base64,"]),
+    ("stitched", ["data:image/png;base64,"]),
+])
+def test_page_images_become_image_parts(image_mode, urls):
+    images = [page_image('PNG', 'white'), page_image('JPEG', 'gray')]
+    content = build_messages("Jane Doe", "Extract the CV.", images, image_mode)[1]["content"]
+    assert content[0]["type"] == "text"
+    assert [part["image_url"]["url"][:len(url)] for part, url in zip(content[1:], urls)] == urls
+    assert len(content) == 1 + len(urls)
+
+
+def test_unknown_image_mode():
+    with pytest.raises(ValueError):
+        build_messages("Jane Doe", "Extract the CV.", [page_image('PNG', 'white')], "tiles")
+
+
+def test_instructions_are_the_same_for_every_cv_and_day():
+    first = build_messages("Jane Doe", prompt)
+    second = build_messages("John Roe", prompt, [page_image('PNG', 'white')])
+    assert first[0] == second[0] and first[0]["role"] == "system"
+    assert "{DATETIME}" not in first[0]["content"] and "CURRENT_DATE" in first[0]["content"]
+    # Only the user message carries the date
+    assert dated_cv_text("Jane Doe", datetime(2024, 6, 15)).startswith("CURRENT_DATE is 15-06-2024.")
+
+
+@pytest.mark.parametrize("details, expected", [
+    (None, 0),
+    ({"cached_tokens": 1024}, 1024),
+    (SimpleNamespace(cached_tokens=2048), 2048),
+    (SimpleNamespace(cached_tokens=None), 0),
+])
+def test_cached_prompt_tokens(details, expected):
+    assert cached_prompt_tokens(SimpleNamespace(prompt_tokens_details=details)) == expected
@@ -0,0 +1,45 @@
+import fitz
+import pytest
+
+from cv_sections import find_sections
+from pdf_ingest import ingest_pdf
+
+
+def cv_with_bold_job_titles():
+    document = fitz.open()
+    page = document.new_page()
+    y = 72
+
+    def line(text, fontname="helv", fontsize=10, gap=16):
+        nonlocal y
+        page.insert_text((72, y), text, fontname=fontname, fontsize=fontsize)
+        y += gap
+
+    line("Jane Doe", fontsize=18, gap=24)
+    line("jane.doe@example.com")
+    line("Backend engineer building document processing services.", gap=28)
+    line("EXPERIENCE", gap=20)
+    for title, company in (("Senior Backend Engineer", "Example GmbH, 01-03-2019 - today"),
+                           ("Software Engineer", "Sample AG, 01-09-2015 - 28-02-2019")):
+        # Job titles in bold at body size
+        line(title, fontname="hebo")
+        line(company)
+        line("Designed and ran REST APIs and ETL jobs in Python.", gap=24)
+    line("EDUCATION", gap=20)
+    line("M.Sc. Computer Science", fontname="hebo")
+    line("TU Berlin, 01-10-2013 - 30-09-2015")
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+@pytest.mark.parametrize("text_mode", ["plain", "layout"])
+def test_bold_job_titles_stay_in_experience(text_mode):
+    ingested = ingest_pdf(cv_with_bold_job_titles(), False, text_mode=text_mode)
+    sections = find_sections(ingested.pages)
+
+    assert list(sections) == ["general", "experience", "education"]
+    for title in ("Senior Backend Engineer", "Software Engineer", "Sample AG"):
+        assert title in sections["experience"]
+        assert title not in sections["general"]
+    assert "M.Sc. Computer Science" in sections["education"]
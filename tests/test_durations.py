@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from cv_pipeline import UserProfile, WorkExperience
+from durations import (apply_durations, batch_calculate_duration, calculate_duration, parse_date_column,
+                       summarize_periods)
+
+
+def random_date(rng, first, days):
+    return (first + timedelta(days=rng.randrange(days))).strftime("%d-%m-%Y")
+
+
+def random_candidates(rng, count, first, days):
+    return [
+        [
+            (random_date(rng, first, days) if rng.random() > 0.05 else "",
+             random_date(rng, first, days) if rng.random() > 0.3 else "")
+            for _ in range(rng.randint(0, 5))
+        ]
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("seed, first, days", [
+    (0, datetime(1995, 1, 1), 365 * 40),
+    # Dates around today: future starts, ongoing entries and inverted ranges
+    (1, datetime(2020, 1, 1), 365 * 12),
+    (2, datetime(2023, 1, 1), 365 * 3),
+])
+@pytest.mark.parametrize("today", [datetime(2024, 6, 15), datetime(2024, 6, 15, 14, 30)])
+def test_batch_matches_scalar(seed, first, days, today):
+    rng = random.Random(seed)
+    candidates = random_candidates(rng, 5000, first, days)
+    years, months = batch_calculate_duration(candidates, today)
+    for date_ranges, batch_years, batch_months in zip(candidates, years, months):
+        assert calculate_duration(date_ranges, today) == (batch_years, batch_months), date_ranges
+
+
+def test_future_start_ongoing_keeps_time_of_day():
+    # Starts after today on today's day of month; the scalar code counts the time of day
+    date_ranges = [("15-05-2027", "")]
+    for today, expected in ((datetime(2024, 6, 15), (-3, 1)), (datetime(2024, 6, 15, 14, 30), (-3, 2))):
+        assert calculate_duration(date_ranges, today) == expected
+        years, months = batch_calculate_duration([date_ranges], today)
+        assert (years[0], months[0]) == expected
+
+
+def test_current_date_marker_counts_as_today():
+    # The model may copy the marker from the example in the instructions
+    profile = UserProfile(workExperience=[
+        WorkExperience(periodStart="01-06-2022", periodEnd="CURRENT_DATE"),
+        WorkExperience(periodStart="01-01-2020", periodEnd="01-06-2022"),
+    ])
+    apply_durations(profile, datetime(2024, 6, 15))
+    assert profile.workExperience[0].periodEnd == "15-06-2024"
+    assert profile.workExperience[0].totalLength
+    assert profile.totalWorkExperience == apply_durations(UserProfile(workExperience=[
+        WorkExperience(periodStart="01-06-2022", periodEnd=""),
+        WorkExperience(periodStart="01-01-2020", periodEnd="01-06-2022"),
+    ]), datetime(2024, 6, 15)).work.total
+
+
+def test_malformed_dates_only_drop_their_own_rows():
+    values = ["01-03-2019", "31-02-2020", "1-3-2019", "March 2019", "29-02-2020", "12-13-2020"]
+    parsed = parse_date_column(values)
+    assert parsed[[0, 2, 4]].astype(str).tolist() == ["2019-03-01", "2019-03-01", "2020-02-29"]
+    assert np.isnat(parsed[[1, 3, 5]]).all()
+
+    # Periods with a malformed date are left out, like summarize_periods does
+    today = datetime(2024, 6, 15)
+    periods = [("01-01-2018", "01-01-2020"), ("31-02-2020", "01-01-2021"), ("01-06-2022", "June 2023")]
+    years, months = batch_calculate_duration([periods], today)
+    assert years[0] * 12 + months[0] == summarize_periods(periods, today).total_months == 24
+
+
+def test_durations_replace_what_the_model_wrote():
+    profile = UserProfile(totalWorkExperience="20 years", workExperience=[
+        WorkExperience(periodStart="01-01-2015", periodEnd="31-12-2016", totalLength="9 years"),
+        WorkExperience(periodStart="01-06-2016", periodEnd="30-06-2018"),
+        WorkExperience(periodStart="01-01-2019", periodEnd="01-01-2020"),
+        # Not normalized to DD-MM-YYYY: left out of every calculation
+        WorkExperience(periodStart="2019", periodEnd="", totalLength="1 year"),
+    ])
+    durations = apply_durations(profile, datetime(2024, 6, 15))
+    assert [entry.totalLength for entry in profile.workExperience] == ["2 years", "2 years 1 month", "1 year", ""]
+    # The first two overlap and merge into one range
+    assert profile.totalWorkExperience == "4 years 6 months"
+    assert (durations.work.gap_count, durations.work.gap_months) == (1, 7)
+    assert profile.totalEducationDuration == ""
@@ -0,0 +1,73 @@
+import json
+
+import openai
+import pytest
+from openai import OpenAI
+from starlette.testclient import TestClient
+
+from mock_openai import SAMPLE_PROFILE, MockConfig, create_app, load_responses
+from token_estimates import estimate_prompt_tokens
+
+
+MESSAGES = [
+    {"role": "system", "content": "Extract the profile." * 10},
+    {"role": "user", "content": [
+        {"type": "text", "text": "Jane Doe, Senior Backend Engineer"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,"}},
+    ]},
+]
+RESPONSE_FORMAT = {"type": "json_schema", "json_schema": {"name": "profile", "strict": True, "schema": {
+    "type": "object", "properties": {"name": {"type": "string"}}, "required": ["name"],
+    "additionalProperties": False,
+}}}
+
+
+def mock_client(config=None, responses=None):
+    http_client = TestClient(create_app(config or MockConfig(latency=0, token_rate=0), responses),
+                             base_url="http://mock")
+    return OpenAI(base_url="http://mock/v1", api_key="mock", http_client=http_client, max_retries=0)
+
+
+def test_completion_answers_a_profile_and_counts_the_prompt():
+    completion = mock_client().chat.completions.create(
+        model="gpt-4o", messages=MESSAGES, response_format=RESPONSE_FORMAT,
+    )
+    assert json.loads(completion.choices[0].message.content) == SAMPLE_PROFILE
+    assert completion.usage.prompt_tokens == estimate_prompt_tokens(MESSAGES, RESPONSE_FORMAT)
+    assert completion.usage.total_tokens == completion.usage.prompt_tokens + completion.usage.completion_tokens
+
+
+def test_responses_are_replayed_round_robin():
+    client = mock_client(responses=[{"name": "A"}, {"name": "B"}])
+    names = [json.loads(client.chat.completions.create(model="gpt-4o", messages=MESSAGES)
+                        .choices[0].message.content)["name"] for _ in range(3)]
+    assert names == ["A", "B", "A"]
+
+
+def test_stream_adds_up_to_the_answer():
+    chunks = list(mock_client().chat.completions.create(
+        model="gpt-4o", messages=MESSAGES, stream=True, stream_options={"include_usage": True},
+    ))
+    content = ''.join(chunk.choices[0].delta.content or '' for chunk in chunks if chunk.choices)
+    assert json.loads(content) == SAMPLE_PROFILE
+    assert [chunk.choices[0].finish_reason for chunk in chunks if chunk.choices][-1] == "stop"
+    assert chunks[-1].choices == [] and chunks[-1].usage.prompt_tokens == estimate_prompt_tokens(MESSAGES)
+
+
+def test_injected_rate_limit_errors():
+    client = mock_client(MockConfig(latency=0, error_rate=1, retry_after=2.5))
+    with pytest.raises(openai.RateLimitError) as error:
+        client.chat.completions.create(model="gpt-4o", messages=MESSAGES)
+    assert error.value.response.headers["retry-after"] == "2.5"
+
+
+def test_recorded_profiles_are_answered_without_computed_fields(tmp_path):
+    recorded = dict(SAMPLE_PROFILE, totalWorkExperience="8 years",
+                    workExperience=[dict(SAMPLE_PROFILE["workExperience"][0], totalLength="5 years")])
+    path = tmp_path / "profiles.jsonl"
+    path.write_text(json.dumps({"file": "a.pdf", "profile": recorded}) + "\n"
+                    + json.dumps({"file": "b.pdf", "error": "ValueError"}) + "\n", encoding='utf-8')
+    [answer] = load_responses([str(path)])
+    assert "totalWorkExperience" not in answer
+    assert "totalLength" not in answer["workExperience"][0]
+    assert load_responses([]) == [SAMPLE_PROFILE]
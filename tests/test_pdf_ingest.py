@@ -0,0 +1,173 @@
+from io import BytesIO
+
+import fitz
+import pytest
+from PIL import Image
+
+import telemetry
+from pdf_ingest import (IngestedPDF, PageContent, RenderOptions, assess_text_quality, ingest_pdf,
+                        reset_render_pool)
+
+SIDEBAR = ["CONTACT", "jane.doe@example.com", "+49 30 1234567", "Berlin", "SKILLS", "Python", "PostgreSQL",
+           "Kubernetes"]
+MAIN = ["EXPERIENCE", "Senior Backend Engineer at Example GmbH", "Ran the document processing platform.",
+        "Software Engineer at Sample AG", "Built REST APIs and ETL jobs in Python.", "EDUCATION",
+        "M.Sc. Computer Science, TU Berlin"]
+
+
+def sidebar_cv():
+    # A narrow left sidebar (x 40-190) next to the main column (from x 210),
+    # both starting below a full-width name line, in their own line spacing
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((40, 60), "Jane Doe, Backend Engineer with eight years of experience", fontsize=16)
+    for index, text in enumerate(SIDEBAR):
+        page.insert_text((40, 100 + 15 * index), text, fontsize=9)
+    for index, text in enumerate(MAIN):
+        page.insert_text((210, 104 + 18 * index), text, fontsize=10)
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+def test_sidebar_is_read_before_the_main_column():
+    text = ingest_pdf(sidebar_cv(), False, text_mode="layout").pages[0].text
+    lines = [line.lstrip('#- ').strip() for line in text.split('\n') if line.strip()]
+
+    assert lines[0].startswith("Jane Doe")
+    assert lines[1:] == SIDEBAR + MAIN
+
+
+JOBS = [("Senior Backend Engineer, Example GmbH", "Jan 2019 - Mar 2021"),
+        ("Software Engineer, Sample AG", "Feb 2016 - Dec 2018"),
+        ("Junior Developer, Demo KG", "Apr 2014 - Jan 2016"),
+        ("Working Student, Test AG", "Oct 2012 - Mar 2014")]
+
+
+def dated_rows_cv():
+    # Job titles with right-aligned dates of one width, and no lines across the gap
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 72), "EXPERIENCE", fontsize=12)
+    for index, (title, dates) in enumerate(JOBS):
+        y = 100 + 20 * index
+        page.insert_text((72, y), title, fontsize=10)
+        width = fitz.get_text_length(dates, fontsize=9)
+        page.insert_text((540 - width, y), dates, fontsize=9)
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+def test_right_aligned_dates_stay_on_their_row():
+    text = ingest_pdf(dated_rows_cv(), False, text_mode="layout").pages[0].text
+    lines = [line.lstrip('#- ').strip() for line in text.split('\n') if line.strip()]
+
+    assert lines == ["EXPERIENCE"] + [line for job in JOBS for line in job]
+
+
+def cv_pdf(page_count=1, link=None):
+    document = fitz.open()
+    for number in range(page_count):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Jane Doe, page {number + 1}", fontsize=11)
+        if link:
+            page.insert_link({"kind": fitz.LINK_URI, "from": fitz.Rect(72, 60, 200, 75), "uri": link})
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+def test_text_links_and_images_from_one_upload(tmp_path):
+    pdf_bytes = cv_pdf(2, link="https://example.com/jane")
+    path = tmp_path / "cv.pdf"
+    path.write_bytes(pdf_bytes)
+    with open(path, 'rb') as pdf_file:
+        pdf_file.read(10)
+        uploads = [pdf_bytes, BytesIO(pdf_bytes), pdf_file]
+        ingested_uploads = [ingest_pdf(upload) for upload in uploads]
+    for ingested in ingested_uploads:
+        assert [page.text.strip() for page in ingested.pages] == ["Jane Doe, page 1", "Jane Doe, page 2"]
+        assert all(page.links == ["https://example.com/jane"] for page in ingested.pages)
+        assert len(ingested.images) == 2 and ingested.pages[0].image_mime == "image/png"
+    assert not ingest_pdf(pdf_bytes, render_images=False).has_images
+
+
+def a4_pdf():
+    document = fitz.open()
+    document.new_page(width=595, height=842).insert_text((72, 72), "Jane Doe", fontsize=11)
+    return document.tobytes()
+
+
+@pytest.mark.parametrize("options, size, mime, mode", [
+    (RenderOptions(), (724, 1024), "image/png", "RGB"),
+    (RenderOptions(dpi=144), (1190, 1684), "image/png", "RGB"),
+    (RenderOptions(grayscale=True, image_format='jpeg', quality=50), (724, 1024), "image/jpeg", "L"),
+    (RenderOptions(image_format='webp'), (724, 1024), "image/webp", "RGB"),
+])
+def test_render_options(options, size, mime, mode):
+    page = ingest_pdf(a4_pdf(), render_options=options).pages[0]
+    image = Image.open(BytesIO(page.image))
+    assert (page.width, page.height) == image.size == size
+    assert (page.image_mime, image.mode) == (mime, mode)
+
+
+def test_max_pixels_caps_the_render():
+    page = ingest_pdf(a4_pdf(), render_options=RenderOptions(max_pixels=100000)).pages[0]
+    # PyMuPDF rounds the edges up
+    assert abs(page.width * page.height - 100000) < 1000
+    assert page.width / page.height == pytest.approx(595 / 842, rel=0.01)
+
+
+def test_unknown_image_format():
+    with pytest.raises(ValueError):
+        ingest_pdf(cv_pdf(), render_options=RenderOptions(image_format='gif'))
+
+
+def test_page_images_only_when_the_text_layer_is_poor():
+    # The main column has enough text and two section headers
+    good = ingest_pdf(sidebar_cv(), render_images="auto")
+    assert good.text_quality.good and not good.has_images
+
+    # A scan: a picture of a CV and no text layer
+    document = fitz.open()
+    page = document.new_page()
+    buffer = BytesIO()
+    Image.new('RGB', (400, 560), 'white').save(buffer, format='PNG')
+    page.insert_image(page.rect, stream=buffer.getvalue())
+    scanned = ingest_pdf(document.tobytes(), render_images="auto")
+    assert not scanned.text_quality.good and scanned.has_images
+
+
+def test_text_quality():
+    text = "EXPERIENCE\n" + "Backend engineer at Example GmbH. " * 10 + "\nEDUCATION\nTU Berlin"
+    assert assess_text_quality([text]).good
+    assert not assess_text_quality([text, ""]).good  # too little text per page
+    assert not assess_text_quality([text.replace("EDUCATION", "")]).good  # one section header
+    assert not assess_text_quality([text + "\ufffd" * 40]).good  # broken encoding
+
+
+def test_links_are_added_once_after_their_page():
+    ingested = IngestedPDF(pages=[
+        PageContent(number=0, text="Jane Doe\n", links=["linkedin.com/in/jane", "https://github.com/jane"]),
+        PageContent(number=1, text="Projects\n", links=["https://linkedin.com/in/jane/", "https://jane.dev"]),
+    ])
+    assert ingested.raw_text == ("Jane Doe\n\nhttps://linkedin.com/in/jane\nhttps://github.com/jane"
+                                 "\nProjects\n\nhttps://jane.dev")
+    assert [number for number, _ in ingested.text_fragments()] == [0, 0, 0, 1, 1]
+
+
+def test_render_pool_matches_inline_rendering(monkeypatch):
+    pdf_bytes = cv_pdf(5)
+    monkeypatch.setenv("CV_RENDER_WORKERS", "1")
+    inline = ingest_pdf(pdf_bytes)
+    monkeypatch.setenv("CV_RENDER_WORKERS", "2")
+    try:
+        with telemetry.span("convert") as root:
+            pooled = ingest_pdf(pdf_bytes)
+    finally:
+        reset_render_pool(wait=True)
+    [render] = [stage for stage in root.children[0].children if stage.name == "render"]
+    assert render.attributes["pool"]
+    assert [page.image for page in pooled.pages] == [page.image for page in inline.pages]
+    assert [page.text for page in pooled.pages] == [page.text for page in inline.pages]
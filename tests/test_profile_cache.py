@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+
+import profile_cache
+from profile_cache import ProfileCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(profile_cache, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_key_changes_with_every_input():
+    key = make_cache_key(b'%PDF-1.4', "prompt", "gpt-4o", "01-01-2024")
+    assert key == make_cache_key(b'%PDF-1.4', "prompt", "gpt-4o", "01-01-2024")
+    assert len({
+        key,
+        make_cache_key(b'%PDF-1.5', "prompt", "gpt-4o", "01-01-2024"),
+        make_cache_key(b'%PDF-1.4', "other prompt", "gpt-4o", "01-01-2024"),
+        make_cache_key(b'%PDF-1.4', "prompt", "gpt-4o-mini", "01-01-2024"),
+        make_cache_key(b'%PDF-1.4', "prompt", "gpt-4o", "02-01-2024"),
+        make_cache_key(b'%PDF-1.4', "prompt", "gpt-4o", "01-01-2024", "never:layout"),
+    }) == 6
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ProfileCache(str(tmp_path / "profiles.sqlite3"), ttl_seconds=60, max_entries=0)
+    cache.set("a", '{"name": "Jane Doe"}')
+    clock.now += 60
+    assert cache.get("a") == '{"name": "Jane Doe"}'
+    clock.now += 1
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = ProfileCache(str(tmp_path / "profiles.sqlite3"), ttl_seconds=0, max_entries=2)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    clock.now += 1
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == "1"
+    clock.now += 1
+    cache.set("c", "3")
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["1", None, "3"]
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "nested" / "profiles.sqlite3")
+    ProfileCache(path).set("a", "1")
+    assert ProfileCache(path).get("a") == "1"
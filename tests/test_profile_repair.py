@@ -0,0 +1,85 @@
+import json
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from profile_repair import RepairPlan, close_json, load_json_leniently, repair_profile
+
+
+class Item(BaseModel):
+    name: str
+    level: Optional[str] = None
+
+
+@pytest.mark.parametrize("text, expected", [
+    # A cut-off string is dropped, not closed into a value
+    ('{"name": "Jane", "skills": ["Python", "S', {"name": "Jane", "skills": ["Python"]}),
+    ('{"name": "Jane", "location": "Ber', {"name": "Jane"}),
+    ('{"name": "Jane", "loca', {"name": "Jane"}),
+    ('{"name": "Jane", "location"', {"name": "Jane"}),
+    ('{"name": "Jane", "location": ', {"name": "Jane"}),
+    ('{"name": "Jane", "open": tr', {"name": "Jane"}),
+    ('{"skills": ["Python", "SQL"], "projects": [{"name": "A"}, {"name": "B', {
+        "skills": ["Python", "SQL"], "projects": [{"name": "A"}]}),
+    ('{"name": "Jane", "skills": ["Python",', {"name": "Jane", "skills": ["Python"]}),
+    ('{"name": "Jane", "open": true', {"name": "Jane", "open": True}),
+])
+def test_close_json_drops_the_unfinished_value(text, expected):
+    assert json.loads(close_json(text)) == expected
+
+
+def test_complete_answer_is_kept_as_is():
+    assert load_json_leniently('Here it is: {"name": "Jane", "skills": ["Python"]} done') == {
+        "name": "Jane", "skills": ["Python"]}
+
+
+class Profile(BaseModel):
+    name: Optional[str] = None
+    skills: List[str] = Field(default_factory=list)
+    languages: List[Item] = Field(default_factory=list)
+
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FixingClient:
+    # Answers the repair request with a fixed fragment list
+    def __init__(self, answer):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+        self.answer = answer
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return completion(json.dumps(self.answer))
+
+
+def test_repair_plan_splits_valid_values_from_fragments():
+    plan = RepairPlan({"name": "Jane", "skills": "Python, SQL",
+                       "languages": [{"name": "German", "level": "C2"}, "English"]}, Profile)
+    assert plan.sections["name"] == "Jane"
+    assert [(key, index) for key, index, _, _ in plan.fragments] == [("skills", None), ("languages", 1)]
+
+    profile = plan.build()
+    assert profile.skills == []
+    assert [item.name for item in profile.languages] == ["German"]
+
+
+def test_repair_profile_merges_the_fixed_fragments():
+    client = FixingClient({"fragments": [{"id": 0, "value": ["Python", "SQL"]},
+                                         {"id": 1, "value": {"name": "English", "level": ""}}]})
+    profile = repair_profile('{"name": "Jane", "skills": "Python, SQL", "languages": ["English"]}', Profile, client,
+                             "mock")
+
+    assert len(client.requests) == 1
+    assert profile.skills == ["Python", "SQL"]
+    assert [item.name for item in profile.languages] == ["English"]
+
+
+def test_fixes_that_still_fail_are_dropped():
+    client = FixingClient({"fragments": [{"id": 0, "value": "Python, SQL"}]})
+    profile = repair_profile('{"name": "Jane", "skills": "Python, SQL"}', Profile, client, "mock")
+    assert profile.name == "Jane" and profile.skills == []
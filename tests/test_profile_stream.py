@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from profile_stream import ProfileStreamParser
+
+PROFILE = {
+    "name": "Jane \"JD\" Doe",
+    "links": ["https://example.com/{jane}"],
+    "biography": "Backend engineer.\nLikes {braces}, [brackets] and back\\slashes.",
+    "workExperience": [
+        {"jobTitle": "Senior Engineer", "company": "Example GmbH", "description": "Built \"things\"."},
+        {"jobTitle": "Engineer", "company": "Sample AG", "description": ""},
+    ],
+    "skills": ["Python", "SQL"],
+    "projects": [
+        {"name": "Parser", "skills": ["Python", "JSON"], "meta": {"stars": [1, 2]}},
+    ],
+}
+TEXT = json.dumps(PROFILE, ensure_ascii=False, indent=2)
+EXPECTED = [
+    ("field", "name", PROFILE["name"]),
+    ("field", "links", PROFILE["links"]),
+    ("field", "biography", PROFILE["biography"]),
+    ("item", "workExperience", PROFILE["workExperience"][0]),
+    ("item", "workExperience", PROFILE["workExperience"][1]),
+    ("field", "workExperience", PROFILE["workExperience"]),
+    ("field", "skills", PROFILE["skills"]),
+    ("item", "projects", PROFILE["projects"][0]),
+    ("field", "projects", PROFILE["projects"]),
+]
+
+
+def feed_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(TEXT)])
+def test_events_do_not_depend_on_chunk_boundaries(size):
+    # Small sizes split strings, escapes and keys across chunks
+    parser = ProfileStreamParser()
+    assert feed_chunks(parser, TEXT, size) == EXPECTED
+    assert parser.done
+    assert parser.text() == TEXT
+
+
+def test_fenced_output():
+    parser = ProfileStreamParser()
+    events = feed_chunks(parser, f"Here is the profile:\n```json\n{TEXT}\n```\n", 5)
+    assert events == EXPECTED
+    assert parser.done
+
+
+def test_truncated_output_yields_only_complete_values():
+    cut = TEXT.index('"Sample AG"') + 5
+    parser = ProfileStreamParser()
+    events = feed_chunks(parser, TEXT[:cut], 4)
+    assert events == EXPECTED[:4]
+    assert not parser.done
+
+
+def test_escaped_quote_at_a_chunk_boundary():
+    parser = ProfileStreamParser()
+    events = []
+    for chunk in ['{"name": "a\\', '"', '}b", "skills": ["x', '"]', '}']:
+        events.extend(parser.feed(chunk))
+    assert events == [("field", "name", 'a"}b'), ("field", "skills", ["x"])]
+
+
+def test_input_after_the_object_is_ignored():
+    parser = ProfileStreamParser()
+    assert parser.feed('{"name": "Jane"} {"name": "Other"}') == [("field", "name", "Jane")]
+    assert parser.feed('{"skills": []}') == []
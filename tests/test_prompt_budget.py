@@ -0,0 +1,36 @@
+import pytest
+
+from pdf_ingest import IngestedPDF, PageContent
+from prompt_budget import fit_to_budget, remove_page_headers
+
+
+def pages(*texts):
+    return [PageContent(number=index, text=text) for index, text in enumerate(texts)]
+
+
+def texts(compressed):
+    return [page.text.split('\n') for page in compressed]
+
+
+def test_page_numbers_repeated_on_most_pages_are_removed():
+    compressed = remove_page_headers(pages("Jane Doe\nEXPERIENCE\n1", "Sample AG\nEngineer\n2",
+                                           "EDUCATION\nTU Berlin\n3"), 0)
+    assert texts(compressed) == [["Jane Doe", "EXPERIENCE"], ["Sample AG", "Engineer"], ["EDUCATION", "TU Berlin"]]
+
+
+def test_year_lines_are_kept():
+    compressed = remove_page_headers(pages("Jane Doe\nEngineer, Example GmbH\n2019",
+                                           "Sample AG\nEngineer\nPage 2 of 2"), 0)
+    assert texts(compressed) == [["Jane Doe", "Engineer, Example GmbH", "2019"], ["Sample AG", "Engineer"]]
+
+
+@pytest.mark.parametrize("label", ["Seite 2 von 3", "page 2", "2 / 3", "- 2 -"])
+def test_page_labels_are_removed(label):
+    compressed = remove_page_headers(pages("Jane Doe\nEngineer", f"Sample AG\nDeveloper\n{label}",
+                                           "TU Berlin\n- 3 -"), 0)
+    assert compressed[1].text == "Sample AG\nDeveloper"
+
+
+def test_budget_used_up_by_instructions_is_an_error():
+    with pytest.raises(ValueError):
+        fit_to_budget(IngestedPDF(pages=pages("Jane Doe")), instruction_tokens=2000, max_tokens=2000)
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import rate_limit
+from rate_limit import AsyncScheduledOpenAI, RateLimiter, ScheduledOpenAI, estimate_prompt_tokens
+
+
+MESSAGES = [{"role": "user", "content": "x" * 4000}]
+USED_TOKENS = 1200
+
+
+def completion():
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=USED_TOKENS))
+
+
+def rate_limit_error():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": "0"})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FlakyCompletions:
+    def __init__(self, failures):
+        self.failures = failures
+
+    def create(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise rate_limit_error()
+        return completion()
+
+
+class AsyncFlakyCompletions(FlakyCompletions):
+    async def create(self, **kwargs):
+        return super().create(**kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Retry at once, so the budget does not refill while the test waits
+    monkeypatch.setattr(rate_limit.ScheduledCall, 'wait', lambda self, retry_state: 0)
+
+
+def client_with(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_failed_attempt_is_refunded():
+    limiter = RateLimiter(rpm=1000, tpm=100000)
+    client = ScheduledOpenAI(client_with(FlakyCompletions(failures=1)), limiter)
+    client.chat.completions.create(messages=MESSAGES, max_tokens=500)
+    assert limiter.tokens.available >= 100000 - USED_TOKENS - 1
+
+
+def test_failed_attempt_is_refunded_async():
+    limiter = RateLimiter(rpm=1000, tpm=100000)
+    client = AsyncScheduledOpenAI(client_with(AsyncFlakyCompletions(failures=2)), limiter)
+    asyncio.run(client.chat.completions.create(messages=MESSAGES, max_tokens=500))
+    assert limiter.tokens.available >= 100000 - USED_TOKENS - 1
+
+
+def test_oversized_request_settles_against_what_was_charged():
+    # 1000 prompt + 500 completion tokens estimated, but the bucket only holds 1000
+    limiter = RateLimiter(rpm=1000, tpm=1000)
+    client = ScheduledOpenAI(client_with(FlakyCompletions(failures=1)), limiter)
+    client.chat.completions.create(messages=MESSAGES, max_tokens=500)
+    assert limiter.tokens.available == pytest.approx(1000 - USED_TOKENS, abs=5)
+
+
+def test_estimate_counts_text_and_images():
+    messages = [{"role": "user", "content": [
+        {"type": "text", "text": "x" * 400},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,"}},
+    ]}]
+    assert estimate_prompt_tokens(messages) == 100 + 765
+
+
+def test_estimate_counts_the_structured_output_schema():
+    schema = {"type": "object", "properties": {"name": {"type": "string"}}}
+    response_format = {"type": "json_schema", "json_schema": {"name": "profile", "schema": schema}}
+    assert estimate_prompt_tokens(MESSAGES, response_format) > estimate_prompt_tokens(MESSAGES)
+    assert estimate_prompt_tokens(MESSAGES, {"type": "json_object"}) == estimate_prompt_tokens(MESSAGES)
@@ -0,0 +1,93 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import resources
+
+
+class Resource:
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+builds = []
+
+
+@resources.shared_resource
+def sample_resource(*args, **kwargs):
+    # Slow enough for concurrent callers to overlap
+    time.sleep(0.01)
+    resource = Resource(*args, **kwargs)
+    builds.append(resource)
+    return resource
+
+
+@pytest.fixture(autouse=True)
+def fresh():
+    builds.clear()
+    yield
+    resources.invalidate("sample_resource")
+
+
+def test_built_once_per_arguments():
+    first = sample_resource("a", size=1, mode="x")
+    assert sample_resource("a", mode="x", size=1) is first
+    assert sample_resource("b") is not first
+    assert len(builds) == 2
+
+
+def test_concurrent_callers_share_one_build():
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sample_resource())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert all(result is builds[0] for result in results)
+
+
+def test_invalidate_closes_and_rebuilds():
+    first, second = sample_resource("a"), sample_resource("b")
+    assert sample_resource.invalidate() == 2
+    assert first.closed and second.closed
+    assert sample_resource("a") is not first
+    assert len(builds) == 3
+
+
+def test_invalidate_unknown_name():
+    with pytest.raises(KeyError):
+        resources.invalidate("no_such_resource")
+
+
+def test_close_failures_are_reported_not_raised(capsys):
+    def shutdown():
+        raise RuntimeError("already closed")
+
+    resources.close_resource(SimpleNamespace(shutdown=shutdown))
+    assert "Failed to close" in capsys.readouterr().out
+
+
+def test_setting(monkeypatch):
+    monkeypatch.setenv("CV_TEST_SETTING", "42")
+    assert resources.setting("CV_TEST_SETTING", 7, int) == 42
+    monkeypatch.setenv("CV_TEST_SETTING", "")
+    assert resources.setting("CV_TEST_SETTING", 7, int) == 7
+    monkeypatch.delenv("CV_TEST_SETTING")
+    assert resources.setting("CV_TEST_SETTING") is None
+
+
+def test_shared_spacy_loads_through_the_cache(monkeypatch):
+    monkeypatch.setattr(resources, "spacy_model", sample_resource)
+    spacy = resources.SharedSpacy(SimpleNamespace(load=Resource, __version__="3"))
+    assert spacy.load("en_core_web_sm") is spacy.load("en_core_web_sm")
+    assert spacy.__version__ == "3"
+    # Load options bypass the cache
+    assert spacy.load("en_core_web_sm", disable=["ner"]).kwargs == {"disable": ["ner"]}
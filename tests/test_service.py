@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import fitz
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from starlette.testclient import TestClient
+
+import service
+from mock_openai import MockConfig, create_app
+from rate_limit import AsyncScheduledOpenAI, RateLimiter
+
+
+def cv_pdf(name="Jane Doe"):
+    document = fitz.open()
+    page = document.new_page()
+    for index, line in enumerate([name, "jane.doe@example.com", "EXPERIENCE",
+                                  "Senior Backend Engineer, Example GmbH, 01-03-2019 - today"]):
+        page.insert_text((72, 72 + 20 * index), line, fontsize=11)
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    # Tracks how many model requests are open at once
+    def __init__(self, transport):
+        self.transport = transport
+        self.active = self.peak = 0
+
+    async def handle_async_request(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def transport():
+    return CountingTransport(httpx.ASGITransport(create_app(MockConfig(latency=0.05, token_rate=0))))
+
+
+@pytest.fixture
+def client(monkeypatch, transport):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    monkeypatch.setattr(service, 'ProfileCache', lambda: None)
+    with TestClient(service.app) as test_client:
+        service.app.state.client = AsyncScheduledOpenAI(
+            AsyncOpenAI(base_url="http://mock/v1", api_key="mock", max_retries=0,
+                        http_client=httpx.AsyncClient(transport=transport, base_url="http://mock")),
+            RateLimiter(10 ** 6, 10 ** 9),
+        )
+        yield test_client
+
+
+def test_create_profile(client):
+    response = client.post('/profiles', content=cv_pdf(), headers={'content-type': 'application/pdf'})
+    assert response.status_code == 200
+    assert response.json()["name"] == "Jane Doe"
+
+    response = client.post('/profiles', files={'file': ('cv.pdf', cv_pdf(), 'application/pdf')})
+    assert response.status_code == 200
+
+
+def test_bad_input_is_a_client_error(client):
+    assert client.post('/profiles', content=b'hello').status_code == 400
+    response = client.post('/profiles', content=b'%PDF-1.4 broken')
+    assert response.status_code == 400
+    assert "Could not process PDF" in response.json()["error"]
+
+
+def test_internal_errors_are_server_errors(client, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise TypeError("'NoneType' object is not iterable")
+
+    monkeypatch.setattr(service, 'aconvert_pdf', broken)
+    response = client.post('/profiles', content=cv_pdf())
+    assert response.status_code == 500
+    assert response.json() == {"error": "Internal error: TypeError"}
+
+
+def test_batch_reports_each_file(client):
+    files = [('files', ('a.pdf', cv_pdf(), 'application/pdf')),
+             ('files', ('junk.pdf', b'not a pdf', 'application/pdf')),
+             ('files', ('b.pdf', cv_pdf(), 'application/pdf'))]
+    response = client.post('/profiles:batch', files=files)
+    assert response.status_code == 200
+    results = {result["file"]: result for result in response.json()["results"]}
+    assert results["a.pdf"]["profile"]["name"] == "Jane Doe"
+    assert results["b.pdf"]["profile"]["name"] == "Jane Doe"
+    assert results["junk.pdf"]["error"] == "Uploaded file is not a PDF."
+
+
+def test_stream_sends_sections_then_the_profile(client):
+    with client.stream('POST', '/profiles:stream', content=cv_pdf()) as response:
+        assert response.status_code == 200
+        body = ''.join(response.iter_text())
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines["event"], json.loads(lines["data"])))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "profile"
+    assert "field" in kinds and "item" in kinds
+    assert ("field", {"key": "name", "value": "Jane Doe"}) in events
+    assert events[-1][1]["name"] == "Jane Doe"
+
+
+def test_api_key_is_required_when_set(client):
+    client.app.state.api_key = 'secret'
+    assert client.post('/profiles', content=cv_pdf()).status_code == 401
+    assert client.post('/profiles:batch', files=[('files', ('a.pdf', cv_pdf()))]).status_code == 401
+    assert client.post('/profiles:stream', content=cv_pdf()).status_code == 401
+    response = client.post('/profiles', content=cv_pdf(), headers={'authorization': 'Bearer secret'})
+    assert response.status_code == 200
+
+
+def test_inflight_limit(client, transport):
+    files = [('files', (f'{index}.pdf', cv_pdf(f"Jane Doe {index}"), 'application/pdf')) for index in range(4)]
+    client.app.state.inflight = asyncio.Semaphore(2)
+    response = client.post('/profiles:batch', files=files)
+    assert all("profile" in result for result in response.json()["results"])
+    assert transport.peak == 2
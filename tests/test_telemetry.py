@@ -0,0 +1,85 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+
+import telemetry
+
+
+def test_spans_nest_and_count():
+    with telemetry.span("convert", bytes_in=10) as root:
+        with telemetry.span("render") as render:
+            render.add(pages=1)
+            render.add(pages=2, bytes_out=100)
+        telemetry.add(tokens=5)
+        with pytest.raises(ValueError):
+            with telemetry.span("parse"):
+                raise ValueError("bad answer")
+
+    trace = root.to_dict()
+    assert [child["name"] for child in trace["children"]] == ["render", "parse"]
+    assert trace["attributes"] == {"bytes_in": 10, "tokens": 5}
+    assert trace["children"][0]["attributes"] == {"pages": 3, "bytes_out": 100}
+    assert trace["children"][1]["attributes"] == {"error": "ValueError"}
+    assert trace["wall_seconds"] >= trace["children"][0]["wall_seconds"]
+    assert telemetry.current_span() is None
+
+
+def test_tasks_and_threads_land_under_their_parent():
+    def in_thread():
+        with telemetry.span("ocr"):
+            pass
+
+    async def convert():
+        with telemetry.span("convert") as root:
+            await asyncio.gather(asyncio.to_thread(in_thread), asyncio.create_task(section("skills")))
+        return root
+
+    async def section(name):
+        with telemetry.span(name):
+            await asyncio.sleep(0)
+
+    root = asyncio.run(convert())
+    assert sorted(child.name for child in root.children) == ["ocr", "skills"]
+
+
+def test_memory_peak_is_recorded(monkeypatch):
+    monkeypatch.setenv("CV_TRACE_MEMORY", "1")
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        with telemetry.span("render") as stage:
+            buffer = bytearray(1024 * 1024)
+            del buffer
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    assert stage.peak_bytes >= 1024 * 1024
+
+
+def test_root_spans_go_to_the_exporters(monkeypatch, capsys):
+    exported = []
+
+    def broken_exporter():
+        raise ImportError("No module named 'prometheus_client'")
+
+    monkeypatch.setenv("CV_TELEMETRY_EXPORTERS", "collect, broken")
+    monkeypatch.setitem(telemetry.EXPORTER_FACTORIES, "collect", lambda: exported.append)
+    monkeypatch.setitem(telemetry.EXPORTER_FACTORIES, "broken", broken_exporter)
+    with telemetry.span("convert"):
+        with telemetry.span("render"):
+            pass
+    telemetry.flush()
+
+    assert [trace["name"] for trace in exported] == ["convert"]
+    assert exported[0]["children"][0]["name"] == "render"
+    assert "Telemetry exporter broken unavailable" in capsys.readouterr().out
+
+
+def test_log_exporter_prints_one_json_line(capsys):
+    with telemetry.span("convert", model="gpt-4o") as root:
+        pass
+    telemetry.log_exporter()(root.to_dict())
+    trace = json.loads(capsys.readouterr().out)
+    assert trace["name"] == "convert"
+    assert telemetry.span_metadata(trace)["model"] == "gpt-4o"
@@ -0,0 +1,62 @@
+"""
+Rough prompt-token estimates without a tokenizer, shared by the prompt
+budget (prompt_budget.py) and the rate-limit scheduler (rate_limit.py), so
+both count a request the same way.
+"""
+import json
+import math
+
+
+# About four characters of text per token, and GPT-4o's high-detail image
+# cost of 85 plus 170 per 512px tile
+CHARS_PER_TOKEN = 4
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+
+
+def estimate_text_tokens(text) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width, height) -> int:
+    # The API scales high-detail images to fit 2048x2048, then the short side to 768
+    if max(width, height) > 2048:
+        width, height = width * 2048 / max(width, height), height * 2048 / max(width, height)
+    if min(width, height) > 768:
+        width, height = width * 768 / min(width, height), height * 768 / min(width, height)
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+# Images inside a request are not decoded; a page rendered at the default
+# max side (1024px) fits in 2x2 tiles
+IMAGE_TOKENS = estimate_image_tokens(1024, 1024)
+
+
+def estimate_response_format_tokens(response_format) -> int:
+    # A structured-outputs schema is sent with every request
+    if not response_format or response_format.get("type") != "json_schema":
+        return 0
+    return estimate_text_tokens(json.dumps(response_format["json_schema"]["schema"]))
+
+
+def estimate_prompt_tokens(messages, response_format=None) -> int:
+    """
+    Estimate the prompt tokens of a chat messages list.
+
+    Returns:
+        int: the text tokens of every message plus a fixed cost per image and
+        the tokens of a structured-outputs schema
+    """
+    tokens = estimate_response_format_tokens(response_format)
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += estimate_text_tokens(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_text_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+    return tokens